@@ -5,6 +5,10 @@ import datetime
 import pytz
 from astral import LocationInfo, sun, moon
 
+NIGHT_SUN_ELEVATION = -18  # Below this the sun no longer lights the sky
+MOON_DARKNESS_THRESHOLD = -6  # elevation in degrees
+MOON_SIZE = 150  # Marker size of a full moon in the plots
+
 
 def get_day_info(
     location: LocationInfo,
@@ -22,10 +26,13 @@ def get_day_info(
         lon: Longitude.
         day: The date for which to plot the elevation.
         timestep_minutes: The interval in minutes for the calculation.
+
+    States are for the true horizon; see horizon.apply_horizon() for a local
+    skyline.
     """
-    moon_size = 150
+    moon_size = MOON_SIZE
 
-    moon_darkness_threshold = -6  # elevation in degrees
+    moon_darkness_threshold = MOON_DARKNESS_THRESHOLD
 
     tz = pytz.timezone(location.timezone)
 
@@ -111,7 +118,7 @@ def get_day_info(
             sun_state = "civil twilight"
         elif sun_elev >= -12:  # Nautical Twilight
             sun_state = "nautical twilight"
-        elif sun_elev >= -18:  # Astronomical Twilight
+        elif sun_elev >= NIGHT_SUN_ELEVATION:  # Astronomical Twilight
             sun_state = "astronomical twilight"
         else:  # Night
             sun_state = "night"
@@ -222,3 +229,21 @@ def get_day_info(
     }
 
     return day_info
+
+
+def get_day_info_fast(
+    location: LocationInfo,
+    day: datetime.date,
+    timestep_minutes: int,
+):
+    """Same as get_day_info(), but vectorized; see fast_engine.py."""
+    import fast_engine  # Deferred: it loads numpy and the ephemeris tables
+
+    return fast_engine.get_day_info_fast(location, day, timestep_minutes)
+
+
+# Ways to calculate a day, see main.get_year_info()
+ENGINES = {
+    "reference": get_day_info,  # astral, one sample at a time
+    "fast": get_day_info_fast,  # Vectorized over ephemeris tables
+}
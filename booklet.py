@@ -0,0 +1,284 @@
+"""
+PDF booklets of stargazing calendars for many sites and years.
+
+Each site and year gets its calendar page (images.draw_calendar_figure)
+followed by its twelve month strips (plotting.draw_month_figure). Pages are
+written to the PDF one at a time and each figure is released before the next
+is drawn, so memory stays flat however many pages the booklet has.
+
+With processes > 1 every site-year is built (or loaded) first, then each
+worker draws whole site-years and sends back their pages as compressed
+pixels, which are written to the PDF in order as they arrive. Those booklets
+are rasters at RASTER_DPI; drawn in one process (with matplotlib's PdfPages)
+the pages stay vector.
+
+Usage (from the repository root):
+    python booklet.py OUTPUT.pdf --years 2025 [2026 ...]
+                      [--locations NAME ...] [--timestep MIN]
+                      [--duration MIN] [--start H] [--end H]
+                      [--week-start Sunday] [--no-months] [--processes N]
+"""
+
+import argparse
+import collections
+import datetime
+import multiprocessing
+import zlib
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.backends.backend_pdf import PdfPages
+
+import cache
+import constants as c
+import horizon as hz
+import images as im
+import locations as loc
+import main
+import plotting
+
+RASTER_DPI = 200  # Resolution of pages drawn in worker processes
+SITE_YEARS_PER_PROCESS = 2  # Site-years queued per worker, bounding pages held
+RASTER_COMPRESSION = 6  # zlib level for raster pages
+
+
+def write_booklet(
+    path: str,
+    location_names,
+    years,
+    timestep_minutes: int = c.DEFAULT_TIMESTEP,
+    stargazing_times=c.DEFAULT_STARGAZING_TIMES,
+    stargazing_duration: datetime.timedelta = datetime.timedelta(
+        minutes=c.DEFAULT_STARGAZING_DURATION
+    ),
+    week_starts_on: str = "Sunday",
+    months: bool = True,
+    processes: int = 1,
+):
+    """
+    Writes a booklet PDF with the pages of every site for every year.
+
+    Pages are in the order of location_names, then years: each site's years
+    follow each other. Years that aren't cached yet are simulated once, before
+    any of their pages are drawn.
+
+    Args:
+        path: The PDF to write. It is replaced only once the booklet is done.
+        location_names: Names of saved locations (see locations.py).
+        years: The years to include.
+        timestep_minutes: The interval in minutes for the calculation.
+        stargazing_times: (start, end) in hours after midnight, as for
+            main.get_calendar_info().
+        stargazing_duration: The shortest dark window worth highlighting.
+        week_starts_on (str): 'Sunday' or 'Monday'.
+        months: If False, only the calendar pages are included.
+        processes: Worker processes to draw pages in. With more than one,
+            the pages are rasters at RASTER_DPI.
+
+    Returns:
+        int: The number of pages written.
+    """
+    settings = {
+        "timestep": timestep_minutes,
+        "stargazing times": tuple(stargazing_times),
+        "stargazing duration": stargazing_duration,
+        "week start": week_starts_on,
+    }
+    saved_locations = loc.get_locations()
+    site_years = []
+    for name in location_names:
+        if name not in saved_locations:
+            raise ValueError(f"Unknown location: {name}")
+        for year in years:
+            site_years.append((name, saved_locations[name], year, settings, months))
+
+    with cache.atomic_open(path, "wb") as f:
+        if processes <= 1:
+            with PdfPages(f) as pdf:
+                for site_year in site_years:
+                    for fig in _draw_site_year(*site_year):
+                        pdf.savefig(fig)
+                        fig.clear()  # Release the artists before drawing the next
+        else:
+            # Simulate missing years here, once each, so workers only load them
+            for name, entry, year, _, _ in site_years:
+                main.get_year_info(
+                    loc.to_location_info(name, entry),
+                    year,
+                    timestep_minutes=timestep_minutes,
+                    include_plot=False,
+                )
+            with multiprocessing.Pool(processes=processes) as pool:
+                _write_raster_pdf(f, _render_in_order(pool, site_years, processes))
+
+    num_pages = len(site_years) * (13 if months else 1)
+    print(f"Booklet with {num_pages} pages saved to '{path}'")
+    return num_pages
+
+
+def _draw_site_year(name: str, entry: dict, year: int, settings: dict, months: bool):
+    """
+    Yields the figures of a site-year in page order: its calendar, then (if
+    months) the twelve month strips. The year is loaded once for all of them.
+    """
+    location = loc.to_location_info(name, entry)
+    year_info = main.get_year_info(
+        location,
+        year,
+        timestep_minutes=settings["timestep"],
+        lazy_plot=True,
+        horizon=hz.location_horizon(entry),
+    )
+    calendar_info = main.get_calendar_info(
+        year_info, settings["stargazing times"], settings["stargazing duration"]
+    )
+    text_info = {
+        "year": year,
+        "location": location,
+        "stargazing times": settings["stargazing times"],
+        "stargazing duration": settings["stargazing duration"],
+    }
+    yield im.draw_calendar_figure(calendar_info, text_info, settings["week start"])
+    if months:
+        for month in range(1, 13):
+            yield plotting.draw_month_figure(year_info, month)
+
+
+# --- Parallel rendering ---
+
+
+def _render_site_year(site_year):
+    """
+    Draws all the pages of a site-year in a worker.
+
+    Returns:
+        list: (width, height, zlib-compressed RGB rows) in pixels, per page.
+    """
+    pages = []
+    for fig in _draw_site_year(*site_year):
+        canvas = FigureCanvasAgg(fig)
+        fig.set_dpi(RASTER_DPI)
+        canvas.draw()
+        pixels = np.asarray(canvas.buffer_rgba())[:, :, :3]
+        height, width = pixels.shape[:2]
+        data = zlib.compress(np.ascontiguousarray(pixels).tobytes(), RASTER_COMPRESSION)
+        fig.clear()
+        pages.append((width, height, data))
+    return pages
+
+
+def _render_in_order(pool, site_years, processes: int):
+    """
+    Yields the rendered pages in order while workers draw the site-years
+    after. Only SITE_YEARS_PER_PROCESS site-years per worker are queued at a
+    time, so finished pages don't pile up however long the booklet is.
+    """
+    pending = collections.deque()
+    for site_year in site_years:
+        pending.append(pool.apply_async(_render_site_year, (site_year,)))
+        if len(pending) >= SITE_YEARS_PER_PROCESS * processes:
+            yield from pending.popleft().get()
+    while pending:
+        yield from pending.popleft().get()
+
+
+def _write_raster_pdf(f, pages):
+    """
+    Writes a PDF with one image per page, streaming: each page goes to the
+    file as it arrives and only the object offsets are kept.
+
+    The compressed rows are embedded as they are (FlateDecode), so nothing is
+    decoded or compressed again here.
+
+    Args:
+        f: Binary file to write to.
+        pages: Iterable of (width, height, zlib-compressed RGB rows).
+    """
+    offsets = [0, 0, 0]  # Object numbers start at 1; 2 is the page tree
+    page_numbers = []
+
+    def write_object(body: bytes, stream: bytes = None):
+        offsets.append(f.tell())
+        f.write(f"{len(offsets) - 1} 0 obj\n".encode("ascii") + body)
+        if stream is not None:
+            f.write(b"\nstream\n" + stream + b"\nendstream")
+        f.write(b"\nendobj\n")
+        return len(offsets) - 1
+
+    f.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    offsets[1] = f.tell()
+    f.write(b"1 0 obj\n<< /Type /Catalog /Pages 2 0 R >>\nendobj\n")
+
+    for width, height, data in pages:
+        image = write_object(
+            (
+                f"<< /Type /XObject /Subtype /Image /Width {width} /Height {height}"
+                f" /ColorSpace /DeviceRGB /BitsPerComponent 8 /Filter /FlateDecode"
+                f" /Length {len(data)} >>"
+            ).encode("ascii"),
+            data,
+        )
+        # Page size in points, at RASTER_DPI
+        page_width = width * 72 / RASTER_DPI
+        page_height = height * 72 / RASTER_DPI
+        content = f"q {page_width:.2f} 0 0 {page_height:.2f} 0 0 cm /Im0 Do Q"
+        contents = write_object(
+            f"<< /Length {len(content)} >>".encode("ascii"), content.encode("ascii")
+        )
+        page_numbers.append(
+            write_object(
+                (
+                    f"<< /Type /Page /Parent 2 0 R"
+                    f" /MediaBox [0 0 {page_width:.2f} {page_height:.2f}]"
+                    f" /Resources << /XObject << /Im0 {image} 0 R >> >>"
+                    f" /Contents {contents} 0 R >>"
+                ).encode("ascii")
+            )
+        )
+
+    offsets[2] = f.tell()
+    kids = " ".join(f"{number} 0 R" for number in page_numbers)
+    f.write(
+        f"2 0 obj\n<< /Type /Pages /Kids [{kids}] /Count {len(page_numbers)} >>"
+        f"\nendobj\n".encode("ascii")
+    )
+
+    xref = f.tell()
+    f.write(f"xref\n0 {len(offsets)}\n0000000000 65535 f \n".encode("ascii"))
+    for offset in offsets[1:]:
+        f.write(f"{offset:010d} 00000 n \n".encode("ascii"))
+    f.write(
+        f"trailer\n<< /Size {len(offsets)} /Root 1 0 R >>\n"
+        f"startxref\n{xref}\n%%EOF\n".encode("ascii")
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("output", help="The PDF to write")
+    parser.add_argument("--years", type=int, nargs="+", required=True)
+    parser.add_argument(
+        "--locations", nargs="+", help="Saved location names (default: all)"
+    )
+    parser.add_argument("--timestep", type=int, default=c.DEFAULT_TIMESTEP)
+    parser.add_argument(
+        "--duration", type=float, default=c.DEFAULT_STARGAZING_DURATION
+    )
+    parser.add_argument("--start", type=float, default=c.DEFAULT_STARGAZING_TIMES[0])
+    parser.add_argument("--end", type=float, default=c.DEFAULT_STARGAZING_TIMES[1])
+    parser.add_argument("--week-start", default="Sunday", choices=["Sunday", "Monday"])
+    parser.add_argument("--no-months", action="store_true", help="Calendars only")
+    parser.add_argument("--processes", type=int, default=1)
+    args = parser.parse_args()
+
+    write_booklet(
+        args.output,
+        args.locations or list(loc.get_locations()),
+        args.years,
+        timestep_minutes=args.timestep,
+        stargazing_times=(args.start, args.end),
+        stargazing_duration=datetime.timedelta(minutes=args.duration),
+        week_starts_on=args.week_start,
+        months=not args.no_months,
+        processes=args.processes,
+    )
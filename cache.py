@@ -0,0 +1,726 @@
+import contextlib
+import datetime
+import json
+import os
+import re
+import socket
+import struct
+import threading
+import time
+import zlib
+from decimal import Decimal
+from typing import Any
+
+from astral import LocationInfo
+
+import constants as c
+
+LOCK_POLL_INTERVAL = 1.0  # seconds between checks while waiting for a lock
+LOCK_STALE_AFTER = 10 * 60  # seconds without a refresh before a lock is broken
+
+CACHE_FILENAME_PATTERN = re.compile(
+    r"lat_(?P<latitude>[-\d.]+)_lon_(?P<longitude>[-\d.]+)"
+    r"(?:_tz_(?P<timezone>[A-Za-z0-9_+.-]+?))?"
+    r"(?:_horizon_(?P<horizon>[0-9a-f]+))?"
+    r"_year_(?P<year>\d+)_v(?P<version>[\d.]+)_timestep_(?P<timestep>\d+)"
+    r"\.data\.(?P<extension>json|bin)"
+)
+
+# Data versions that can still be read, and the file extension each uses
+DATA_FORMATS = {
+    "2.0": "bin",  # Binary container with codec-compressed series
+    "1.0": "json",  # DateTimeEncoder JSON
+}
+YEAR_FILE_MAGIC = b"SGYEAR2\n"
+PLOT_SERIES = ["times", "sun", "moon", "moon phases"]
+
+
+def quantize_coordinate(
+    value: float,
+    precision: float | None = c.CACHE_COORDINATE_PRECISION,
+) -> str:
+    """
+    Rounds a latitude or longitude to the cache precision and formats it for
+    use in a cache filename.
+
+    Args:
+        value: Latitude or longitude in degrees.
+        precision: Grid size in degrees, e.g. 0.01. None or 0 keeps the exact
+                   value, which is how v1.0 files were named.
+
+    Returns:
+        str: The formatted coordinate, e.g. '44.04' for 44.0446274.
+    """
+    if not precision:
+        return f"{value}"
+
+    decimals = max(0, -Decimal(str(precision)).as_tuple().exponent)
+    quantized = round(value / precision) * precision
+    return f"{quantized:.{decimals}f}"
+
+
+def timezone_token(timezone: str) -> str:
+    """
+    Formats a timezone name for a cache filename: 'US/Eastern' becomes
+    'US.Eastern'. Timezone names have no dots, so the name can be read back.
+    """
+    return timezone.replace("/", ".")
+
+
+def get_base_filename(
+    location: LocationInfo,
+    year: int,
+    precision: float | None = c.CACHE_COORDINATE_PRECISION,
+    version: str = c.DATA_VERSION,
+) -> str:
+    """
+    Returns the cache filename stem shared by every timestep of a year.
+
+    Nearby sites share it, but only within a timezone: the local times in a
+    year depend on it, so sites in different timezones get their own files
+    instead of rebuilding each other's. Horizon profiles share it too, since
+    they are applied to a loaded year (see horizon.apply_horizon()).
+    """
+    latitude = quantize_coordinate(location.latitude, precision)
+    longitude = quantize_coordinate(location.longitude, precision)
+    timezone = timezone_token(location.timezone)
+    return f"lat_{latitude}_lon_{longitude}_tz_{timezone}_year_{year}_v{version}"
+
+
+def get_target_filename(
+    location: LocationInfo,
+    year: int,
+    timestep_minutes: int,
+    precision: float | None = c.CACHE_COORDINATE_PRECISION,
+) -> str:
+    """Returns the path a newly simulated year should be saved to."""
+    base_filename = get_base_filename(location, year, precision)
+    extension = DATA_FORMATS[c.DATA_VERSION]
+    return os.path.join(
+        c.DATA_FOLDER, f"{base_filename}_timestep_{timestep_minutes}.data.{extension}"
+    )
+
+
+def get_checkpoint_filename(save_path: str, month: int) -> str:
+    """
+    Returns the path a month of a year being built is checkpointed to. The
+    name doesn't match CACHE_FILENAME_PATTERN, so lookups never use it.
+    """
+    return f"{save_path}.month_{month:02d}.part"
+
+
+def parse_cache_filename(filename: str):
+    """
+    Splits a cache filename back into its parts.
+
+    Returns:
+        dict | None: Keys 'latitude', 'longitude', 'timezone' (None in names
+                     from before timezones were part of them), 'horizon'
+                     (the profile key of years that older versions simulated
+                     with one, else None), 'year', 'version', 'timestep' and
+                     'extension', or None if the name isn't a cache file.
+    """
+    match = CACHE_FILENAME_PATTERN.fullmatch(filename)
+    if match is None:
+        return None
+
+    try:
+        return {
+            "latitude": float(match["latitude"]),
+            "longitude": float(match["longitude"]),
+            "timezone": match["timezone"] and match["timezone"].replace(".", "/"),
+            "horizon": match["horizon"],
+            "year": int(match["year"]),
+            "version": match["version"],
+            "timestep": int(match["timestep"]),
+            "extension": match["extension"],
+        }
+    except ValueError:
+        # Handles cases where the filename is not in the expected format
+        return None
+
+
+def find_cached_file(
+    location: LocationInfo,
+    year: int,
+    timestep_minutes: int,
+    precision: float | None = c.CACHE_COORDINATE_PRECISION,
+):
+    """
+    Looks for a saved year with the same or a compatible timestep.
+
+    A saved timestep is compatible if the requested timestep is a multiple of
+    it. Any file whose coordinates round to the same values as the location's
+    is used, so files saved under exact coordinates (all v1.0 files) are
+    shared too. Only files for the location's timezone, or older files whose
+    name doesn't say (load_year() has their timezone), are used; files
+    simulated with a horizon profile by older versions are skipped. Files in
+    the current data version are preferred over older readable versions,
+    then files named with the timezone, then with the quantized coordinates.
+
+    Returns:
+        str | None: Path to the cached file, or None if there isn't one.
+    """
+    if not os.path.exists(c.DATA_FOLDER):
+        return None
+
+    base_filename = get_base_filename(location, year, precision, version="")
+    latitude = quantize_coordinate(location.latitude, precision)
+    longitude = quantize_coordinate(location.longitude, precision)
+
+    candidates = []
+    for filename in os.listdir(c.DATA_FOLDER):
+        info = parse_cache_filename(filename)
+        if (
+            info is None
+            or info["year"] != year
+            or info["horizon"] is not None
+            or info["timezone"] not in (None, location.timezone)
+            or DATA_FORMATS.get(info["version"]) != info["extension"]
+            # Check if the current timestep is a multiple of the saved one
+            or timestep_minutes % info["timestep"] != 0
+            or quantize_coordinate(info["latitude"], precision) != latitude
+            or quantize_coordinate(info["longitude"], precision) != longitude
+        ):
+            continue
+        candidates.append(
+            (
+                info["version"] != c.DATA_VERSION,
+                info["timezone"] is None,
+                not filename.startswith(base_filename),
+                filename,
+            )
+        )
+
+    if not candidates:
+        return None
+
+    return os.path.join(c.DATA_FOLDER, min(candidates)[-1])
+
+
+def report_shared_entries(
+    locations: dict,
+    year: int,
+    precision: float | None = c.CACHE_COORDINATE_PRECISION,
+):
+    """
+    Dry run of the cache keys: shows which saved locations would share
+    cached years at the given precision. Nothing is read or written.
+
+    Args:
+        locations: Locations dictionary as returned by locations.get_locations().
+        year: Year used to build the cache keys.
+        precision: Grid size in degrees to test.
+
+    Returns:
+        dict: Cache filename stem -> list of location names using it.
+    """
+    import locations as loc
+
+    shared = {}
+    for name, L in locations.items():
+        location = loc.to_location_info(name, L)
+        base_filename = get_base_filename(location, year, precision)
+        shared.setdefault(base_filename, []).append(name)
+
+    for base_filename, names in shared.items():
+        if len(names) > 1:
+            print(f"{base_filename}: shared by {', '.join(names)}")
+    num_shared = sum(1 for names in shared.values() if len(names) > 1)
+    print(
+        f"{len(locations)} locations -> {len(shared)} cache entries "
+        f"({num_shared} shared) at {precision} degree precision."
+    )
+
+    return shared
+
+
+# --- Atomic writes and build locks ---
+
+
+class LockLost(Exception):
+    """Raised by refresh_lock() when the lock is no longer this thread's."""
+
+
+@contextlib.contextmanager
+def atomic_open(path: str, mode: str = "w"):
+    """
+    Opens a temporary file next to `path` for writing and renames it over
+    `path` once the block finishes, so readers never see a half-written file.
+    The temporary file is removed if the block raises.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(temp_path, mode) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def acquire_lock(
+    key: str,
+    cancel_event=None,
+    poll_interval: float = LOCK_POLL_INTERVAL,
+    stale_after: float = LOCK_STALE_AFTER,
+    quiet: bool = False,
+):
+    """
+    Takes the lock file for a cache key, waiting while someone else holds it.
+
+    A lock is considered abandoned (and is broken) if its process is no longer
+    running on this machine, or if it hasn't been refreshed with
+    refresh_lock() for `stale_after` seconds.
+
+    Args:
+        key: Cache key, e.g. from get_base_filename().
+        cancel_event: Optional threading.Event that stops the wait.
+        quiet: If True, doesn't print that it is waiting for a year build
+            (for locks that don't guard one).
+
+    Returns:
+        str | None: Path of the lock file, or None if cancel_event was set
+                    while waiting.
+    """
+    os.makedirs(c.DATA_FOLDER, exist_ok=True)
+    lock_path = os.path.join(c.DATA_FOLDER, f"{key}.lock")
+    owner = json.dumps(
+        {
+            "pid": os.getpid(),
+            "host": socket.gethostname(),
+            "thread": threading.get_ident(),
+            "time": time.time(),
+        }
+    )
+
+    waiting = False
+    while True:
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            if _lock_is_stale(lock_path, stale_after):
+                _break_lock(lock_path, stale_after)
+                continue
+            if not waiting and not quiet:
+                print("Another process is building this year. Waiting for it...")
+                waiting = True
+            if cancel_event is not None:
+                if cancel_event.wait(poll_interval):
+                    return None
+            else:
+                time.sleep(poll_interval)
+            continue
+
+        with os.fdopen(fd, "w") as f:
+            f.write(owner)
+        return lock_path
+
+
+def lock_is_held(key: str, stale_after: float = LOCK_STALE_AFTER) -> bool:
+    """True if someone holds the lock for a cache key and it isn't abandoned."""
+    lock_path = os.path.join(c.DATA_FOLDER, f"{key}.lock")
+    return os.path.exists(lock_path) and not _lock_is_stale(lock_path, stale_after)
+
+
+def refresh_lock(lock_path: str):
+    """
+    Marks a held lock as still in use, see acquire_lock().
+
+    Raises LockLost if the lock was broken and someone else holds it now, so
+    the work it protects can stop instead of running twice.
+    """
+    if not _owns_lock(lock_path):
+        raise LockLost(f"Lock {os.path.basename(lock_path)} was taken over.")
+    try:
+        os.utime(lock_path)
+    except FileNotFoundError:
+        pass
+
+
+def release_lock(lock_path: str):
+    """
+    Removes a lock file taken with acquire_lock(). A lock that someone else
+    has taken over in the meantime is left alone.
+    """
+    if not _owns_lock(lock_path):
+        print(f"Lock {os.path.basename(lock_path)} was taken over, leaving it.")
+        return
+    try:
+        os.remove(lock_path)
+    except FileNotFoundError:
+        pass
+
+
+def _owns_lock(lock_path: str) -> bool:
+    """True if the lock file names this thread as its owner."""
+    try:
+        with open(lock_path, "r") as f:
+            owner = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return False
+    return (
+        owner.get("pid") == os.getpid()
+        and owner.get("host") == socket.gethostname()
+        and owner.get("thread") == threading.get_ident()
+    )
+
+
+def _break_lock(lock_path: str, stale_after: float):
+    """
+    Removes an abandoned lock, with a small window left open.
+
+    Removing the lock by name isn't safe: another waiter may already have
+    broken it and taken a fresh one, which would be removed instead. So the
+    lock is renamed to a name only this thread uses (which is atomic), and
+    only removed if the renamed file is still the abandoned lock. Otherwise
+    it is put back.
+
+    While a fresh lock is moved aside like this, a third waiter can take the
+    lock, and the fresh one can't be put back. Its owner then finds out at
+    its next refresh_lock(), which raises LockLost, and its release_lock()
+    leaves the newcomer's lock alone. Until then both may be working, which
+    for year builds only means writing the same file twice.
+    """
+    try:
+        with open(lock_path, "rb") as f:
+            owner = f.read()
+    except FileNotFoundError:
+        return  # Broken by another waiter already
+
+    broken_path = f"{lock_path}.{os.getpid()}.{threading.get_ident()}.broken"
+    try:
+        os.rename(lock_path, broken_path)
+    except FileNotFoundError:
+        return
+
+    try:
+        with open(broken_path, "rb") as f:
+            moved_owner = f.read()
+        if moved_owner == owner and _lock_is_stale(broken_path, stale_after):
+            print(f"Breaking abandoned lock {os.path.basename(lock_path)}")
+            return
+
+        # Another waiter's live lock; put it back unless a new one was taken
+        try:
+            os.link(broken_path, lock_path)
+        except FileExistsError:
+            pass
+    finally:
+        os.remove(broken_path)
+
+
+def _lock_is_stale(lock_path: str, stale_after: float) -> bool:
+    try:
+        age = time.time() - os.path.getmtime(lock_path)
+        with open(lock_path, "r") as f:
+            owner = json.load(f)
+    except FileNotFoundError:
+        return False
+    except ValueError:
+        # The owner may still be writing its details; only trust the age
+        return age > stale_after
+
+    if age > stale_after:
+        return True
+
+    if owner.get("host") == socket.gethostname():
+        return not process_is_running(owner["pid"])
+
+    return False
+
+
+def process_is_running(pid: int) -> bool:
+    """True if a process with this pid is running on this machine."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # Running, but owned by another user
+    return True
+
+
+# --- Year files ---
+
+
+def load_year(
+    path: str,
+    include_plot: bool = True,
+    lazy_plot: bool = False,
+    shared: bool | None = None,
+):
+    """
+    Loads a cached year in any readable data version.
+
+    Plot series are numpy arrays (times are datetime64[s]). With
+    include_plot=False the series aren't decoded at all and days have no
+    'plot' entry, which is enough for calendar highlighting.
+
+    With lazy_plot=True only the summary tier is read up front: each day's
+    start, end, conditions and summary. The series of the whole year are
+    loaded the first time any day's 'plot' is looked up (day_info["plot"]),
+    so building a calendar only reads the file header.
+
+    With shared=True the plot series are read-only views into shared memory
+    that other local processes can attach to, see shared_cache.py. Defaults
+    to constants.SHARED_MEMORY_CACHE.
+    """
+    if lazy_plot:
+        year_info = load_year(path, include_plot=False)
+        loader = _PlotLoader(path)
+        year_info["days"] = {
+            day: _LazyPlotDay(day_info, day=day, loader=loader)
+            for day, day_info in year_info["days"].items()
+        }
+        return year_info
+
+    if shared is None:
+        shared = c.SHARED_MEMORY_CACHE
+    if shared and include_plot:
+        import shared_cache
+
+        return shared_cache.load_year(path)
+
+    if path.endswith(".json"):
+        import legacy
+
+        year_info = legacy.load_legacy_year(path, include_plot=include_plot)
+    else:
+        with open(path, "rb") as f:
+            year_info = read_year(f, include_plot=include_plot)
+
+    # Files written before summaries were stored get them from the conditions
+    for day_info in year_info["days"].values():
+        if "summary" not in day_info:
+            day_info["summary"] = day_summary(day_info)
+
+    return year_info
+
+
+def day_summary(day_info: dict) -> dict:
+    """
+    Summarises a day from its conditions.
+
+    Returns:
+        dict: 'dark minutes' (total moonless astronomical darkness) and
+              'moon illumination' (fraction lit, 0 to 1, at local midnight).
+    """
+    dark_minutes = 0.0
+    for condition in day_info["conditions"]["sky"]:
+        dark_minutes += condition["duration"].total_seconds() / 60
+
+    midnight = day_info["start"] + (day_info["end"] - day_info["start"]) / 2
+    moon_illumination = None
+    for condition in day_info["conditions"]["moon"]:
+        moon_illumination = condition.get("brightness")
+        if condition["end"] >= midnight:
+            break
+
+    return {"dark minutes": dark_minutes, "moon illumination": moon_illumination}
+
+
+class _PlotLoader:
+    """Reads the series tier of a year file once, on first use."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.plots = None
+        self.lock = threading.Lock()
+
+    def get(self, day: str) -> dict:
+        with self.lock:
+            if self.plots is None:
+                year_info = load_year(self.path)
+                self.plots = {
+                    key: day_info["plot"] for key, day_info in year_info["days"].items()
+                }
+        return self.plots[day]
+
+    def __getstate__(self):
+        # Locks can't be pickled; a copy gets its own
+        return {"path": self.path, "plots": self.plots}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+
+class _LazyPlotDay(dict):
+    """Day info whose 'plot' entry is fetched from a _PlotLoader when needed."""
+
+    def __init__(self, day_info: dict, day: str, loader: _PlotLoader):
+        super().__init__(day_info)
+        self.day = day
+        self.loader = loader
+
+    def __missing__(self, key):
+        if key != "plot":
+            raise KeyError(key)
+        self["plot"] = self.loader.get(self.day)
+        return self["plot"]
+
+
+def write_year(year_info: dict, f):
+    """
+    Writes a year to a binary file object in the version 2.0 layout:
+
+        magic | header size (8 bytes) | zlib JSON header | series data
+
+    The header is the summary tier: the year, location and each day's
+    start, end, conditions, summary (see day_summary()) and number of
+    samples. It can be read on its own. The plot series of all days are
+    concatenated and stored with the codec module, so elevations are kept to
+    within codec.MAX_ERROR degrees.
+    """
+    write_year_days(
+        f, year_info["year"], year_info["location"], year_info["days"].items()
+    )
+
+
+def write_year_days(f, year: int, location: dict, days):
+    """
+    Same as write_year(), but takes the days as an iterable of
+    (ISO date, day info) pairs so they can be streamed in one at a time.
+    Only each day's conditions and its plot series as compact arrays are
+    kept until the file is written.
+    """
+    # Deferred so that importing main (and reading headers) doesn't load numpy
+    import numpy as np
+
+    import codec
+
+    header_days = {}
+    series = {key: [] for key in PLOT_SERIES}
+    for day, day_info in days:
+        header_days[day] = {
+            key: value
+            for key, value in day_info.items()
+            if key not in ("plot", "location")
+        }
+        header_days[day]["summary"] = day_summary(day_info)
+        header_days[day]["samples"] = len(day_info["plot"]["times"])
+        series["times"].append(
+            np.asarray(day_info["plot"]["times"], dtype="datetime64[s]")
+        )
+        for key in PLOT_SERIES[1:]:
+            series[key].append(np.asarray(day_info["plot"][key], dtype=float))
+
+    blobs = []
+    series_info = {}
+    offset = 0
+    for key in PLOT_SERIES:
+        values = np.concatenate(series[key]) if series[key] else np.array([])
+        if key == "times":
+            data, metadata = codec.encode_times(values)
+        else:
+            data, metadata = codec.encode_series(values)
+        metadata.update({"offset": offset, "size": len(data)})
+        series_info[key] = metadata
+        blobs.append(data)
+        offset += len(data)
+
+    header = {
+        "year": year,
+        "location": location,
+        "days": header_days,
+        "series": series_info,
+    }
+    header_data = zlib.compress(
+        json.dumps(header, cls=DateTimeEncoder, separators=(",", ":")).encode("utf-8")
+    )
+
+    f.write(YEAR_FILE_MAGIC)
+    f.write(struct.pack("<Q", len(header_data)))
+    f.write(header_data)
+    for data in blobs:
+        f.write(data)
+
+
+def read_year(f, include_plot: bool = True):
+    """
+    Reads a year written by write_year() from a binary file object. With
+    include_plot=False only the header is read.
+    """
+    if f.read(len(YEAR_FILE_MAGIC)) != YEAR_FILE_MAGIC:
+        raise ValueError("Not a version 2.0 year file")
+    (header_size,) = struct.unpack("<Q", f.read(8))
+    header = json.loads(zlib.decompress(f.read(header_size)), object_hook=datetime_decoder)
+
+    if not include_plot:
+        for day_info in header["days"].values():
+            del day_info["samples"]
+        return {
+            "year": header["year"],
+            "location": header["location"],
+            "days": header["days"],
+        }
+
+    import numpy as np
+
+    import codec
+
+    data = f.read()
+
+    # Decode each series for the whole year at once, then split it into days
+    samples = [day_info.pop("samples") for day_info in header["days"].values()]
+    boundaries = np.cumsum(samples)[:-1]
+    plots = [{} for _ in samples]
+    for key, metadata in header["series"].items():
+        blob = data[metadata["offset"] : metadata["offset"] + metadata["size"]]
+        if key == "times":
+            values = codec.decode_times(blob, metadata)
+        else:
+            values = codec.decode_series(blob, metadata)
+        for plot, day_values in zip(plots, np.split(values, boundaries)):
+            plot[key] = day_values
+
+    for day_info, plot in zip(header["days"].values(), plots):
+        day_info["plot"] = plot
+
+    return {
+        "year": header["year"],
+        "location": header["location"],
+        "days": header["days"],
+    }
+
+
+# --- Custom JSON Encoder and Decoder for Datetime Objects ---
+
+
+class DateTimeEncoder(json.JSONEncoder):
+    """
+    Custom JSON encoder to handle date, datetime, and timedelta objects
+    by converting them into a structured, typed dictionary.
+    """
+
+    def default(self, o: Any) -> Any:
+        if isinstance(o, datetime.datetime):
+            return {"__type__": "datetime", "iso": o.isoformat()}
+        if isinstance(o, datetime.date):
+            return {"__type__": "date", "iso": o.isoformat()}
+        if isinstance(o, datetime.timedelta):
+            return {"__type__": "timedelta", "seconds": o.total_seconds()}
+
+        return super().default(o)
+
+
+def datetime_decoder(json_dict: dict) -> Any:
+    """
+    Object hook for json.load() to convert our structured dictionaries
+    back into their original Python objects.
+    """
+    if "__type__" in json_dict:
+        type_name = json_dict["__type__"]
+        if type_name == "datetime":
+            return datetime.datetime.fromisoformat(json_dict["iso"])
+        if type_name == "date":
+            return datetime.date.fromisoformat(json_dict["iso"])
+        if type_name == "timedelta":
+            return datetime.timedelta(seconds=json_dict["seconds"])
+
+    # Return the dictionary as-is if it's not one of our custom types
+    return json_dict
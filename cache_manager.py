@@ -0,0 +1,262 @@
+"""
+Housekeeping for the cached years in the data folder.
+
+- Entries whose location was edited or deleted are removed when the
+  locations are saved (see invalidate_changed_locations()).
+- The folder is kept under a disk quota by evicting the least recently used
+  files: cached years, the per-year ephemeris tables (see
+  ephemeris.year_table()) and month checkpoints left by abandoned builds.
+  Loading a file touches its modification time, so the mtime of a cache file
+  is its last access.
+- list_entries() and cache_stats() report what is stored and how often
+  lookups were served from it in this process.
+"""
+
+import os
+import re
+import threading
+
+import cache
+import constants as c
+
+EPHEMERIS_FILENAME_PATTERN = re.compile(r"ephemeris_year_\d+_v\d+\.npy")
+CHECKPOINT_FILENAME_PATTERN = re.compile(r"(?P<save>.+)\.month_\d{2}\.part")
+
+_stats = {"hits": 0, "misses": 0}
+_stats_lock = threading.Lock()
+
+
+def touch(path: str):
+    """Marks a cache entry as used now."""
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        pass  # Evicted by another process since it was loaded
+
+
+def record_hit():
+    """Counts a year served from the cache (once per main.get_year_info call)."""
+    with _stats_lock:
+        _stats["hits"] += 1
+
+
+def record_miss():
+    """Counts a year that had to be simulated."""
+    with _stats_lock:
+        _stats["misses"] += 1
+
+
+def list_entries(folder: str = c.DATA_FOLDER):
+    """
+    Lists the cached years in a folder, most recently used first.
+
+    Returns:
+        list: One dict per file with the parsed filename parts (see
+              cache.parse_cache_filename) plus 'filename', 'path', 'bytes'
+              and 'last access' (seconds since the epoch).
+    """
+    if not os.path.exists(folder):
+        return []
+
+    entries = []
+    for filename in os.listdir(folder):
+        info = cache.parse_cache_filename(filename)
+        if info is None:
+            continue
+        path = os.path.join(folder, filename)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        info.update(
+            {
+                "filename": filename,
+                "path": path,
+                "bytes": stat.st_size,
+                "last access": stat.st_mtime,
+            }
+        )
+        entries.append(info)
+
+    entries.sort(key=lambda entry: entry["last access"], reverse=True)
+    return entries
+
+
+def cache_stats(folder: str = c.DATA_FOLDER):
+    """
+    Summarises the cache.
+
+    Returns:
+        dict: 'entries' (cached years), 'bytes' (every file the quota
+              counts, see quota_files()), 'hits' and 'misses' (lookups made
+              by this process) and 'hit rate' (None before the first lookup).
+    """
+    entries = list_entries(folder)
+    with _stats_lock:
+        hits, misses = _stats["hits"], _stats["misses"]
+    lookups = hits + misses
+    return {
+        "entries": len(entries),
+        "bytes": sum(entry["bytes"] for entry in quota_files(folder)),
+        "hits": hits,
+        "misses": misses,
+        "hit rate": hits / lookups if lookups else None,
+    }
+
+
+def enforce_quota(
+    max_bytes: int | None = c.CACHE_MAX_BYTES,
+    folder: str = c.DATA_FOLDER,
+    keep=(),
+):
+    """
+    Evicts the least recently used entries until the folder fits the quota.
+
+    Args:
+        max_bytes: Quota in bytes. None disables eviction.
+        folder: Folder holding the cached years.
+        keep: Paths that must not be evicted, e.g. the year just saved.
+
+    Returns:
+        list: Paths of the evicted files.
+    """
+    if max_bytes is None:
+        return []
+
+    keep = {os.path.abspath(path) for path in keep}
+    files = quota_files(folder)
+    total = sum(entry["bytes"] for entry in files)
+
+    evicted = []
+    for entry in reversed(files):  # Oldest access first
+        if total <= max_bytes:
+            break
+        if os.path.abspath(entry["path"]) in keep:
+            continue
+        try:
+            if _remove(entry["path"]):
+                evicted.append(entry["path"])
+        except PermissionError:
+            continue  # In use, e.g. a memory-mapped ephemeris table on Windows
+        total -= entry["bytes"]
+
+    if evicted:
+        print(f"Evicted {len(evicted)} cached files to stay under {max_bytes} bytes.")
+    return evicted
+
+
+def quota_files(folder: str = c.DATA_FOLDER):
+    """
+    Lists every file the quota counts, most recently used first: the cached
+    years (see list_entries()), the ephemeris tables, and month checkpoints
+    whose build is no longer running.
+
+    Returns:
+        list: One dict per file with 'path', 'bytes' and 'last access'.
+    """
+    files = [
+        {key: entry[key] for key in ("path", "bytes", "last access")}
+        for entry in list_entries(folder)
+    ]
+    if not os.path.exists(folder):
+        return files
+
+    for filename in os.listdir(folder):
+        checkpoint = CHECKPOINT_FILENAME_PATTERN.fullmatch(filename)
+        if checkpoint is not None:
+            # A build in progress holds the lock of its year's cache key
+            save_name = checkpoint["save"]
+            if cache.parse_cache_filename(save_name) is None:
+                continue
+            if cache.lock_is_held(save_name[: save_name.rindex("_timestep_")]):
+                continue
+        elif EPHEMERIS_FILENAME_PATTERN.fullmatch(filename) is None:
+            continue
+
+        path = os.path.join(folder, filename)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        files.append(
+            {"path": path, "bytes": stat.st_size, "last access": stat.st_mtime}
+        )
+
+    files.sort(key=lambda entry: entry["last access"], reverse=True)
+    return files
+
+
+def invalidate_changed_locations(
+    old_locations: dict,
+    new_locations: dict,
+    folder: str = c.DATA_FOLDER,
+):
+    """
+    Removes cached years that belonged to edited or deleted locations.
+
+    A location counts as changed if its latitude, longitude or timezone
+    differs. (Horizon profiles are applied to loaded years, so editing one
+    doesn't make any stale.) Its entries are only removed if no location in
+    new_locations can still use them: nearby sites share entries (see
+    cache.get_base_filename), and an entry only serves sites in the timezone
+    it was simulated for. Entries that older versions simulated with a
+    horizon profile serve no one.
+
+    Returns:
+        list: Paths of the removed files.
+    """
+    changed = []
+    for name, old in old_locations.items():
+        new = new_locations.get(name)
+        if new is None or any(
+            old[key] != new[key] for key in ("latitude", "longitude", "timezone")
+        ):
+            changed.append(old)
+    if not changed or not os.path.exists(folder):
+        return []
+
+    # Cache coordinates (and timezones) the saved locations use
+    in_use = {}
+    for L in new_locations.values():
+        in_use.setdefault(_coordinate_key(L["latitude"], L["longitude"]), set()).add(
+            L["timezone"]
+        )
+    stale_keys = {_coordinate_key(L["latitude"], L["longitude"]) for L in changed}
+
+    removed = []
+    for entry in list_entries(folder):
+        key = _coordinate_key(entry["latitude"], entry["longitude"])
+        if key not in stale_keys:
+            continue
+        if key in in_use and entry["horizon"] is None:
+            timezone = entry["timezone"]
+            if timezone is None:  # Named before timezones were part of names
+                try:
+                    timezone = read_entry_location(entry["path"])["timezone"]
+                except (OSError, ValueError):
+                    timezone = None  # Unreadable, so of no use to anyone
+            if timezone in in_use[key]:
+                continue
+        if _remove(entry["path"]):
+            removed.append(entry["path"])
+
+    if removed:
+        print(f"Removed {len(removed)} cached years for edited locations.")
+    return removed
+
+
+def read_entry_location(path: str) -> dict:
+    """Reads the location a cached year was simulated for."""
+    return cache.load_year(path, include_plot=False)["location"]
+
+
+def _coordinate_key(latitude: float, longitude: float):
+    return cache.quantize_coordinate(latitude), cache.quantize_coordinate(longitude)
+
+
+def _remove(path: str) -> bool:
+    try:
+        os.remove(path)
+        return True
+    except FileNotFoundError:
+        return False
@@ -0,0 +1,85 @@
+"""
+Compact storage for the sampled series of a cached year.
+
+Each series is rounded to a fixed number of decimal places, stored as the
+differences between consecutive integers, and zlib-compressed. Sun and moon
+elevations change smoothly, so the differences are small and compress well.
+
+Error bound: values are rounded to the nearest 1/scale, so a decoded value is
+never more than 0.5/scale away from the original. With the default scale of
+100 that is 0.005 degrees for elevations (MAX_ERROR). Times are stored as
+whole seconds and decode exactly.
+"""
+
+import zlib
+
+import numpy as np
+
+ELEVATION_SCALE = 100  # Store hundredths of a degree
+MAX_ERROR = 0.5 / ELEVATION_SCALE  # degrees
+COMPRESSION_LEVEL = 6
+
+
+def encode_series(values, scale: float = ELEVATION_SCALE):
+    """
+    Encodes a 1D series of floats.
+
+    Returns:
+        tuple: (compressed bytes, metadata dict needed by decode_series())
+    """
+    quantized = np.round(np.asarray(values, dtype=float) * scale).astype(np.int64)
+    return _encode_integers(quantized, {"scale": scale})
+
+
+def decode_series(data: bytes, metadata: dict):
+    """Decodes a series written by encode_series() into a float64 array."""
+    return _decode_integers(data, metadata) / metadata["scale"]
+
+
+def encode_times(times):
+    """
+    Encodes naive datetimes (a list of datetime.datetime or a datetime64
+    array) as whole seconds.
+
+    Returns:
+        tuple: (compressed bytes, metadata dict needed by decode_times())
+    """
+    seconds = np.asarray(times, dtype="datetime64[s]").astype(np.int64)
+    return _encode_integers(seconds, {"unit": "s"})
+
+
+def decode_times(data: bytes, metadata: dict):
+    """Decodes times written by encode_times() into a datetime64[s] array."""
+    return _decode_integers(data, metadata).astype("datetime64[s]")
+
+
+def _encode_integers(integers, metadata):
+    origin = int(integers[0]) if len(integers) else 0
+    deltas = np.diff(integers, prepend=origin)
+
+    # Deltas are nearly always small; fall back to wider types when they aren't
+    for dtype in (np.int16, np.int32, np.int64):
+        info = np.iinfo(dtype)
+        if len(deltas) == 0 or (deltas.min() >= info.min and deltas.max() <= info.max):
+            break
+
+    little_endian = np.dtype(dtype).newbyteorder("<")
+    data = zlib.compress(deltas.astype(little_endian).tobytes(), COMPRESSION_LEVEL)
+    metadata.update(
+        {
+            "codec": "delta-zlib",
+            "dtype": np.dtype(dtype).name,
+            "origin": origin,
+            "length": len(integers),
+        }
+    )
+    return data, metadata
+
+
+def _decode_integers(data, metadata):
+    if metadata["codec"] != "delta-zlib":
+        raise ValueError(f"Unknown series codec: {metadata['codec']}")
+
+    dtype = np.dtype(metadata["dtype"]).newbyteorder("<")
+    deltas = np.frombuffer(zlib.decompress(data), dtype=dtype)
+    return metadata["origin"] + np.cumsum(deltas, dtype=np.int64)
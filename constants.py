@@ -1 +1,44 @@
+import os
+
 DEFAULT_TIMEZONE_REGION = "US"
+
+DEFAULT_TIMESTEP = 3  # minutes
+
+# Default stargazing settings of the GUI, exports and server: the shortest
+# dark window worth highlighting, and the hours after midnight it must fall
+# between (4pm to 2am)
+DEFAULT_STARGAZING_DURATION = 60  # minutes
+DEFAULT_STARGAZING_TIMES = (16, 26)
+DATA_FOLDER = "data"
+DATA_VERSION = "2.0"
+
+# Cached years are shared by every site whose coordinates round to the same
+# multiple of this many degrees. 0.01° is roughly 1 km, which moves sun and
+# moon events by a few seconds. Set to None to key on the exact coordinates.
+CACHE_COORDINATE_PRECISION = 0.01  # degrees
+
+# The data folder is kept under this many bytes of cached years by evicting
+# the least recently used ones. Set to None for no limit.
+CACHE_MAX_BYTES = 2 * 1024**3
+
+# Share of one CPU core the background prefetcher may use (see prefetch.py)
+PREFETCH_CPU_BUDGET = 0.25
+
+# Share decoded years with other local processes through shared memory
+# instead of each decoding its own copy (see shared_cache.py)
+SHARED_MEMORY_CACHE = False
+
+# How years are simulated: "fast" (vectorized over per-year ephemeris tables)
+# or "reference" (astral, one sample at a time). See astronomy.ENGINES.
+DEFAULT_ENGINE = "fast"
+
+# Local sky brightness raster (GeoTIFF, or raw with a JSON sidecar) and the
+# units of its values, "mcd/m2" (artificial) or "mag/arcsec2" (total). See
+# lightpollution.py.
+LIGHT_POLLUTION_RASTER = os.path.join(DATA_FOLDER, "light_pollution.tif")
+LIGHT_POLLUTION_UNITS = "mcd/m2"
+
+# Catalog of fixed deep-sky targets (name, common name, type, ra, dec) and
+# the altitude a target must clear to count as visible. See targets.py.
+TARGETS_CATALOG = os.path.join(DATA_FOLDER, "targets.csv")
+MIN_TARGET_ALTITUDE = 20  # degrees
@@ -0,0 +1,410 @@
+"""
+Vectorized sun and moon positions.
+
+These are numpy versions of the formulas astral uses for sun.elevation,
+moon.elevation and moon.phase, so they give the same answers as the loop in
+astronomy.get_day_info but for whole arrays of times and places at once.
+
+The sun and moon positions only depend on the time, so they are also kept
+in per-year tables at a one-minute step (see year_table()). Elevations for
+any observer are then a cheap transform of rows looked up in the table.
+"""
+
+import math
+import os
+
+import numpy as np
+from astral.table4 import table4_u, table4_v, table4_w
+
+import constants as c
+
+J2000 = np.datetime64("2000-01-01T12:00:00", "s")
+CHUNK_SIZE = 20000  # Times per batch when evaluating the lunar series
+
+TABLE_STEP = np.timedelta64(60, "s")
+TABLE_VERSION = 1
+TABLE_COLUMNS = [
+    "sun declination",  # degrees
+    "equation of time",  # minutes
+    "moon right ascension",  # radians
+    "moon declination",  # radians
+    "moon phase",  # 0 to 28
+]
+
+
+def julian_day_2000(utc_times):
+    """
+    Converts UTC times to days since J2000.0.
+
+    Args:
+        utc_times: numpy datetime64 array of naive UTC times.
+    """
+    seconds = (np.asarray(utc_times).astype("datetime64[s]") - J2000).astype(float)
+    return seconds / 86400
+
+
+def minutes_of_day(utc_times):
+    """Minutes since UTC midnight for each time in a datetime64 array."""
+    utc_times = np.asarray(utc_times).astype("datetime64[s]")
+    seconds = (utc_times - utc_times.astype("datetime64[D]")).astype(float)
+    return seconds / 60
+
+
+# --- Sun ---
+
+
+def sun_position(jd2000):
+    """
+    Calculates the sun's position.
+
+    Returns:
+        tuple: (right ascension, declination, equation of time) as arrays;
+               angles in degrees, equation of time in minutes.
+    """
+    t = np.asarray(jd2000) / 36525  # Julian century
+
+    l0 = (280.46646 + t * (36000.76983 + 0.0003032 * t)) % 360.0
+    m = 357.52911 + t * (35999.05029 - 0.0001537 * t)
+    e = 0.016708634 - t * (0.000042037 + 0.0000001267 * t)
+
+    mrad = np.radians(m)
+    center = (
+        np.sin(mrad) * (1.914602 - t * (0.004817 + 0.000014 * t))
+        + np.sin(2 * mrad) * (0.019993 - 0.000101 * t)
+        + np.sin(3 * mrad) * 0.000289
+    )
+
+    omega = 125.04 - 1934.136 * t
+    apparent_long = np.radians(l0 + center - 0.00569 - 0.00478 * np.sin(np.radians(omega)))
+
+    seconds = 21.448 - t * (46.815 + t * (0.00059 - t * 0.001813))
+    obliquity = np.radians(
+        23.0 + (26.0 + (seconds / 60.0)) / 60.0 + 0.00256 * np.cos(np.radians(omega))
+    )
+
+    right_ascension = np.degrees(
+        np.arctan2(np.cos(obliquity) * np.sin(apparent_long), np.cos(apparent_long))
+    )
+    declination = np.degrees(np.arcsin(np.sin(obliquity) * np.sin(apparent_long)))
+
+    y = np.tan(obliquity / 2.0) ** 2
+    l0rad = np.radians(l0)
+    eq_of_time = 4.0 * np.degrees(
+        y * np.sin(2.0 * l0rad)
+        - 2.0 * e * np.sin(mrad)
+        + 4.0 * e * y * np.sin(mrad) * np.cos(2.0 * l0rad)
+        - 0.5 * y * y * np.sin(4.0 * l0rad)
+        - 1.25 * e * e * np.sin(2.0 * mrad)
+    )
+
+    return right_ascension, declination, eq_of_time
+
+
+def sun_elevation(
+    latitude,
+    longitude,
+    utc_minutes,
+    declination,
+    eq_of_time,
+    with_refraction: bool = True,
+    with_azimuth: bool = False,
+):
+    """
+    Calculates the sun's elevation in degrees, like astral.sun.elevation.
+
+    All arguments broadcast against each other, so a column of latitudes and
+    a row of times gives a latitude x time array.
+
+    Args:
+        latitude, longitude: Observer position in degrees.
+        utc_minutes: Minutes since UTC midnight, see minutes_of_day().
+        declination, eq_of_time: From sun_position() for the same times.
+        with_refraction: If True adjust elevation to take refraction into account.
+        with_azimuth: If True return (elevation, azimuth), the azimuth in
+                      degrees east of north like astral.sun.azimuth.
+    """
+    latitude = np.clip(latitude, -89.8, 89.8)
+
+    # 360deg * 4 == 1440 minutes, 60*24 = 1440 minutes == 1 rotation
+    true_solar_time = (utc_minutes + eq_of_time + 4.0 * longitude) % 1440
+    hour_angle = np.radians(true_solar_time / 4.0 - 180.0)
+
+    lat = np.radians(latitude)
+    dec = np.radians(declination)
+    cos_zenith = np.cos(lat) * np.cos(dec) * np.cos(hour_angle) + np.sin(lat) * np.sin(
+        dec
+    )
+    elevation = 90.0 - np.degrees(np.arccos(np.clip(cos_zenith, -1.0, 1.0)))
+
+    if with_refraction:
+        elevation = elevation + refraction(elevation)
+
+    if with_azimuth:
+        # Measured from south towards west, then turned to east of north
+        x = np.cos(hour_angle) * np.sin(lat) * np.cos(dec) - np.sin(dec) * np.cos(lat)
+        azimuth = np.degrees(np.arctan2(np.sin(hour_angle) * np.cos(dec), x))
+        return elevation, (azimuth + 180.0) % 360
+
+    return elevation
+
+
+def refraction(elevation):
+    """Degrees of atmospheric refraction at an elevation, as astral calculates it."""
+    elevation = np.asarray(elevation, dtype=float)
+    correction = np.zeros_like(elevation)
+
+    # Each branch is only evaluated where it applies; most samples of a
+    # night are in the cheap below-horizon branch.
+    low = elevation <= -0.575
+    correction[low] = -20.774 / np.tan(np.radians(elevation[low]))
+
+    near_horizon = (elevation > -0.575) & (elevation <= 5.0)
+    e = elevation[near_horizon]
+    correction[near_horizon] = 1735.0 + e * (
+        -518.2 + e * (103.4 + e * (-12.79 + e * 0.711))
+    )
+
+    high = (elevation > 5.0) & (elevation < 85.0)
+    te = np.tan(np.radians(elevation[high]))
+    correction[high] = 58.1 / te - 0.07 / te**3 + 0.000086 / te**5
+
+    return correction / 3600.0
+
+
+# --- Moon ---
+
+
+def _table_arrays(table):
+    coefficients = np.array([row.coefficient for row in table])
+    t_flags = np.array([row.t for row in table])
+    use_sin = np.array([row.sincos is math.sin for row in table])
+    multipliers = np.zeros((len(table), 12))
+    for i, row in enumerate(table):
+        for arg_number, multiplier in row.argument_multiplers.items():
+            multipliers[i, arg_number - 1] = multiplier
+    return coefficients, t_flags, use_sin, multipliers
+
+
+TABLE_V = _table_arrays(table4_v)
+TABLE_U = _table_arrays(table4_u)
+TABLE_W = _table_arrays(table4_w)
+
+
+def _revolutions(base, rate, jd2000):
+    value = base + rate * jd2000
+    return value - np.trunc(value)
+
+
+def _series(table, arguments, T):
+    coefficients, t_flags, use_sin, multipliers = table
+    angles = 2 * np.pi * (arguments @ multipliers.T)
+    terms = np.where(use_sin, np.sin(angles), np.cos(angles))
+    terms *= np.where(t_flags, T[:, None], 1.0) * coefficients
+    return terms.sum(axis=1)
+
+
+def moon_position(jd2000):
+    """
+    Calculates the moon's position, like astral.moon.moon_position.
+
+    Returns:
+        tuple: (right ascension, declination) in radians and geocentric
+               distance in Earth radii, as arrays shaped like jd2000.
+    """
+    jd2000 = np.asarray(jd2000, dtype=float)
+    shape = jd2000.shape
+    jd2000 = jd2000.ravel()
+
+    right_ascension = np.empty_like(jd2000)
+    declination = np.empty_like(jd2000)
+    distance = np.empty_like(jd2000)
+
+    for start in range(0, len(jd2000), CHUNK_SIZE):
+        jd = jd2000[start : start + CHUNK_SIZE]
+        moon_mean_longitude = _revolutions(0.606434, 0.03660110129, jd)
+        moon_argument_of_latitude = _revolutions(0.259091, 0.03674819520, jd)
+        arguments = np.zeros((len(jd), 12))
+        arguments[:, 0] = moon_mean_longitude  # Lm
+        arguments[:, 1] = _revolutions(0.374897, 0.03629164709, jd)  # Gm
+        arguments[:, 2] = moon_argument_of_latitude  # Fm
+        arguments[:, 3] = _revolutions(0.827362, 0.03386319198, jd)  # D
+        arguments[:, 4] = moon_mean_longitude - moon_argument_of_latitude  # Om
+        arguments[:, 6] = _revolutions(0.779072, 0.00273790931, jd)  # Ls
+        arguments[:, 7] = _revolutions(0.993126, 0.00273777850, jd)  # Gs
+        arguments[:, 11] = _revolutions(0.505498, 0.00445046867, jd)  # L2
+
+        T = jd / 36525 + 1
+        v = _series(TABLE_V, arguments, T)
+        u = _series(TABLE_U, arguments, T)
+        w = _series(TABLE_W, arguments, T)
+
+        chunk = slice(start, start + len(jd))
+        right_ascension[chunk] = (
+            np.arcsin(w / np.sqrt(u - v * v)) + moon_mean_longitude * 2 * np.pi
+        )
+        declination[chunk] = np.arcsin(v / np.sqrt(u))
+        distance[chunk] = 60.40974 * np.sqrt(u)
+
+    return (
+        right_ascension.reshape(shape),
+        declination.reshape(shape),
+        distance.reshape(shape),
+    )
+
+
+def greenwich_sidereal_time(jd2000):
+    """Greenwich Mean Sidereal Time in degrees."""
+    t0 = np.asarray(jd2000) / 36525
+    value = (
+        280.46061837
+        + 360.98564736629 * np.asarray(jd2000)
+        + 0.000387933 * t0**2
+        + t0**3 / 38710000
+    )
+    return value % 360
+
+
+def moon_elevation(
+    latitude,
+    longitude,
+    sidereal_time,
+    right_ascension,
+    declination,
+    with_azimuth: bool = False,
+):
+    """
+    Calculates the moon's elevation in degrees, like astral.moon.elevation.
+
+    Arguments broadcast like sun_elevation(). right_ascension and declination
+    are in radians, sidereal_time in degrees (greenwich_sidereal_time()).
+    If with_azimuth is True, returns (elevation, azimuth) with the azimuth
+    in degrees east of north like astral.moon.azimuth.
+    """
+    hour_angle = np.radians(sidereal_time + longitude) - right_ascension
+
+    sh = np.sin(hour_angle)
+    ch = np.cos(hour_angle)
+    sd = np.sin(declination)
+    cd = np.cos(declination)
+    sl = np.sin(np.radians(latitude))
+    cl = np.cos(np.radians(latitude))
+
+    x = -ch * cd * sl + sd * cl
+    y = -sh * cd
+    z = ch * cd * cl + sd * sl
+    elevation = np.degrees(np.arctan2(z, np.hypot(x, y)))
+
+    if with_azimuth:
+        return elevation, np.degrees(np.arctan2(y, x)) % 360
+    return elevation
+
+
+def moon_phase(jd2000):
+    """
+    Calculates the moon phase (0 to 28), like astral.moon.phase.
+
+    Args:
+        jd2000: Days since J2000.0 of the UTC times, see julian_day_2000().
+    """
+    jd = np.asarray(jd2000) + 2451545.0
+    dt = (jd - 2382148) ** 2 / (41048480 * 86400)
+    t = (jd + dt - 2451545.0) / 36525
+
+    d = np.radians((297.85 + 445267.1115 * t - 0.0016300 * t**2 + t**3 / 545868) % 360.0)
+    m = np.radians((357.53 + 35999.0503 * t) % 360.0)
+    m1 = np.radians(
+        (134.96 + 477198.8676 * t + 0.0089970 * t**2 + t**3 / 69699) % 360.0
+    )
+
+    elongation = (
+        np.degrees(d)
+        + 6.29 * np.sin(m1)
+        - 2.10 * np.sin(m)
+        + 1.27 * np.sin(2 * d - m1)
+        + 0.66 * np.sin(2 * d)
+    ) % 360.0
+    phase = ((np.floor(elongation) + 6.43) / 360) * 28
+    return np.where(phase >= 28.0, phase - 28.0, phase)
+
+
+# --- Per-year tables ---
+
+_tables = {}  # year -> table, see year_table()
+
+
+def year_table(year: int, folder: str = c.DATA_FOLDER):
+    """
+    Returns the sun and moon positions for a year at a one-minute step.
+
+    The table is calculated once and saved in the data folder, then memory
+    mapped, so only the parts that are used are read.
+
+    Returns:
+        numpy.ndarray: Shape (len(TABLE_COLUMNS), minutes). Column 0 is
+                       00:00 UTC on December 31st of the year before; the
+                       table runs to 00:00 UTC on January 3rd of the year
+                       after, which covers every local day of the year.
+    """
+    if year in _tables:
+        return _tables[year]
+
+    path = os.path.join(folder, f"ephemeris_year_{year}_v{TABLE_VERSION}.npy")
+    if not os.path.exists(path):
+        import cache
+
+        utc_times = np.arange(
+            _table_start(year), _table_start(year + 1) + 3 * 1440 * TABLE_STEP, TABLE_STEP
+        )
+        jd2000 = julian_day_2000(utc_times)
+        _, sun_declination, eq_of_time = sun_position(jd2000)
+        moon_ra, moon_declination, _ = moon_position(jd2000)
+        table = np.stack(
+            [sun_declination, eq_of_time, moon_ra, moon_declination, moon_phase(jd2000)]
+        )
+        with cache.atomic_open(path, "wb") as f:
+            np.save(f, table)
+
+    _tables[year] = np.load(path, mmap_mode="r")
+    try:
+        os.utime(path)  # Last access, for the cache quota (see cache_manager.py)
+    except OSError:
+        pass
+    return _tables[year]
+
+
+def positions_at(utc_times, year: int):
+    """
+    Looks up the sun and moon positions for times within a year's table.
+
+    Times that aren't on the table's minute grid (only possible with
+    historical timezone offsets) are calculated directly instead.
+
+    Args:
+        utc_times: datetime64 array of naive UTC times.
+        year: The year whose table covers the times.
+
+    Returns:
+        dict: TABLE_COLUMNS -> array shaped like utc_times.
+    """
+    utc_times = np.asarray(utc_times).astype("datetime64[s]")
+    offsets = utc_times - _table_start(year)
+    table = year_table(year)
+
+    index, remainder = np.divmod(offsets, TABLE_STEP)
+    if (
+        np.all(remainder == np.timedelta64(0, "s"))
+        and index.min() >= 0
+        and index.max() < table.shape[1]
+    ):
+        rows = table[:, index.astype(int)]
+        return dict(zip(TABLE_COLUMNS, rows))
+
+    jd2000 = julian_day_2000(utc_times)
+    _, sun_declination, eq_of_time = sun_position(jd2000)
+    moon_ra, moon_declination, _ = moon_position(jd2000)
+    columns = [sun_declination, eq_of_time, moon_ra, moon_declination, moon_phase(jd2000)]
+    return dict(zip(TABLE_COLUMNS, columns))
+
+
+def _table_start(year: int):
+    return np.datetime64(f"{year - 1}-12-31T00:00:00", "s")
@@ -0,0 +1,281 @@
+"""
+Calendar (.ics) and CSV export of stargazing windows.
+
+Writes the dark windows that make a day highlighted in the calendar (see
+main.stargazing_windows) as events with their exact start and end, for any
+saved locations and date range. Each window carries its duration and the
+moon's illumination, from the day's moon conditions.
+
+Days are read as a stream: one location-year of conditions is loaded at a
+time and each window is written out as soon as it is found, so memory
+doesn't grow with the number of sites or years.
+
+Usage (from the repository root):
+    python export.py OUTPUT.ics|OUTPUT.csv --from 2025-01-01 --to 2026-12-31
+                     [--locations NAME ...] [--timestep MIN]
+                     [--duration MIN] [--start H] [--end H]
+"""
+
+import argparse
+import csv
+import datetime
+import hashlib
+
+import pytz
+
+import cache
+import constants as c
+import locations as loc
+import main
+
+CSV_COLUMNS = [
+    "location",
+    "latitude",
+    "longitude",
+    "timezone",
+    "date",
+    "start",
+    "end",
+    "minutes",
+    "moon illumination",
+]
+ICS_LINE_LENGTH = 75  # octets, longer lines are folded (RFC 5545)
+
+
+def iter_windows(
+    location_names,
+    start_day: datetime.date,
+    end_day: datetime.date,
+    timestep_minutes: int = c.DEFAULT_TIMESTEP,
+    stargazing_times=c.DEFAULT_STARGAZING_TIMES,
+    stargazing_duration: datetime.timedelta = datetime.timedelta(
+        minutes=c.DEFAULT_STARGAZING_DURATION
+    ),
+):
+    """
+    Yields every stargazing window for some locations over a date range.
+
+    Windows come in the order of location_names, then by day. Years that
+    aren't cached yet are simulated first.
+
+    Args:
+        location_names: Names of saved locations (see locations.py).
+        start_day, end_day: The first and last day to include.
+        timestep_minutes: The interval in minutes for the calculation.
+        stargazing_times: (start, end) in hours after midnight, as for
+            main.get_calendar_info().
+        stargazing_duration: The shortest dark window worth including.
+
+    Yields:
+        dict: 'location' (LocationInfo), 'date' (ISO date), 'start' and
+              'end' (local datetimes), 'minutes' and 'moon illumination'
+              (fraction lit, 0 to 1).
+    """
+    saved_locations = loc.get_locations()
+    for name in location_names:
+        if name not in saved_locations:
+            raise ValueError(f"Unknown location: {name}")
+
+    for name in location_names:
+        entry = saved_locations[name]
+        location = loc.to_location_info(name, entry)
+
+        for year in range(start_day.year, end_day.year + 1):
+            # Only the conditions are needed, not the plot series. Dark windows
+            # don't depend on the horizon profile, so it isn't applied.
+            year_info = main.get_year_info(
+                location, year, timestep_minutes=timestep_minutes, include_plot=False
+            )
+            for day, day_info in year_info["days"].items():
+                if not start_day.isoformat() <= day <= end_day.isoformat():
+                    continue
+                windows = main.stargazing_windows(
+                    day, day_info, stargazing_times, stargazing_duration
+                )
+                for start, end in windows:
+                    yield {
+                        "location": location,
+                        "date": day,
+                        "start": start,
+                        "end": end,
+                        "minutes": (end - start).total_seconds() / 60,
+                        "moon illumination": _moon_illumination(day_info, start, end),
+                    }
+
+
+def _moon_illumination(day_info: dict, start, end):
+    """The moon's illumination from the moon condition around a window's middle."""
+    middle = start + (end - start) / 2
+    illumination = None
+    for condition in day_info["conditions"]["moon"]:
+        illumination = condition.get("brightness")
+        if condition["end"] >= middle:
+            break
+    if illumination is None:
+        illumination = day_info["summary"]["moon illumination"]
+    return illumination
+
+
+# --- Writers ---
+
+
+def export_windows(path: str, windows) -> int:
+    """
+    Writes windows from iter_windows() to a .ics or .csv file, picked by the
+    file extension. The file is replaced only once it's complete.
+
+    Returns:
+        int: The number of windows written.
+    """
+    if path.lower().endswith(".ics"):
+        with cache.atomic_open(path, "wb") as f:
+            count = write_ics(f, windows)
+    elif path.lower().endswith(".csv"):
+        with cache.atomic_open(path, "w") as f:
+            count = write_csv(f, windows)
+    else:
+        raise ValueError(f"Unknown export format: {path} (use .ics or .csv)")
+    print(f"Exported {count} stargazing windows to '{path}'")
+    return count
+
+
+def write_csv(f, windows) -> int:
+    """Writes windows as CSV rows, one per window. Times are local."""
+    writer = csv.writer(f, lineterminator="\n")
+    writer.writerow(CSV_COLUMNS)
+    count = 0
+    for window in windows:
+        location = window["location"]
+        illumination = window["moon illumination"]
+        writer.writerow(
+            [
+                location.name,
+                location.latitude,
+                location.longitude,
+                location.timezone,
+                window["date"],
+                window["start"].isoformat(),
+                window["end"].isoformat(),
+                f"{window['minutes']:.0f}",
+                "" if illumination is None else f"{illumination:.3f}",
+            ]
+        )
+        count += 1
+    return count
+
+
+def write_ics(f, windows) -> int:
+    """
+    Writes windows as iCalendar events to a binary file, one per window.
+
+    Event times are in UTC so every calendar app places them the same way.
+    Each event's UID comes from its location and start, so importing an
+    export again updates the events instead of duplicating them.
+    """
+    stamp = datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    _write_ics_lines(
+        f,
+        [
+            "BEGIN:VCALENDAR",
+            "VERSION:2.0",
+            "PRODID:-//stargazing-calendar//Stargazing windows//EN",
+            "CALSCALE:GREGORIAN",
+        ],
+    )
+
+    count = 0
+    for window in windows:
+        location = window["location"]
+        start = _utc_stamp(window["start"], location.timezone)
+        end = _utc_stamp(window["end"], location.timezone)
+        minutes = window["minutes"]
+        illumination = window["moon illumination"]
+        moon = "" if illumination is None else f", moon {illumination:.0%} lit"
+        uid = hashlib.sha1(
+            f"{location.name}|{location.latitude}|{location.longitude}|{start}".encode()
+        ).hexdigest()
+
+        _write_ics_lines(
+            f,
+            [
+                "BEGIN:VEVENT",
+                f"UID:{uid}@stargazing-calendar",
+                f"DTSTAMP:{stamp}",
+                f"DTSTART:{start}",
+                f"DTEND:{end}",
+                "SUMMARY:" + _ics_text(f"Stargazing at {location.name}"),
+                "LOCATION:" + _ics_text(location.name),
+                f"GEO:{location.latitude:.6f};{location.longitude:.6f}",
+                "DESCRIPTION:"
+                + _ics_text(f"{minutes:.0f} minutes of dark, moonless sky{moon}"),
+                "TRANSP:TRANSPARENT",
+                "END:VEVENT",
+            ],
+        )
+        count += 1
+
+    _write_ics_lines(f, ["END:VCALENDAR"])
+    return count
+
+
+def _utc_stamp(local_time: datetime.datetime, timezone: str) -> str:
+    """An iCalendar UTC time for a naive local time at a location."""
+    aware = pytz.timezone(timezone).localize(local_time)
+    return aware.astimezone(pytz.utc).strftime("%Y%m%dT%H%M%SZ")
+
+
+def _ics_text(text: str) -> str:
+    """Escapes an iCalendar TEXT value."""
+    return (
+        text.replace("\\", "\\\\")
+        .replace(";", "\\;")
+        .replace(",", "\\,")
+        .replace("\n", "\\n")
+    )
+
+
+def _write_ics_lines(f, lines):
+    """Writes content lines with CRLF endings, folding any that are too long."""
+    for line in lines:
+        data = line.encode("utf-8")
+        while len(data) > ICS_LINE_LENGTH:
+            # Fold on a character boundary, continuing with a space
+            cut = ICS_LINE_LENGTH
+            while data[cut] & 0xC0 == 0x80:
+                cut -= 1
+            f.write(data[:cut] + b"\r\n")
+            data = b" " + data[cut:]
+        f.write(data + b"\r\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("output", help="The .ics or .csv file to write")
+    parser.add_argument(
+        "--from", dest="start_day", required=True, type=datetime.date.fromisoformat
+    )
+    parser.add_argument(
+        "--to", dest="end_day", required=True, type=datetime.date.fromisoformat
+    )
+    parser.add_argument(
+        "--locations", nargs="+", help="Saved location names (default: all)"
+    )
+    parser.add_argument("--timestep", type=int, default=c.DEFAULT_TIMESTEP)
+    parser.add_argument(
+        "--duration", type=float, default=c.DEFAULT_STARGAZING_DURATION
+    )
+    parser.add_argument("--start", type=float, default=c.DEFAULT_STARGAZING_TIMES[0])
+    parser.add_argument("--end", type=float, default=c.DEFAULT_STARGAZING_TIMES[1])
+    args = parser.parse_args()
+
+    export_windows(
+        args.output,
+        iter_windows(
+            args.locations or list(loc.get_locations()),
+            args.start_day,
+            args.end_day,
+            timestep_minutes=args.timestep,
+            stargazing_times=(args.start, args.end),
+            stargazing_duration=datetime.timedelta(minutes=args.duration),
+        ),
+    )
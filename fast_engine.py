@@ -0,0 +1,187 @@
+"""
+The "fast" engine: astronomy.get_day_info vectorized over a day's samples.
+
+Kept apart from astronomy so that importing it (and the astral engine)
+doesn't load numpy and the ephemeris tables.
+"""
+
+import datetime
+import math
+
+import numpy as np
+import pytz
+from astral import LocationInfo
+
+import astronomy
+import ephemeris
+
+
+def get_day_info_fast(
+    location: LocationInfo,
+    day: datetime.date,
+    timestep_minutes: int,
+):
+    """
+    Same as astronomy.get_day_info(), but vectorized over the day's samples.
+
+    Sun and moon positions come from the year's ephemeris table (see
+    ephemeris.year_table()), so only the observer-specific elevation is
+    calculated here. The result has the same
+    layout, except that the plot series are numpy arrays (times are
+    datetime64[s]).
+    """
+    start_time, end_time, utc_times = day_samples(location, day, timestep_minutes)
+    times = local_sample_times(location, start_time, end_time, utc_times)
+
+    positions = ephemeris.positions_at(utc_times, day.year)
+    jd2000 = ephemeris.julian_day_2000(utc_times)
+    sun_elevations = ephemeris.sun_elevation(
+        location.latitude,
+        location.longitude,
+        ephemeris.minutes_of_day(utc_times),
+        positions["sun declination"],
+        positions["equation of time"],
+    )
+    moon_elevations = ephemeris.moon_elevation(
+        location.latitude,
+        location.longitude,
+        ephemeris.greenwich_sidereal_time(jd2000),
+        positions["moon right ascension"],
+        positions["moon declination"],
+    )
+    moon_brightness = -np.cos(positions["moon phase"] * math.pi / 14) / 2 + 0.5
+
+    # Same states as astronomy.get_day_info
+    sun_states = np.select(
+        [
+            sun_elevations >= 0,
+            sun_elevations >= -6,
+            sun_elevations >= -12,
+            sun_elevations >= astronomy.NIGHT_SUN_ELEVATION,
+        ],
+        ["day", "civil twilight", "nautical twilight", "astronomical twilight"],
+        default="night",
+    )
+    moon_states = np.select(
+        [
+            moon_elevations >= 0,
+            moon_elevations >= astronomy.MOON_DARKNESS_THRESHOLD,
+        ],
+        ["moon up", "moon twilight"],
+        default="moon down",
+    )
+    sky_states = np.where(
+        (sun_states == "night") & (moon_states == "moon down"), "dark", "not dark"
+    )
+
+    local_times = times.astype(datetime.datetime)
+    sun_conditions = state_conditions(sun_states, local_times)
+    moon_conditions = state_conditions(moon_states, local_times)
+    for condition, brightness in zip(
+        moon_conditions, moon_brightness[condition_ends(moon_states)]
+    ):
+        condition["brightness"] = float(brightness)
+    sky_conditions = state_conditions(sky_states, local_times)
+    for condition in sky_conditions:
+        condition["duration"] = condition["end"] - condition["start"]
+    sky_conditions = [
+        condition for condition in sky_conditions if condition["state"] == "dark"
+    ]
+
+    return {
+        "location": {
+            "name": location.name,
+            "region": location.region,
+            "timezone": location.timezone,
+            "latitude": location.latitude,
+            "longitude": location.longitude,
+        },
+        "day": day,
+        "start": start_time.replace(tzinfo=None),
+        "end": end_time.replace(tzinfo=None),
+        "conditions": {
+            "sun": sun_conditions,
+            "moon": moon_conditions,
+            "sky": sky_conditions,
+        },
+        "plot": {
+            "times": times,
+            "sun": sun_elevations,
+            "moon": moon_elevations,
+            "moon phases": moon_brightness * astronomy.MOON_SIZE,
+        },
+    }
+
+
+def day_samples(location: LocationInfo, day: datetime.date, timestep_minutes: int):
+    """
+    The sample times of a day, the same ones astronomy.get_day_info() uses:
+    every timestep from local noon to local noon the next day, inclusive.
+
+    Returns:
+        tuple: (start time, end time) as timezone-aware datetimes and the
+               samples as a datetime64[s] array of naive UTC times.
+    """
+    tz = pytz.timezone(location.timezone)
+    start_time = tz.localize(datetime.datetime.combine(day, datetime.time(12, 0)))
+    end_time = tz.localize(
+        datetime.datetime.combine(
+            day + datetime.timedelta(days=1), datetime.time(12, 0)
+        )
+    )
+    utc_start_time = start_time.astimezone(datetime.timezone.utc)
+    utc_end_time = end_time.astimezone(datetime.timezone.utc)
+
+    num_samples = (utc_end_time - utc_start_time) // datetime.timedelta(
+        minutes=timestep_minutes
+    ) + 1
+    steps = np.arange(num_samples) * np.timedelta64(timestep_minutes * 60, "s")
+    utc_times = np.datetime64(utc_start_time.replace(tzinfo=None), "s") + steps
+    return start_time, end_time, utc_times
+
+
+def local_sample_times(location: LocationInfo, start_time, end_time, utc_times):
+    """
+    The local (naive) times of a day's samples, from day_samples(), as the
+    'plot' times and conditions of astronomy.get_day_info() use them.
+
+    Returns:
+        numpy.ndarray: datetime64[s] local times, shaped like utc_times.
+    """
+    if start_time.utcoffset() == end_time.utcoffset():
+        offset = np.timedelta64(int(start_time.utcoffset().total_seconds()), "s")
+        return utc_times + offset
+
+    # Daylight saving changes during the day; convert each sample
+    tz = pytz.timezone(location.timezone)
+    return np.array(
+        [
+            pytz.utc.localize(time).astimezone(tz).replace(tzinfo=None)
+            for time in utc_times.astype(datetime.datetime)
+        ],
+        dtype="datetime64[s]",
+    )
+
+
+def condition_ends(states):
+    """Index of the sample that ends each run of equal states."""
+    changes = np.flatnonzero(states[1:] != states[:-1]) + 1
+    return np.append(changes, len(states) - 1)
+
+
+def state_conditions(states, local_times):
+    """
+    Splits a day's states into conditions the way astronomy.get_day_info
+    does: a condition ends at the first sample of the next one, and the last
+    one ends at the last sample.
+    """
+    ends = condition_ends(states)
+    starts = np.insert(ends[:-1], 0, 0)
+    return [
+        {
+            "state": str(states[start]),
+            "start": local_times[start],
+            "end": local_times[end],
+        }
+        for start, end in zip(starts, ends)
+    ]
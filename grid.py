@@ -0,0 +1,326 @@
+import datetime
+import multiprocessing
+import os
+
+import numpy as np
+
+import astronomy
+import constants as c
+import ephemeris
+
+TILE_WIDTH = 64  # Longitude columns handled together (and per worker task)
+MAX_TILE_SAMPLES = 2_000_000  # Grid points x timesteps evaluated at once
+
+
+def dark_hours_grid(
+    latitudes,
+    longitudes,
+    start_day: datetime.date,
+    end_day: datetime.date | None = None,
+    timestep_minutes: int = c.DEFAULT_TIMESTEP,
+    max_tile_samples: int = MAX_TILE_SAMPLES,
+    processes: int = 1,
+):
+    """
+    Calculates hours of moonless astronomical darkness over a lat/lon grid.
+
+    Uses the same rule as astronomy.get_day_info: the sky is dark when the sun
+    is below NIGHT_SUN_ELEVATION and the moon is below MOON_DARKNESS_THRESHOLD.
+    Each night runs from local solar noon to the next local solar noon at each
+    longitude, so no timezones are needed.
+
+    The grid is evaluated in tiles of at most `max_tile_samples` grid points x
+    timesteps, so memory stays bounded however large the grid is.
+
+    Args:
+        latitudes: 1D array of grid latitudes (rows).
+        longitudes: 1D array of grid longitudes (columns).
+        start_day: First night to include.
+        end_day: Last night to include. Defaults to start_day.
+        timestep_minutes: The interval in minutes for the calculation.
+        max_tile_samples: Upper bound on the size of each tile.
+        processes: Worker processes to split the grid columns across.
+
+    Returns:
+        numpy.ndarray: Dark hours shaped (len(latitudes), len(longitudes)).
+    """
+    latitudes = np.asarray(latitudes, dtype=float)
+    longitudes = np.asarray(longitudes, dtype=float)
+    if end_day is None:
+        end_day = start_day
+
+    num_nights = (end_day - start_day).days + 1
+    nights = [start_day + datetime.timedelta(days=i) for i in range(num_nights)]
+
+    tasks = [
+        (
+            latitudes,
+            longitudes[start : start + TILE_WIDTH],
+            start,
+            nights,
+            timestep_minutes,
+            max_tile_samples,
+        )
+        for start in range(0, len(longitudes), TILE_WIDTH)
+    ]
+
+    hours = np.zeros((len(latitudes), len(longitudes)), dtype=np.float32)
+    if processes > 1 and len(tasks) > 1:
+        with multiprocessing.Pool(processes=processes) as pool:
+            for start, tile_hours in pool.imap_unordered(
+                _column_tile_dark_hours, tasks
+            ):
+                hours[:, start : start + tile_hours.shape[1]] = tile_hours
+    else:
+        for task in tasks:
+            start, tile_hours = _column_tile_dark_hours(task)
+            hours[:, start : start + tile_hours.shape[1]] = tile_hours
+
+    return hours
+
+
+def dark_hours_at(
+    latitudes,
+    longitudes,
+    start_day: datetime.date,
+    end_day: datetime.date | None = None,
+    timestep_minutes: int = c.DEFAULT_TIMESTEP,
+    max_tile_samples: int = MAX_TILE_SAMPLES,
+    processes: int = 1,
+):
+    """
+    Same as dark_hours_grid(), but for a list of points (such as observing
+    sites) rather than every pair of a latitude and a longitude.
+
+    Sun and moon positions come from the year tables (see
+    ephemeris.year_table()), so each night is one vectorized pass over all
+    the points. Nights start at local solar noon rounded to the minute.
+
+    Args:
+        latitudes, longitudes: 1D arrays of the points' coordinates.
+        start_day, end_day, timestep_minutes, max_tile_samples, processes:
+            As for dark_hours_grid().
+
+    Returns:
+        numpy.ndarray: Dark hours for each point.
+    """
+    latitudes = np.asarray(latitudes, dtype=float)
+    longitudes = np.asarray(longitudes, dtype=float)
+    if end_day is None:
+        end_day = start_day
+
+    num_nights = (end_day - start_day).days + 1
+    nights = [start_day + datetime.timedelta(days=i) for i in range(num_nights)]
+    num_steps = 24 * 60 // timestep_minutes + 1
+    points = max(1, max_tile_samples // num_steps)
+
+    tasks = [
+        (
+            latitudes[start : start + points],
+            longitudes[start : start + points],
+            start,
+            nights,
+            timestep_minutes,
+        )
+        for start in range(0, len(latitudes), points)
+    ]
+
+    hours = np.zeros(len(latitudes), dtype=np.float32)
+    if processes > 1 and len(tasks) > 1:
+        with multiprocessing.Pool(processes=processes) as pool:
+            for start, tile_hours in pool.imap_unordered(_point_tile_dark_hours, tasks):
+                hours[start : start + len(tile_hours)] = tile_hours
+    else:
+        for task in tasks:
+            start, tile_hours = _point_tile_dark_hours(task)
+            hours[start : start + len(tile_hours)] = tile_hours
+
+    return hours
+
+
+def create_dark_hours_map(
+    latitude_range,
+    longitude_range,
+    shape,
+    day: datetime.date | None = None,
+    year: int | None = None,
+    month: int | None = None,
+    timestep_minutes: int = c.DEFAULT_TIMESTEP,
+    processes: int = 1,
+):
+    """
+    Calculates a regional dark-hours grid for one night or a whole month and
+    saves it as a NumPy array (data folder) and a PNG heatmap (images folder).
+
+    Args:
+        latitude_range: (south, north) bounds in degrees.
+        longitude_range: (west, east) bounds in degrees.
+        shape: (rows, columns) of the grid, e.g. (500, 500).
+        day: The night to map. Give either this or year and month.
+        year, month: The month to map.
+        timestep_minutes: The interval in minutes for the calculation.
+        processes: Worker processes to split the grid across.
+
+    Returns:
+        tuple: (array path, image path)
+    """
+    if day is not None:
+        start_day = end_day = day
+        period = day.isoformat()
+        period_text = f"the night of {day.isoformat()}"
+    else:
+        start_day = datetime.date(year, month, 1)
+        end_day = datetime.date(
+            year + month // 12, month % 12 + 1, 1
+        ) - datetime.timedelta(days=1)
+        period = start_day.strftime("%Y-%m")
+        period_text = start_day.strftime("%B %Y")
+
+    latitudes = np.linspace(latitude_range[0], latitude_range[1], shape[0])
+    longitudes = np.linspace(longitude_range[0], longitude_range[1], shape[1])
+    hours = dark_hours_grid(
+        latitudes,
+        longitudes,
+        start_day,
+        end_day,
+        timestep_minutes=timestep_minutes,
+        processes=processes,
+    )
+
+    name = (
+        f"dark_hours_lat_{latitude_range[0]}_{latitude_range[1]}"
+        f"_lon_{longitude_range[0]}_{longitude_range[1]}"
+        f"_{shape[0]}x{shape[1]}_{period}_timestep_{timestep_minutes}"
+    )
+
+    os.makedirs(c.DATA_FOLDER, exist_ok=True)
+    array_path = os.path.join(c.DATA_FOLDER, f"{name}.npy")
+    np.save(array_path, hours)
+
+    image_path = save_dark_hours_heatmap(
+        hours,
+        latitude_range,
+        longitude_range,
+        title=f"Moonless Astronomical Darkness, {period_text}",
+        filename=f"{name}.png",
+    )
+    print(f"Grid saved to '{array_path}'")
+
+    return array_path, image_path
+
+
+def save_dark_hours_heatmap(hours, latitude_range, longitude_range, title, filename):
+    """Draws a dark-hours grid as a heatmap and saves it in the images folder."""
+    from matplotlib import pyplot as plt
+
+    if not os.path.exists("images"):
+        os.makedirs("images")
+        print("Created 'images' directory.")
+
+    fig, ax = plt.subplots(figsize=(10, 8))
+    image = ax.imshow(
+        hours,
+        origin="lower",
+        extent=[
+            longitude_range[0],
+            longitude_range[1],
+            latitude_range[0],
+            latitude_range[1],
+        ],
+        aspect="auto",
+        cmap="magma",
+        interpolation="nearest",
+    )
+    fig.colorbar(image, ax=ax, label="Dark hours")
+    ax.set_title(title)
+    ax.set_xlabel("Longitude (Degrees)")
+    ax.set_ylabel("Latitude (Degrees)")
+
+    filepath = os.path.join("images", filename)
+    fig.savefig(filepath, dpi=150)
+    plt.close(fig)
+    print(f"Heatmap saved to '{filepath}'")
+
+    return filepath
+
+
+def _column_tile_dark_hours(task):
+    """Dark hours for every latitude in one tile of longitude columns."""
+    latitudes, longitudes, start, nights, timestep_minutes, max_tile_samples = task
+
+    num_steps = 24 * 60 // timestep_minutes + 1
+    steps = np.arange(num_steps) * np.timedelta64(timestep_minutes * 60, "s")
+    # Local solar noon is 4 minutes (240s) earlier for every degree east
+    noon_offsets = np.round(-longitudes * 240).astype("timedelta64[s]")
+
+    # Latitude rows per chunk so each chunk has at most max_tile_samples samples
+    rows = max(1, max_tile_samples // (len(longitudes) * num_steps))
+
+    hours = np.zeros((len(latitudes), len(longitudes)), dtype=np.float32)
+    for night in nights:
+        noon = np.datetime64(night, "s") + np.timedelta64(12, "h")
+        utc_times = noon + noon_offsets[:, None] + steps[None, :]  # lon x time
+
+        # Sun and moon positions only depend on time, not on latitude
+        jd2000 = ephemeris.julian_day_2000(utc_times)
+        _, sun_declination, eq_of_time = ephemeris.sun_position(jd2000)
+        utc_minutes = ephemeris.minutes_of_day(utc_times)
+        moon_ra, moon_declination, _ = ephemeris.moon_position(jd2000)
+        sidereal_time = ephemeris.greenwich_sidereal_time(jd2000)
+
+        for row in range(0, len(latitudes), rows):
+            lat = latitudes[row : row + rows, None, None]
+            lon = longitudes[None, :, None]
+            sun_elev = ephemeris.sun_elevation(
+                lat, lon, utc_minutes, sun_declination, eq_of_time
+            )
+            dark = sun_elev < astronomy.NIGHT_SUN_ELEVATION
+            del sun_elev
+            moon_elev = ephemeris.moon_elevation(
+                lat, lon, sidereal_time, moon_ra, moon_declination
+            )
+            dark &= moon_elev < astronomy.MOON_DARKNESS_THRESHOLD
+            del moon_elev
+            hours[row : row + rows] += dark.sum(axis=2) * (timestep_minutes / 60)
+
+    return start, hours
+
+
+def _point_tile_dark_hours(task):
+    """Dark hours at each point of one tile of points."""
+    latitudes, longitudes, start, nights, timestep_minutes = task
+
+    num_steps = 24 * 60 // timestep_minutes + 1
+    steps = np.arange(num_steps) * np.timedelta64(timestep_minutes * 60, "s")
+    # Whole minutes, so every sample is a row of the year table
+    noon_offsets = np.round(-longitudes * 4).astype(int) * np.timedelta64(60, "s")
+    lat = latitudes[:, None]
+    lon = longitudes[:, None]
+
+    hours = np.zeros(len(latitudes), dtype=np.float32)
+    for night in nights:
+        noon = np.datetime64(night, "s") + np.timedelta64(12, "h")
+        utc_times = noon + noon_offsets[:, None] + steps[None, :]  # point x time
+
+        positions = ephemeris.positions_at(utc_times, night.year)
+        sun_elev = ephemeris.sun_elevation(
+            lat,
+            lon,
+            ephemeris.minutes_of_day(utc_times),
+            positions["sun declination"],
+            positions["equation of time"],
+        )
+        dark = sun_elev < astronomy.NIGHT_SUN_ELEVATION
+        del sun_elev
+        moon_elev = ephemeris.moon_elevation(
+            lat,
+            lon,
+            ephemeris.greenwich_sidereal_time(ephemeris.julian_day_2000(utc_times)),
+            positions["moon right ascension"],
+            positions["moon declination"],
+        )
+        dark &= moon_elev < astronomy.MOON_DARKNESS_THRESHOLD
+        del moon_elev
+        hours += dark.sum(axis=1) * (timestep_minutes / 60)
+
+    return start, hours
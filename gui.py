@@ -1,31 +1,29 @@
 import datetime
-import importlib
+import threading
 from functools import partial
-import matplotlib.pyplot as plt
-import matplotlib.patches as patches
-import matplotlib.dates as mdates
 import ipywidgets as widgets
-from astral import LocationInfo
 from IPython.display import display
 
 import main
+import constants as c
 import locations as loc
-import images as im
 import colors
-
-importlib.reload(main)
-importlib.reload(loc)
-importlib.reload(im)
-importlib.reload(colors)
+import prefetch
+import horizon as hz
 
 
 def plot_day(day_info):
+    # matplotlib is only loaded once a plot is actually requested
+    import matplotlib.pyplot as plt
+    import matplotlib.patches as patches
+    import matplotlib.dates as mdates
 
     moon_size = 150
     sun_size = 200
 
     condition_colors = {
         "day": colors.DAY,
+        "sun behind horizon": colors.DAY,  # Behind the skyline, the sky is lit
         "civil twilight": colors.CIVIL_TWILIGHT,
         "nautical twilight": colors.NAUTICAL_TWILIGHT,
         "astronomical twilight": colors.ASTRONOMICAL_TWILIGHT,
@@ -34,6 +32,7 @@ def plot_day(day_info):
 
     condition_alpha_multipliers = {
         "moon up": 1.00,
+        "moon behind horizon": 1.00,  # Behind the skyline, still lighting the sky
         "moon twilight": 0.50,
         "moon down": 0.00,
     }
@@ -125,11 +124,17 @@ def plot_day(day_info):
     return True
 
 
-def create_stargazing_gui():
+def create_stargazing_gui(prefetch_years: bool = False):
     """
     Creates and displays an ipywidgets GUI for stargazing data with improved layout
     and custom slider readouts.
+
+    Args:
+        prefetch_years: If True, this year and next year are built in the
+                        background for every saved location (see prefetch.py).
     """
+    if prefetch_years:
+        prefetch.start_prefetch()
 
     # Helper function to format minutes into hours and minutes
     def format_duration(total_minutes):
@@ -176,7 +181,7 @@ def create_stargazing_gui():
 
     # --- Stargazing Minimum Length Slider with Custom Readout ---
     stargazing_slider = widgets.IntSlider(
-        value=60,
+        value=c.DEFAULT_STARGAZING_DURATION,
         min=15,
         max=360,
         step=15,
@@ -197,7 +202,7 @@ def create_stargazing_gui():
 
     # --- Stargazing Allowable Times Slider with Custom Readout ---
     stargazing_range_slider = widgets.FloatRangeSlider(
-        value=[16, 26],  # 4pm to 2am
+        value=list(c.DEFAULT_STARGAZING_TIMES),
         min=12,
         max=36,
         step=0.25,  # 15min step
@@ -240,6 +245,23 @@ def create_stargazing_gui():
     # --- Go Button ---
     go_button = widgets.Button(description="Go", layout={"width": "100px"})
 
+    # --- Progress and Cancel ---
+    progress_bar = widgets.IntProgress(
+        value=0,
+        min=0,
+        max=365,
+        description="Progress:",
+        layout={"visibility": "hidden"},
+    )
+    cancel_button = widgets.Button(
+        description="Cancel",
+        disabled=True,
+        layout={"width": "100px"},
+    )
+    status_label = widgets.Label(value="")
+
+    progress_box = widgets.HBox([go_button, cancel_button, progress_bar, status_label])
+
     # --- Advanced Settings ---
     timestep_slider = widgets.IntSlider(
         value=3,
@@ -269,7 +291,7 @@ def create_stargazing_gui():
             time_range_box,
             duration_warning,
             advanced_settings,
-            go_button,
+            progress_box,
         ]
     )
 
@@ -294,6 +316,8 @@ def create_stargazing_gui():
     save_buttons_box = widgets.HBox([save_calendar_button, save_graphic_button])
 
     def save_simple_image(b):
+        import images as im
+
         with output_widget:
 
             text_info = {
@@ -312,8 +336,22 @@ def create_stargazing_gui():
     save_calendar_button.on_click(save_simple_image)
 
     def save_fancy_image(b):
+        import images as im
+
         with output_widget:
-            print("not implemented")
+
+            text_info = {
+                "year": results["year"],
+                "location": results["location"],
+                "stargazing times": results["stargazing times"],
+                "stargazing duration": results["stargazing duration"],
+            }
+
+            im.save_year_image(
+                year_info=results["year info"],
+                text_info=text_info,
+                calendar_info=results["calendar info"],
+            )
 
     save_graphic_button.on_click(save_fancy_image)
 
@@ -330,81 +368,133 @@ def create_stargazing_gui():
             plot_day(results["year info"]["days"][day])
 
     # --- "Go" button callback ---
-    def go_button_callback(b):
-        save_calendar_button.disabled = True
-        save_graphic_button.disabled = True
-
-        section2_results.clear_output(wait=True)
-        section3_interactive.clear_output()
-
-        # Gather the inputs to year info
-        L = locations[location_dropdown.value]
-        location = LocationInfo(
-            name=location_dropdown.value,
-            region=L["region"],
-            timezone=L["timezone"],
-            latitude=L["latitude"],
-            longitude=L["longitude"],
+    # The year is computed on a worker thread so the notebook stays responsive.
+    # Each press starts a new job and cancels the previous one; a job only
+    # touches the results and the GUI while it is still the current job.
+    current_job = {"id": 0, "cancel": None}
+
+    def is_current_job(job_id):
+        return current_job["id"] == job_id
+
+    def run_job(job_id, cancel_event, inputs):
+        location = inputs["location"]
+        year = inputs["year"]
+
+        def update_progress(days_done, days_total):
+            if is_current_job(job_id):
+                progress_bar.max = days_total
+                progress_bar.value = days_done
+
+        try:
+            horizon = None
+            if inputs["horizon file"]:
+                horizon = hz.load_horizon(inputs["horizon file"])
+            prefetch.yield_to(location, year)
+            year_info = main.get_year_info(
+                location,
+                year,
+                timestep_minutes=inputs["timestep"],
+                progress_callback=update_progress,
+                cancel_event=cancel_event,
+                lazy_plot=True,  # Series are only read when a day is plotted
+                horizon=horizon,
+            )
+        except main.SimulationCancelled:
+            if is_current_job(job_id):
+                status_label.value = "Cancelled."
+                progress_bar.layout.visibility = "hidden"
+                cancel_button.disabled = True
+            return
+        except Exception as e:
+            if is_current_job(job_id):
+                status_label.value = f"Error: {e}"
+                progress_bar.layout.visibility = "hidden"
+                cancel_button.disabled = True
+            raise
+
+        if not is_current_job(job_id):
+            return
+        status_label.value = "Creating calendar..."
+
+        calendar_info = main.get_calendar_info(
+            year_info,
+            inputs["stargazing times"],
+            inputs["stargazing duration"],
         )
-        year = calendar_year.value
-        timestep = timestep_slider.value
-        week_start = week_start_toggle.value
 
-        results["year"] = year
-        results["timestep"] = timestep
-        results["week start"] = week_start
-        results["location"] = location
+        calendar_widget = create_calendar_view(
+            interaction_function=day_interaction_callback,
+            calendar_info=calendar_info,
+            location_info=year_info["location"],
+            year=year_info["year"],
+            week_starts_on=inputs["week start"],  # Pass the selected value
+        )
 
-        with section2_results:
-            year_info = main.get_year_info(location, year, timestep_minutes=timestep)
+        if not is_current_job(job_id):
+            return
 
+        results.clear()
+        results.update(inputs)
         results["year info"] = year_info
+        results["calendar info"] = calendar_info
 
-        calendar_info = {}
-        duration = datetime.timedelta(minutes=stargazing_slider.value)
-        times = stargazing_range_slider.value
-        results["stargazing times"] = times
-        results["stargazing duration"] = duration
-        for day, day_info in year_info["days"].items():
-            # Check if there's a good stargazing window
-            stargazing_window = False
-            for condition in day_info["conditions"]["sky"]:
-                dark_start = condition["start"]
-                dark_end = condition["end"]
-
-                base_date = datetime.datetime.combine(
-                    datetime.date.fromisoformat(day),
-                    datetime.time(hour=0, minute=0),
-                )
-                range_start = base_date + datetime.timedelta(minutes=times[0] * 60)
-                range_end = base_date + datetime.timedelta(minutes=times[1] * 60)
+        section2_results.clear_output(wait=True)
+        section2_results.append_display_data(calendar_widget)
 
-                true_start = max(dark_start, range_start)
-                true_end = min(dark_end, range_end)
+        status_label.value = ""
+        progress_bar.layout.visibility = "hidden"
+        cancel_button.disabled = True
+        save_calendar_button.disabled = False
+        save_graphic_button.disabled = False
 
-                stargazing_window = (true_end - true_start) >= duration
+    def go_button_callback(b):
+        # Supersede any job that is still running
+        if current_job["cancel"] is not None:
+            current_job["cancel"].set()
 
-            calendar_info.update({day: stargazing_window})
+        save_calendar_button.disabled = True
+        save_graphic_button.disabled = True
 
-        results["calendar info"] = calendar_info
+        section2_results.clear_output(wait=True)
+        section3_interactive.clear_output()
 
-        with section2_results:
-            print("Creating GUI...")
-            calendar_widget = create_calendar_view(
-                interaction_function=day_interaction_callback,
-                calendar_info=calendar_info,
-                location_info=year_info["location"],
-                year=year_info["year"],
-                week_starts_on=week_start,  # Pass the selected value
-            )
-            print("Loading GUI...")
-            section2_results.clear_output(wait=True)
-            display(calendar_widget)
+        # Gather the inputs to year info
+        L = locations[location_dropdown.value]
+        location = loc.to_location_info(location_dropdown.value, L)
+        inputs = {
+            "year": calendar_year.value,
+            "timestep": timestep_slider.value,
+            "week start": week_start_toggle.value,
+            "location": location,
+            "horizon file": L.get("horizon"),
+            "stargazing times": stargazing_range_slider.value,
+            "stargazing duration": datetime.timedelta(minutes=stargazing_slider.value),
+        }
+
+        cancel_event = threading.Event()
+        current_job["id"] += 1
+        current_job["cancel"] = cancel_event
+
+        progress_bar.value = 0
+        progress_bar.layout.visibility = "visible"
+        cancel_button.disabled = False
+        status_label.value = f"Loading {inputs['year']} for {location.name}..."
+
+        worker = threading.Thread(
+            target=run_job,
+            args=(current_job["id"], cancel_event, inputs),
+            daemon=True,
+        )
+        worker.start()
 
-        save_calendar_button.disabled = False
-        save_graphic_button.disabled = False
+    def cancel_button_callback(b):
+        if current_job["cancel"] is not None:
+            current_job["cancel"].set()
+        status_label.value = "Cancelling..."
+        cancel_button.disabled = True
 
     go_button.on_click(go_button_callback)
+    cancel_button.on_click(cancel_button_callback)
 
     # --- Assemble the GUI ---
     main_gui = widgets.VBox(
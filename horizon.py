@@ -0,0 +1,279 @@
+"""
+Local horizon profiles.
+
+A location in my_locations.loc.json can name a horizon file with a
+"horizon" entry, e.g. "horizon": "horizons/lincoln.txt" (relative paths are
+inside the data folder). The file lists the altitude of the skyline in
+degrees at a set of azimuths (degrees east of north), one pair per line:
+
+    # azimuth altitude
+    0 12.5
+    45, 14
+    90 8.0
+
+Commas or whitespace separate the values and lines starting with '#' are
+ignored, so Stellarium polygonal horizon files can be used as they are.
+Between the listed azimuths the altitude is interpolated linearly, wrapping
+around north.
+
+A profile is turned into a lookup table with one altitude per
+LOOKUP_RESOLUTION degrees of azimuth, so masking a sample is one index into
+an array.
+
+Years are simulated and cached for the true horizon only. A skyline is
+applied afterwards by apply_horizon(), which relabels when the sun and moon
+are in view, so every profile shares the same cached years.
+"""
+
+import datetime
+import hashlib
+import os
+
+import numpy as np
+
+import constants as c
+import ephemeris
+import fast_engine
+
+LOOKUP_RESOLUTION = 0.1  # degrees of azimuth per table entry
+LOOKUP_SIZE = round(360 / LOOKUP_RESOLUTION)
+
+# Above the true horizon but hidden by the skyline. The sky is lit as if they
+# were in view, so the darkness rules (and the 'sky' conditions) don't change.
+SUN_HIDDEN_STATE = "sun behind horizon"
+MOON_HIDDEN_STATE = "moon behind horizon"
+
+_tables = {}  # (path, mtime) -> lookup table, see load_horizon()
+
+
+def load_horizon(path: str):
+    """
+    Loads a horizon profile and returns its lookup table.
+
+    Args:
+        path: The horizon file. Relative paths are inside the data folder.
+
+    Returns:
+        numpy.ndarray: LOOKUP_SIZE altitudes in degrees; entry i is the
+                       skyline at azimuth i * LOOKUP_RESOLUTION.
+    """
+    if not os.path.isabs(path):
+        path = os.path.join(c.DATA_FOLDER, path)
+    key = (os.path.abspath(path), os.path.getmtime(path))
+    if key in _tables:
+        return _tables[key]
+
+    points = []
+    with open(path, "r") as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                values = line.replace(",", " ").split()
+                azimuth, altitude = float(values[0]), float(values[1])
+            except (IndexError, ValueError):
+                raise ValueError(
+                    f"{path}, line {line_number}: expected 'azimuth altitude'"
+                )
+            points.append((azimuth % 360, altitude))
+    if not points:
+        raise ValueError(f"{path} has no horizon points")
+
+    azimuths, altitudes = np.array(sorted(points)).T
+    table = np.interp(
+        np.arange(LOOKUP_SIZE) * LOOKUP_RESOLUTION, azimuths, altitudes, period=360
+    )
+    table.flags.writeable = False
+    _tables[key] = table
+    return table
+
+
+def location_horizon(location_entry: dict):
+    """
+    Returns the lookup table for a saved location's horizon, or None if the
+    entry (a value from locations.get_locations()) doesn't name one.
+    """
+    path = location_entry.get("horizon")
+    if not path:
+        return None
+    return load_horizon(path)
+
+
+def altitude_at(table, azimuth):
+    """
+    Looks up the skyline altitude at some azimuths.
+
+    Args:
+        table: A lookup table from load_horizon().
+        azimuth: Degrees east of north, a number or an array.
+
+    Returns:
+        The altitude in degrees, shaped like azimuth.
+    """
+    index = np.rint(np.asarray(azimuth) / LOOKUP_RESOLUTION).astype(int) % LOOKUP_SIZE
+    return table[index]
+
+
+def horizon_key(table) -> str:
+    """
+    A short hash of a lookup table, used to keep cached years simulated with
+    different horizons apart (see cache.get_base_filename).
+    """
+    return hashlib.sha1(np.ascontiguousarray(table).tobytes()).hexdigest()[:12]
+
+
+# --- Relabelling a year for a skyline ---
+
+
+def apply_horizon(year_info: dict, location, table, timestep_minutes: int) -> dict:
+    """
+    Relabels a year simulated for the true horizon with a local skyline.
+
+    The sun and moon only count as up ('day', 'moon up') while they clear the
+    skyline. Above the true horizon but behind the skyline they are
+    SUN_HIDDEN_STATE and MOON_HIDDEN_STATE. A skyline below the true horizon
+    (on a summit) likewise turns civil and moon twilight into 'day' and 'moon
+    up' where the sun or moon is in view. Darkness doesn't depend on the
+    skyline, so the 'sky' conditions and day summaries are left as they are.
+
+    Only the samples that can change are looked at: their elevation and
+    azimuth come from one vectorized pass over the whole year.
+
+    Args:
+        year_info: A year from main.get_year_info() without a horizon. It is
+            changed in place and returned.
+        location: The location it is for.
+        table: A lookup table from load_horizon().
+        timestep_minutes: The timestep the year was simulated at, so the
+            samples are the ones its conditions were built from.
+    """
+    summit = table.min() < 0
+    sun_states_up = ["day", "civil twilight"] if summit else ["day"]
+    moon_states_up = ["moon up", "moon twilight"] if summit else ["moon up"]
+
+    # --- Each day's samples, with the states they have now ---
+    days = []
+    for day, day_info in year_info["days"].items():
+        start_time, end_time, utc_times = fast_engine.day_samples(
+            location, datetime.date.fromisoformat(day), timestep_minutes
+        )
+        local_times = fast_engine.local_sample_times(
+            location, start_time, end_time, utc_times
+        )
+        conditions = day_info["conditions"]
+        days.append(
+            {
+                "info": day_info,
+                "utc times": utc_times,
+                "local times": local_times,
+                "sun": _sample_values(conditions["sun"], local_times, "state"),
+                "moon": _sample_values(conditions["moon"], local_times, "state"),
+                # A condition's brightness is at its end, which is also the
+                # next one's start, so samples take it from the condition
+                # that ends at or after them
+                "brightness": _sample_values(
+                    conditions["moon"], local_times, "brightness", by_end=True
+                ),
+            }
+        )
+    if not days:
+        return year_info
+
+    sun_states = np.concatenate([day["sun"] for day in days])
+    moon_states = np.concatenate([day["moon"] for day in days])
+    sun_check = np.isin(sun_states, sun_states_up)
+    moon_check = np.isin(moon_states, moon_states_up)
+    check = sun_check | moon_check
+
+    # --- Elevation and azimuth where the sun or moon may be up ---
+    utc_times = np.concatenate([day["utc times"] for day in days])[check]
+    positions = ephemeris.positions_at(utc_times, year_info["year"])
+    sun_elevations, sun_azimuths = ephemeris.sun_elevation(
+        location.latitude,
+        location.longitude,
+        ephemeris.minutes_of_day(utc_times),
+        positions["sun declination"],
+        positions["equation of time"],
+        with_azimuth=True,
+    )
+    moon_elevations, moon_azimuths = ephemeris.moon_elevation(
+        location.latitude,
+        location.longitude,
+        ephemeris.greenwich_sidereal_time(ephemeris.julian_day_2000(utc_times)),
+        positions["moon right ascension"],
+        positions["moon declination"],
+        with_azimuth=True,
+    )
+
+    sun_states[check] = _relabel(
+        sun_states[check],
+        sun_check[check],
+        sun_elevations,
+        altitude_at(table, sun_azimuths),
+        "day",
+        SUN_HIDDEN_STATE,
+    )
+    moon_states[check] = _relabel(
+        moon_states[check],
+        moon_check[check],
+        moon_elevations,
+        altitude_at(table, moon_azimuths),
+        "moon up",
+        MOON_HIDDEN_STATE,
+    )
+
+    # --- Conditions from the new states ---
+    offset = 0
+    for day in days:
+        samples = slice(offset, offset + len(day["local times"]))
+        offset = samples.stop
+        local_times = day["local times"].astype(datetime.datetime)
+        day["info"]["conditions"]["sun"] = fast_engine.state_conditions(
+            sun_states[samples], local_times
+        )
+        day_moon_states = moon_states[samples]
+        moon_conditions = fast_engine.state_conditions(day_moon_states, local_times)
+        ends = fast_engine.condition_ends(day_moon_states)
+        for condition, brightness in zip(moon_conditions, day["brightness"][ends]):
+            condition["brightness"] = brightness
+        day["info"]["conditions"]["moon"] = moon_conditions
+
+    return year_info
+
+
+def _sample_values(conditions, local_times, key, by_end: bool = False):
+    """
+    A condition value at each sample, from the condition the sample is in
+    (or with by_end, the first condition that ends at or after it).
+    """
+    # Conditions follow the samples in order, so they are matched by sample
+    # index: local times repeat for an hour when daylight saving ends. A
+    # start within that hour is taken to be in its first pass.
+    starts = []
+    index = 0
+    for condition in conditions:
+        start = np.datetime64(condition["start"], "s")
+        index += int(np.argmax(local_times[index:] == start))
+        starts.append(index)
+    samples = np.arange(len(local_times))
+    if by_end:
+        index = np.maximum(np.searchsorted(starts, samples) - 1, 0)
+    else:
+        index = np.searchsorted(starts, samples, side="right") - 1
+    values = np.empty(len(conditions), dtype=object)
+    values[:] = [condition.get(key) for condition in conditions]
+    return values[index]
+
+
+def _relabel(states, may_change, elevations, skyline, up_state, hidden_state):
+    """New states for samples where the sun or moon may be up."""
+    return np.where(
+        ~may_change,
+        states,
+        np.where(
+            elevations >= skyline,
+            up_state,
+            np.where(elevations >= 0, hidden_state, states),
+        ),
+    )
@@ -1,14 +1,35 @@
 import os
+import hashlib
+import json
+import shutil
 import textwrap
 import datetime
-import importlib
-from matplotlib import pyplot as plt
+
+import matplotlib
+import numpy as np
 from matplotlib import patches
+from matplotlib.colors import to_rgb
+from matplotlib.figure import Figure
 from pathvalidate import sanitize_filename
 
+import astronomy
+import cache
 import colors
+import skybrightness
+
+# Bump when a change to draw_calendar_figure() changes how calendars look,
+# so renders cached by an older version aren't reused
+CALENDAR_RENDERER_VERSION = 1
+CALENDAR_DPI = 300
+RENDER_CACHE_FOLDER = os.path.join("images", ".render_cache")
+RENDER_CACHE_SIZE = 500  # Cached renders kept, least recently used go first
 
-importlib.reload(colors)
+YEAR_IMAGE_SIZE = (1920, 1080)  # pixels
+YEAR_IMAGE_DPI = 100
+YEAR_IMAGE_BINS = 720  # Time-of-day columns per night, 2 minutes each
+MONTH_ROWS = 32  # Image rows per month: up to 31 nights and a gap
+HIGHLIGHT_COLUMNS = 12  # Width of the highlighted-night marks left of each row
+MOON_OVERLAY_ALPHA = 0.6  # Opacity of a full moon over the sky
 
 
 def save_calendar_image(
@@ -18,16 +39,119 @@ def save_calendar_image(
 ):
     """
     Generates a visual calendar for a given year and saves it as an image.
+    See draw_calendar_figure() for the arguments.
+
+    Renders are cached by a hash of everything that affects them (see
+    calendar_render_key()), so saving a calendar that hasn't changed, or
+    one already rendered for another file, doesn't draw it again.
+
+    Returns:
+        str: Path of the saved image.
+    """
+    year = text_info["year"]
+    location = text_info["location"]
+    filename = sanitize_filename(f"{year}_{location.name}_stargazing_calendar.png")
+
+    # --- Directory Setup ---
+    if not os.path.exists("images"):
+        os.makedirs("images")
+        print("Created 'images' directory.")
+    os.makedirs(RENDER_CACHE_FOLDER, exist_ok=True)
+
+    filepath = os.path.join("images", filename)
+    key = calendar_render_key(calendar_info, text_info, week_starts_on)
+    cached_path = os.path.join(RENDER_CACHE_FOLDER, f"{key}.png")
+
+    if os.path.exists(cached_path):
+        os.utime(cached_path)  # Mark as recently used
+        if os.path.exists(filepath) and os.path.samefile(filepath, cached_path):
+            print(f"Calendar image '{filepath}' is up to date")
+            return filepath
+    else:
+        fig = draw_calendar_figure(calendar_info, text_info, week_starts_on)
+        with cache.atomic_open(cached_path, "wb") as f:
+            fig.savefig(f, format="png", dpi=CALENDAR_DPI)
+        _prune_render_cache()
+
+    _link_render(cached_path, filepath)
+    print(f"Calendar image saved to '{filepath}'")
+    return filepath
+
+
+def calendar_render_key(calendar_info, text_info, week_starts_on) -> str:
+    """
+    Hash of everything that changes a calendar image: the highlighted days,
+    the text, the week start, the style (DPI, colors and matplotlib version)
+    and CALENDAR_RENDERER_VERSION.
+    """
+    location = text_info["location"]
+    inputs = {
+        "renderer": ["calendar", CALENDAR_RENDERER_VERSION],
+        "highlighted": sorted(day for day, good in calendar_info.items() if good),
+        "year": text_info["year"],
+        "location": [location.name, location.latitude, location.longitude],
+        "stargazing times": list(text_info["stargazing times"]),
+        "stargazing duration": text_info["stargazing duration"].total_seconds(),
+        "week start": week_starts_on,
+        "style": {
+            "dpi": CALENDAR_DPI,
+            "colors": {
+                name: value for name, value in vars(colors).items() if name.isupper()
+            },
+            "matplotlib": matplotlib.__version__,
+        },
+    }
+    encoded = json.dumps(inputs, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def _link_render(cached_path: str, filepath: str):
+    """Points filepath at a cached render: a hard link, or a copy if links fail."""
+    temporary_path = f"{filepath}.{os.getpid()}.tmp"
+    try:
+        os.link(cached_path, temporary_path)
+    except OSError:
+        shutil.copyfile(cached_path, temporary_path)
+    os.replace(temporary_path, filepath)
+
+
+def _prune_render_cache(max_files: int = RENDER_CACHE_SIZE):
+    """Removes the least recently used renders beyond max_files."""
+    renders = [
+        entry
+        for entry in os.scandir(RENDER_CACHE_FOLDER)
+        if entry.name.endswith(".png")
+    ]
+    if len(renders) <= max_files:
+        return
+    renders.sort(key=lambda entry: entry.stat().st_mtime)
+    for entry in renders[: len(renders) - max_files]:
+        try:
+            os.remove(entry.path)
+        except FileNotFoundError:
+            pass  # Pruned by another process
+
+
+def draw_calendar_figure(
+    calendar_info,
+    text_info,
+    week_starts_on,
+):
+    """
+    Draws a visual calendar for a given year.
 
     Days are drawn as squares and are color-coded based on the calendar_info dictionary.
 
     Args:
         calendar_info (dict): A dictionary with date ISO strings ('YYYY-MM-DD')
                               as keys and a boolean value. True highlights the day.
-        year (int): The year for which to generate the calendar.
-        details_text (str): A paragraph of text to display at the bottom of the calendar.
-        filename (str): The name of the image file to save.
+        text_info (dict): 'year', 'location' (LocationInfo), 'stargazing times'
+                          and 'stargazing duration', used for the title and
+                          the text at the bottom of the calendar.
         week_starts_on (str): 'Sunday' or 'Monday'. Determines the first day of the week.
+
+    Returns:
+        matplotlib.figure.Figure: The calendar, ready to save.
     """
 
     year = text_info["year"]
@@ -36,16 +160,12 @@ def save_calendar_image(
     end_time = hours_to_str(text_info["stargazing times"][1])
     location = text_info["location"]
     details_text = f"Highlighted days have {duration} of continuous night sky with no moon between the hours of {start_time} and {end_time}. Location {location.name} is at {location.latitude}, {location.longitude}."
-    filename = sanitize_filename(f"{year}_{location.name}_stargazing_calendar.png")
-
-    # --- Directory Setup ---
-    if not os.path.exists("images"):
-        os.makedirs("images")
-        print("Created 'images' directory.")
 
     # --- Matplotlib Figure Setup ---
-    # Standard 8.5x11 figure size
-    fig, axes = plt.subplots(4, 3, figsize=(8.5, 11))
+    # Standard 8.5x11 figure size. A bare Figure (not pyplot) is safe to draw
+    # from worker threads and is freed like any other object.
+    fig = Figure(figsize=(8.5, 11))
+    axes = fig.subplots(4, 3)
     fig.suptitle(f"{location.name} Stargazing Calendar {year}", fontsize=20, y=0.97)
 
     axes = axes.ravel()
@@ -137,10 +257,189 @@ def save_calendar_image(
             color=colors.MOON_DARK,  # Dark gray for readability
         )
 
+    return fig
+
+
+def save_year_image(year_info, text_info, calendar_info=None, mode: str = "state"):
+    """
+    Renders the year at a glance and saves it as a 1080p image.
+    See draw_year_figure() for the arguments.
+
+    Returns:
+        str: Path of the saved image.
+    """
+    year = text_info["year"]
+    location = text_info["location"]
+    filename = sanitize_filename(f"{year}_{location.name}_stargazing_year.png")
+
+    if not os.path.exists("images"):
+        os.makedirs("images")
+        print("Created 'images' directory.")
+
+    fig = draw_year_figure(year_info, text_info, calendar_info, mode)
+
     filepath = os.path.join("images", filename)
-    plt.savefig(filepath, dpi=300)  # Increased dpi for better quality
-    plt.close(fig)
-    print(f"Calendar image saved to '{filepath}'")
+    fig.savefig(filepath, dpi=YEAR_IMAGE_DPI)
+    print(f"Year image saved to '{filepath}'")
+    return filepath
+
+
+def draw_year_figure(year_info, text_info, calendar_info=None, mode: str = "state"):
+    """
+    Draws every night of a year as one image: 12 month rows, each with a
+    line per night running from noon to noon, colored by the sky.
+
+    The whole picture is a single pixel array built from the year's plot
+    series and drawn with one imshow, so it takes the same time at any
+    timestep.
+
+    Args:
+        year_info (dict): A year from main.get_year_info() with plot series.
+        text_info (dict): As for draw_calendar_figure().
+        calendar_info (dict): Optional, as for draw_calendar_figure(). Marks
+                              the highlighted nights at the left of each line.
+        mode (str): 'state' colors the sun's state (day, the twilights and
+                    night); 'brightness' colors the zenith sky brightness
+                    (see skybrightness.py). Either way the moon is drawn over
+                    the sky while it is up, more opaque the fuller it is.
+
+    Returns:
+        matplotlib.figure.Figure: The image, YEAR_IMAGE_SIZE at YEAR_IMAGE_DPI.
+    """
+    year = text_info["year"]
+    location = text_info["location"]
+    image = year_image(year_info, calendar_info, mode)
+
+    width, height = YEAR_IMAGE_SIZE
+    fig = Figure(figsize=(width / YEAR_IMAGE_DPI, height / YEAR_IMAGE_DPI))
+    ax = fig.add_axes([0.06, 0.08, 0.92, 0.84])
+    fig.suptitle(f"{location.name} Night Skies {year}", fontsize=20, y=0.97)
+
+    # x is hours after noon; the highlight marks sit left of 0
+    margin = HIGHLIGHT_COLUMNS * 24 / YEAR_IMAGE_BINS
+    ax.imshow(
+        image,
+        aspect="auto",
+        interpolation="nearest",
+        extent=(-margin, 24, 12 * MONTH_ROWS, 0),
+    )
+    ax.set_xticks([0, 6, 12, 18, 24])
+    ax.set_xticklabels(["12:00", "18:00", "00:00", "06:00", "12:00"])
+    ax.set_yticks([(month + 0.5) * MONTH_ROWS for month in range(12)])
+    ax.set_yticklabels(
+        [datetime.date(year, month, 1).strftime("%B") for month in range(1, 13)]
+    )
+    ax.tick_params(length=0)
+    for spine in ax.spines.values():
+        spine.set_visible(False)
+
+    details_text = (
+        "Each line is one night, from noon to noon local time. The moon is "
+        "shown while it is up, brighter the fuller it is."
+    )
+    if calendar_info is not None:
+        duration = timedelta_to_str(text_info["stargazing duration"])
+        start_time = hours_to_str(text_info["stargazing times"][0])
+        end_time = hours_to_str(text_info["stargazing times"][1])
+        details_text += (
+            f" Marked nights have {duration} of continuous night sky with no "
+            f"moon between {start_time} and {end_time}."
+        )
+    fig.text(
+        0.5,
+        0.03,
+        details_text,
+        ha="center",
+        va="center",
+        fontsize=10,
+        color=colors.MOON_DARK,
+    )
+
+    return fig
+
+
+def year_image(year_info, calendar_info=None, mode: str = "state"):
+    """
+    Builds the pixel array for draw_year_figure().
+
+    Returns:
+        numpy.ndarray: RGB floats shaped
+                       (12 * MONTH_ROWS, HIGHLIGHT_COLUMNS + YEAR_IMAGE_BINS, 3).
+    """
+    days = [
+        (datetime.date.fromisoformat(day), day_info["plot"])
+        for day, day_info in year_info["days"].items()
+    ]
+    counts = np.array([len(plot["times"]) for _, plot in days])
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    series = {
+        key: np.concatenate([np.asarray(plot[key], dtype=float) for _, plot in days])
+        for key in ("sun", "moon", "moon phases")
+    }
+
+    # Nearest sample to each time-of-day column, for every night at once
+    first_times = np.asarray(days[0][1]["times"], dtype="datetime64[s]")
+    timestep = (first_times[1] - first_times[0]).astype(float)  # seconds
+    column_offsets = np.arange(YEAR_IMAGE_BINS) * (24 * 3600 / YEAR_IMAGE_BINS)
+    column_samples = np.rint(column_offsets / timestep).astype(int)
+    index = starts[:, None] + np.minimum(column_samples, counts[:, None] - 1)
+
+    pixels = _sky_colors(series, mode)[index]  # nights x columns x RGB
+
+    image = np.ones((12 * MONTH_ROWS, HIGHLIGHT_COLUMNS + YEAR_IMAGE_BINS, 3))
+    rows = np.array([(day.month - 1) * MONTH_ROWS + day.day - 1 for day, _ in days])
+    image[rows, HIGHLIGHT_COLUMNS:] = pixels
+    if calendar_info is not None:
+        highlighted = np.array(
+            [calendar_info.get(day.isoformat(), False) for day, _ in days], dtype=bool
+        )
+        image[rows[highlighted], : HIGHLIGHT_COLUMNS - 2] = to_rgb(colors.SUN)
+    return image
+
+
+def _sky_colors(series, mode: str):
+    """RGB color of each sample, with the moon drawn over the sky."""
+    # Darkest to brightest, the colors of the sun's states
+    palette = np.array(
+        [
+            to_rgb(color)
+            for color in (
+                colors.NIGHT,
+                colors.ASTRONOMICAL_TWILIGHT,
+                colors.NAUTICAL_TWILIGHT,
+                colors.CIVIL_TWILIGHT,
+                colors.DAY,
+            )
+        ]
+    )
+
+    if mode == "state":
+        thresholds = [astronomy.NIGHT_SUN_ELEVATION, -12, -6, 0]
+        sky = palette[np.digitize(series["sun"], thresholds)]
+    elif mode == "brightness":
+        # The stored phase is the lit fraction; turn it back into an angle
+        illumination = series["moon phases"] / astronomy.MOON_SIZE
+        phase_angle = np.degrees(np.arccos(np.clip(2 * illumination - 1, -1, 1)))
+        brightness = skybrightness.zenith_brightness(
+            series["sun"],
+            series["moon"],
+            phase_angle,
+            skybrightness.MEAN_MOON_DISTANCE,
+        )
+        # Brightness (mag/arcsec², negated so it rises) reaching each color
+        stops = -np.array([skybrightness.DARK_SKY_BRIGHTNESS, 20, 17, 11, 5])
+        sky = np.stack(
+            [np.interp(-brightness, stops, palette[:, i]) for i in range(3)], axis=-1
+        )
+    else:
+        raise ValueError(f"Unknown mode {mode!r}, use 'state' or 'brightness'")
+
+    alpha = np.where(
+        series["moon"] >= 0,
+        MOON_OVERLAY_ALPHA * series["moon phases"] / astronomy.MOON_SIZE,
+        0.0,
+    )[:, None]
+    return sky * (1 - alpha) + np.array(to_rgb(colors.MOON)) * alpha
 
 
 def timedelta_to_str(td: datetime.timedelta):
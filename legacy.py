@@ -0,0 +1,223 @@
+"""
+Streaming reader for version 1.0 year files.
+
+Version 1.0 years are one big DateTimeEncoder JSON document. json.load has to
+build the whole year before anything can use it; this reader walks the file
+in chunks and hands back one day at a time, so memory is bounded by the size
+of a single day rather than the whole file.
+
+load_legacy_year() goes further for the plot series: each series is a flat
+JSON array (of numbers, or of DateTimeEncoder datetime objects), so it ends
+at the next ']' and can be converted to a numpy array in one step instead of
+building a dict and a datetime for every sample. It can also skip the plot
+section entirely when only the conditions are needed.
+"""
+
+import json
+import re
+
+import numpy as np
+
+import cache
+
+CHUNK_SIZE = 1 << 20  # characters read from the file at a time
+ISO_PATTERN = re.compile(r'"iso"\s*:\s*"([^"]*)"')
+
+
+class _JsonStream:
+    """Incremental reader over a JSON text file."""
+
+    def __init__(self, f, chunk_size=CHUNK_SIZE):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder(object_hook=cache.datetime_decoder)
+
+    def _read_more(self):
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        # Drop what has already been parsed so the buffer stays small
+        self.buffer = self.buffer[self.pos :] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Returns the next non-whitespace character without consuming it."""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._read_more():
+                raise ValueError("Unexpected end of JSON file")
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"Expected {char!r} at {self.buffer[self.pos:self.pos + 20]!r}")
+        self.pos += 1
+
+    def accept(self, char):
+        """Consumes `char` if it is next. Returns True if it was."""
+        if self.peek() == char:
+            self.pos += 1
+            return True
+        return False
+
+    def value(self):
+        """Decodes the next complete JSON value."""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self._read_more():
+                    raise
+                continue
+            # A number at the very end of the buffer may continue in the file
+            if end == len(self.buffer) and not self.eof and self._read_more():
+                continue
+            self.pos = end
+            return value
+
+    def array_text(self):
+        """
+        Consumes a flat JSON array and returns the text between its brackets.
+
+        Only valid for arrays that contain no nested arrays and no strings
+        with ']' in them, such as the plot series.
+        """
+        self.expect("[")
+        while True:
+            end = self.buffer.find("]", self.pos)
+            if end != -1:
+                text = self.buffer[self.pos : end]
+                self.pos = end + 1
+                return text
+            if not self._read_more():
+                raise ValueError("Unexpected end of JSON file")
+
+    def object_items(self):
+        """
+        Yields the keys of an object one at a time.
+
+        The caller must consume the value (with value() or by iterating a
+        nested object) before asking for the next key.
+        """
+        self.expect("{")
+        if self.accept("}"):
+            return
+        while True:
+            key = self.value()
+            self.expect(":")
+            yield key
+            if self.accept("}"):
+                return
+            self.expect(",")
+
+
+def open_legacy_year(path: str, chunk_size: int = CHUNK_SIZE):
+    """
+    Opens a version 1.0 year file for streaming.
+
+    Returns:
+        tuple: (header, days) where header has the year and location, and
+               days is an iterator of (ISO date, day info) pairs in file
+               order. Day info is decoded exactly as json.load with
+               datetime_decoder would decode it. Exhaust or close the
+               iterator to close the file.
+    """
+    f = open(path, "r")
+    stream = _JsonStream(f, chunk_size)
+    items = stream.object_items()
+
+    # json.dump writes the year and location before the days
+    header = {}
+    try:
+        for key in items:
+            if key == "days":
+                break
+            header[key] = stream.value()
+        else:
+            raise ValueError(f"No days found in {path}")
+    except Exception:
+        f.close()
+        raise
+
+    def iter_days():
+        try:
+            for day in stream.object_items():
+                yield day, stream.value()
+            # Anything after the days is still part of the header
+            for key in items:
+                header[key] = stream.value()
+        finally:
+            f.close()
+
+    return header, iter_days()
+
+
+def load_legacy_year(path: str, include_plot: bool = True, chunk_size: int = CHUNK_SIZE):
+    """
+    Loads a version 1.0 year file incrementally.
+
+    Args:
+        path: Path to a '*_v1.0_timestep_*.data.json' file.
+        include_plot: If False the plot series are skipped without being
+                      decoded and days have no 'plot' entry, which is all
+                      calendar highlighting needs.
+
+    Returns:
+        dict: The year in the same layout as a version 2.0 load: plot series
+              are numpy arrays and times are datetime64[s].
+    """
+    year_info = {}
+    with open(path, "r") as f:
+        stream = _JsonStream(f, chunk_size)
+        for key in stream.object_items():
+            if key != "days":
+                year_info[key] = stream.value()
+                continue
+
+            days = {}
+            for day in stream.object_items():
+                day_info = {}
+                for day_key in stream.object_items():
+                    if day_key == "plot":
+                        plot = _read_plot(stream, decode=include_plot)
+                        if include_plot:
+                            day_info["plot"] = plot
+                    else:
+                        day_info[day_key] = stream.value()
+                day_info.pop("location", None)
+                days[day] = day_info
+            year_info["days"] = days
+
+    return year_info
+
+
+def _read_plot(stream, decode=True):
+    """
+    Reads a day's plot object straight into numpy arrays. With decode=False
+    the series are only stepped over.
+    """
+    plot = {}
+    for key in stream.object_items():
+        if stream.peek() != "[":
+            plot[key] = stream.value()
+            continue
+        text = stream.array_text()
+        if not decode:
+            continue
+        if key == "times":
+            plot[key] = np.array(ISO_PATTERN.findall(text), dtype="datetime64[us]").astype(
+                "datetime64[s]"
+            )
+        elif text.strip():
+            plot[key] = np.array(text.split(","), dtype=float)
+        else:
+            plot[key] = np.array([], dtype=float)
+    return plot
@@ -0,0 +1,409 @@
+"""
+Light pollution from a local sky brightness raster.
+
+Reads artificial sky brightness (or total sky brightness) for any point from
+a raster on disk, such as the World Atlas of Artificial Night Sky Brightness
+(Falchi et al. 2016), without a web service. Two formats are supported:
+
+- GeoTIFF, uncompressed, striped or tiled, one band, in longitude/latitude
+  (EPSG:4326). Compressed files can't be memory mapped; convert them with
+  e.g. `gdal_translate -co COMPRESS=NONE -co TILED=YES in.tif out.tif`.
+- Raw: a headerless row-major array with a JSON sidecar, `<path>.json`,
+  holding "width", "height", "dtype" (numpy, e.g. "<f4"), "west", "north",
+  "pixel width", "pixel height" and optionally "offset", "nodata" and
+  "units".
+
+The file is memory mapped and only the pixels asked for are read, so a
+world-scale raster is never loaded into RAM. Values are in LIGHT_UNITS:
+"mcd/m2" (artificial brightness, as in the World Atlas) or "mag/arcsec2"
+(total brightness). sky_brightness() and bortle_class() turn them into a
+zenith brightness and a Bortle class.
+
+Lookups for the saved locations are cached per location in the data folder
+(see location_light_pollution()).
+"""
+
+import json
+import math
+import mmap
+import os
+import struct
+
+import numpy as np
+
+import cache
+import constants as c
+
+LIGHT_UNITS = ["mcd/m2", "mag/arcsec2"]
+NATURAL_SKY_LUMINANCE = 0.171168  # mcd/m², the World Atlas' natural sky
+GATHER_CHUNK = 1_000_000  # Pixels read at once, bounds temporary memory
+LOCATION_CACHE_FILENAME = "light_pollution.cache.json"
+
+# Approximate zenith sky brightness (V mag/arcsec²) at which each Bortle
+# class starts, classes 1 to 8; anything brighter is class 9
+BORTLE_LIMITS = [21.99, 21.89, 21.69, 20.49, 19.50, 18.94, 18.38, 17.80]
+
+_rasters = {}  # (path, units) -> raster, see open_raster()
+
+
+# --- Rasters ---
+
+
+def open_raster(path: str = c.LIGHT_POLLUTION_RASTER, units: str | None = None):
+    """
+    Opens a sky brightness raster for reading. Nothing is read until values
+    are looked up.
+
+    Args:
+        path: A GeoTIFF (.tif, .tiff) or raw raster with a JSON sidecar.
+        units: One of LIGHT_UNITS. Defaults to the sidecar's "units", or
+               c.LIGHT_POLLUTION_UNITS.
+
+    Returns:
+        dict: The raster's layout: 'path', 'width', 'height', 'dtype',
+              'west', 'north', 'pixel width', 'pixel height', 'nodata',
+              'units', the block geometry ('block width', 'block height',
+              'blocks across', 'offsets') and the memory mapped 'bytes'.
+    """
+    key = (os.path.abspath(path), units)
+    if key in _rasters:
+        return _rasters[key]
+
+    if path.lower().endswith((".tif", ".tiff")):
+        raster = _geotiff_layout(path)
+    else:
+        raster = _raw_layout(path)
+    raster["path"] = path
+    raster["units"] = units or raster.get("units") or c.LIGHT_POLLUTION_UNITS
+    if raster["units"] not in LIGHT_UNITS:
+        raise ValueError(
+            f"Unknown raster units {raster['units']!r}, use one of {LIGHT_UNITS}"
+        )
+    raster["bytes"] = _map_file(path)
+
+    _rasters[key] = raster
+    return raster
+
+
+def sample(raster: dict, latitudes, longitudes):
+    """
+    Looks up the raster at some points, reading only the pixels they fall in.
+
+    Args:
+        raster: From open_raster().
+        latitudes, longitudes: Degrees; arrays that broadcast together.
+
+    Returns:
+        numpy.ndarray: Raster values (float), NaN outside the raster or
+                       where it has no data.
+    """
+    latitudes, longitudes = np.broadcast_arrays(
+        np.asarray(latitudes, dtype=float), np.asarray(longitudes, dtype=float)
+    )
+    # Wrap longitudes into the raster's 360° span
+    longitudes = (longitudes - raster["west"]) % 360 + raster["west"]
+
+    rows = np.floor((raster["north"] - latitudes) / raster["pixel height"])
+    columns = np.floor((longitudes - raster["west"]) / raster["pixel width"])
+    inside = (
+        (rows >= 0)
+        & (rows < raster["height"])
+        & (columns >= 0)
+        & (columns < raster["width"])
+    )
+
+    values = np.full(latitudes.shape, np.nan)
+    values[inside] = _gather(
+        raster, rows[inside].astype(np.int64), columns[inside].astype(np.int64)
+    )
+    return values
+
+
+def sample_grid(raster: dict, latitudes, longitudes):
+    """
+    Looks up the raster on a latitude x longitude grid, e.g. for a regional
+    map. Only the pixels under grid points are read, so a coarse grid over a
+    large area stays cheap.
+
+    Returns:
+        numpy.ndarray: Shaped (len(latitudes), len(longitudes)).
+    """
+    latitudes = np.asarray(latitudes, dtype=float)
+    longitudes = np.asarray(longitudes, dtype=float)
+    return sample(raster, latitudes[:, None], longitudes[None, :])
+
+
+def read_window(raster: dict, latitude_range, longitude_range):
+    """
+    Reads every pixel of the raster within a latitude and longitude range.
+
+    Returns:
+        tuple: (values, latitudes, longitudes), the pixel values shaped
+               (rows, columns) and the coordinates of the pixel centres.
+    """
+    south, north = sorted(latitude_range)
+    west, east = sorted(longitude_range)
+    # Pixel rows and columns the range touches, clipped to the raster
+    top = (raster["north"] - north) / raster["pixel height"]
+    bottom = (raster["north"] - south) / raster["pixel height"]
+    left = (west - raster["west"]) / raster["pixel width"]
+    right = (east - raster["west"]) / raster["pixel width"]
+    rows = np.arange(max(0, math.floor(top)), min(raster["height"], math.ceil(bottom)))
+    columns = np.arange(
+        max(0, math.floor(left)), min(raster["width"], math.ceil(right))
+    )
+
+    latitudes = raster["north"] - (rows + 0.5) * raster["pixel height"]
+    longitudes = raster["west"] + (columns + 0.5) * raster["pixel width"]
+    return sample_grid(raster, latitudes, longitudes), latitudes, longitudes
+
+
+def _gather(raster: dict, rows, columns):
+    """Reads the pixels at (row, column) pairs straight from the mapped file."""
+    dtype = raster["dtype"]
+    values = np.empty(len(rows), dtype=float)
+    for start in range(0, len(rows), GATHER_CHUNK):
+        chunk = slice(start, start + GATHER_CHUNK)
+        block_row, row_in_block = np.divmod(rows[chunk], raster["block height"])
+        block_column, column_in_block = np.divmod(columns[chunk], raster["block width"])
+        block = block_row * raster["blocks across"] + block_column
+        addresses = raster["offsets"][block] + (
+            row_in_block * raster["block width"] + column_in_block
+        ) * dtype.itemsize
+        pixel_bytes = raster["bytes"][addresses[:, None] + np.arange(dtype.itemsize)]
+        values[chunk] = np.ascontiguousarray(pixel_bytes).view(dtype).ravel()
+
+    if raster["nodata"] is not None:
+        values[values == raster["nodata"]] = np.nan
+    return values
+
+
+def _map_file(path: str):
+    """Memory maps a file as a byte array, without read-ahead around lookups."""
+    with open(path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if hasattr(mmap, "MADV_RANDOM"):
+        mapped.madvise(mmap.MADV_RANDOM)
+    return np.frombuffer(mapped, dtype=np.uint8)
+
+
+def _raw_layout(path: str) -> dict:
+    with open(f"{path}.json", "r") as f:
+        info = json.load(f)
+    return {
+        "width": info["width"],
+        "height": info["height"],
+        "dtype": np.dtype(info["dtype"]),
+        "west": info["west"],
+        "north": info["north"],
+        "pixel width": info["pixel width"],
+        "pixel height": info["pixel height"],
+        "nodata": info.get("nodata"),
+        "units": info.get("units"),
+        # The whole image is one block
+        "block width": info["width"],
+        "block height": info["height"],
+        "blocks across": 1,
+        "offsets": np.array([info.get("offset", 0)], dtype=np.int64),
+    }
+
+
+# --- GeoTIFF ---
+# Only the tags needed to find the pixels and place them on the globe are read.
+
+_TIFF_TYPES = {  # TIFF field type -> struct format
+    1: "B", 2: "s", 3: "H", 4: "I", 5: "II", 6: "b", 8: "h", 9: "i",
+    11: "f", 12: "d", 16: "Q", 17: "q",
+}
+_SAMPLE_FORMATS = {1: "u", 2: "i", 3: "f"}
+
+
+def _geotiff_layout(path: str) -> dict:
+    tags = _read_tiff_tags(path)
+
+    if tags.get(259, [1])[0] != 1:
+        raise ValueError(f"{path} is compressed; convert it with COMPRESS=NONE")
+    if tags.get(277, [1])[0] != 1:
+        raise ValueError(f"{path} has more than one band")
+    if 33550 not in tags or 33922 not in tags:
+        raise ValueError(f"{path} has no ModelPixelScale/ModelTiepoint georeferencing")
+
+    width, height = tags[256][0], tags[257][0]
+    byte_order = tags["byte order"]
+    bits = tags.get(258, [8])[0]
+    kind = _SAMPLE_FORMATS[tags.get(339, [1])[0]]
+    dtype = np.dtype(f"{byte_order}{kind}{bits // 8}")
+
+    if 322 in tags:  # Tiled
+        block_width, block_height = tags[322][0], tags[323][0]
+        offsets = tags[324]
+    else:  # Striped
+        block_width = width
+        block_height = tags.get(278, [height])[0]
+        offsets = tags[273]
+
+    scale_x, scale_y = tags[33550][:2]
+    i, j, _, x, y, _ = tags[33922][:6]
+    nodata = tags.get(42113)
+    return {
+        "width": width,
+        "height": height,
+        "dtype": dtype,
+        "west": x - i * scale_x,
+        "north": y + j * scale_y,
+        "pixel width": scale_x,
+        "pixel height": scale_y,
+        "nodata": float(nodata.strip("\x00 ")) if nodata else None,
+        "block width": block_width,
+        "block height": block_height,
+        "blocks across": -(-width // block_width),
+        "offsets": np.asarray(offsets, dtype=np.int64),
+    }
+
+
+def _read_tiff_tags(path: str) -> dict:
+    """Reads the first image directory of a TIFF or BigTIFF: tag -> values."""
+    with open(path, "rb") as f:
+        header = f.read(16)
+        byte_order = {b"II": "<", b"MM": ">"}.get(header[:2])
+        if byte_order is None:
+            raise ValueError(f"{path} is not a TIFF file")
+        version = struct.unpack(f"{byte_order}H", header[2:4])[0]
+        # Entry counts and values/offsets are 4 bytes in TIFF, 8 in BigTIFF
+        if version == 42:
+            offset_format, directory_count_format = "I", "H"
+            directory = struct.unpack(f"{byte_order}I", header[4:8])[0]
+        elif version == 43:  # BigTIFF
+            offset_format, directory_count_format = "Q", "Q"
+            directory = struct.unpack(f"{byte_order}Q", header[8:16])[0]
+        else:
+            raise ValueError(f"{path} is not a TIFF file")
+        offset_format = byte_order + offset_format
+        offset_size = struct.calcsize(offset_format)
+        entry_size = 4 + 2 * offset_size
+
+        f.seek(directory)
+        directory_count_format = byte_order + directory_count_format
+        (num_entries,) = struct.unpack(
+            directory_count_format, f.read(struct.calcsize(directory_count_format))
+        )
+        entries = f.read(num_entries * entry_size)
+
+        tags = {"byte order": byte_order}
+        for n in range(num_entries):
+            entry = entries[n * entry_size : (n + 1) * entry_size]
+            tag, field_type = struct.unpack(f"{byte_order}HH", entry[:4])
+            (count,) = struct.unpack(offset_format, entry[4 : 4 + offset_size])
+            if field_type not in _TIFF_TYPES:
+                continue
+            value_format = _TIFF_TYPES[field_type]
+            size = struct.calcsize(value_format) * count
+            data = entry[4 + offset_size :]
+            if size > offset_size:
+                (value_offset,) = struct.unpack(offset_format, data)
+                f.seek(value_offset)
+                data = f.read(size)
+            if field_type == 2:
+                tags[tag] = data[:count].decode("ascii", "replace")
+                continue
+            values_format = f"{byte_order}{count * len(value_format)}{value_format[0]}"
+            values = struct.unpack(values_format, data[:size])
+            if field_type == 5:  # Rationals
+                values = tuple(a / b for a, b in zip(values[::2], values[1::2]))
+            tags[tag] = values
+    return tags
+
+
+# --- Sky brightness ---
+
+
+def sky_brightness(values, units: str = c.LIGHT_POLLUTION_UNITS):
+    """
+    Converts raster values to total zenith sky brightness in V mag/arcsec²
+    (higher is darker). Artificial brightness is added to the natural sky.
+    """
+    values = np.asarray(values, dtype=float)
+    if units == "mag/arcsec2":
+        return values
+    luminance = (NATURAL_SKY_LUMINANCE + values) / 1000  # cd/m²
+    return -2.5 * np.log10(luminance / 108000)
+
+
+def bortle_class(brightness):
+    """
+    Approximate Bortle class (1 to 9) for a zenith sky brightness in
+    V mag/arcsec². NaN brightness gives class 0 (unknown).
+    """
+    brightness = np.asarray(brightness, dtype=float)
+    classes = 1 + np.sum(brightness[..., None] < np.array(BORTLE_LIMITS), axis=-1)
+    return np.where(np.isnan(brightness), 0, classes)
+
+
+def location_light_pollution(
+    locations: dict | None = None,
+    path: str = c.LIGHT_POLLUTION_RASTER,
+):
+    """
+    Looks up the sky brightness and Bortle class of saved locations.
+
+    Locations already looked up in the same raster are answered from a cache
+    in the data folder; the rest are read from the raster in one batch.
+
+    Args:
+        locations: As returned by locations.get_locations(). Defaults to the
+                   saved locations.
+        path: The raster, see open_raster().
+
+    Returns:
+        dict: Location name -> {'sky brightness' (V mag/arcsec², NaN if the
+              raster doesn't cover it), 'bortle class' (0 if unknown)}.
+    """
+    if locations is None:
+        import locations as loc
+
+        locations = loc.get_locations()
+
+    raster = open_raster(path)
+    stat = os.stat(path)
+    raster_key = (
+        f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}:{raster['units']}"
+    )
+
+    cache_path = os.path.join(c.DATA_FOLDER, LOCATION_CACHE_FILENAME)
+    try:
+        with open(cache_path, "r") as f:
+            saved = json.load(f)
+    except (FileNotFoundError, ValueError):
+        saved = {}
+    if saved.get("raster") != raster_key:
+        saved = {"raster": raster_key, "brightness": {}}
+
+    def coordinate_key(L):
+        latitude = cache.quantize_coordinate(L["latitude"])
+        longitude = cache.quantize_coordinate(L["longitude"])
+        return f"{latitude},{longitude}"
+
+    missing = {
+        coordinate_key(L): L
+        for L in locations.values()
+        if coordinate_key(L) not in saved["brightness"]
+    }
+    if missing:
+        points = list(missing.values())
+        values = sample(
+            raster, [L["latitude"] for L in points], [L["longitude"] for L in points]
+        )
+        for key, value in zip(missing, sky_brightness(values, raster["units"])):
+            saved["brightness"][key] = None if np.isnan(value) else float(value)
+        with cache.atomic_open(cache_path, "w") as f:
+            json.dump(saved, f, indent=2)
+
+    result = {}
+    for name, L in locations.items():
+        brightness = saved["brightness"][coordinate_key(L)]
+        brightness = float("nan") if brightness is None else brightness
+        result[name] = {
+            "sky brightness": brightness,
+            "bortle class": int(bortle_class(brightness)),
+        }
+    return result
@@ -1,15 +1,10 @@
 import json
 import os
 import shutil
-import importlib
-import ipywidgets as widgets
-from IPython.display import display
 import pytz
 
 import constants as c
 
-importlib.reload(c)
-
 
 def get_locations():
     """
@@ -38,14 +33,53 @@ def get_locations():
             return json.load(f)
 
 
+def to_location_info(name: str, entry: dict):
+    """
+    Builds the astral LocationInfo of a saved location.
+
+    Args:
+        name: The location's name.
+        entry: Its entry from get_locations(), or any dict with 'region',
+            'timezone', 'latitude' and 'longitude' (such as a cached year's
+            location).
+    """
+    from astral import LocationInfo  # Deferred: astral is slow to import
+
+    return LocationInfo(
+        name=name,
+        region=entry["region"],
+        timezone=entry["timezone"],
+        latitude=entry["latitude"],
+        longitude=entry["longitude"],
+    )
+
+
 def save_locations(locations):
-    """Helper function to save the locations dictionary to the JSON file."""
-    with open(os.path.join("data", "my_locations.loc.json"), "w") as f:
+    """
+    Helper function to save the locations dictionary to the JSON file.
+
+    Cached years that no saved location can use any more (because a location
+    was moved, changed timezone or was deleted) are removed.
+    """
+    my_locations_path = os.path.join("data", "my_locations.loc.json")
+    try:
+        with open(my_locations_path, "r") as f:
+            old_locations = json.load(f)
+    except FileNotFoundError:
+        old_locations = {}
+
+    with open(my_locations_path, "w") as f:
         json.dump(locations, f, indent=2)
 
+    import cache_manager  # Deferred: it loads astral (through cache)
+
+    cache_manager.invalidate_changed_locations(old_locations, locations)
+
 
 def create_location_gui():
     """Creates and displays the ipywidgets GUI for managing locations."""
+    import ipywidgets as widgets
+    from IPython.display import display
 
     locations = get_locations()
     output = widgets.Output()
@@ -1,23 +1,19 @@
-import importlib
 import datetime
-import json
 import os
-from typing import Any
 
 from astral import LocationInfo
 
-import astronomy
-import gui
+import cache
+import cache_manager
+import constants as c
 
-importlib.reload(astronomy)
-importlib.reload(gui)
 
-DEFAULT_TIMESTEP = 3  # minutes #TODO: Move this to constants
-DATA_FOLDER = "data"  # TODO: Move this to constants
-DATA_VERSION = "1.0"
+class SimulationCancelled(Exception):
+    """Raised when a year simulation is cancelled between days."""
 
 
 def stargazing_calendar():
+    import gui  # Deferred so headless use doesn't load the widget stack
 
     # Should create a GUI where you select a location as defined in
     # locations.py
@@ -44,8 +40,9 @@ def stargazing_calendar():
 def plot_day(
     location: LocationInfo,
     day: datetime.date,
-    timestep_minutes: int = DEFAULT_TIMESTEP,
+    timestep_minutes: int = c.DEFAULT_TIMESTEP,
 ):
+    import astronomy  # Deferred, like the rest of numpy: see get_year_info()
 
     day_info = astronomy.get_day_info(
         location=location,
@@ -53,140 +50,403 @@ def plot_day(
         timestep_minutes=timestep_minutes,
     )
 
+    import gui
+
     gui.plot_day(day_info)
 
 
 def get_year_info(
     location: LocationInfo,
     year: int,
-    timestep_minutes: int = DEFAULT_TIMESTEP,
+    timestep_minutes: int = c.DEFAULT_TIMESTEP,
+    progress_callback=None,
+    cancel_event=None,
+    include_plot: bool = True,
+    lazy_plot: bool = False,
+    engine: str = c.DEFAULT_ENGINE,
+    horizon=None,
 ):
+    """
+    Loads the year info for a location from the data folder, simulating and
+    saving it first if no compatible file exists.
+
+    Args:
+        location: The location to simulate.
+        year: The year to simulate.
+        timestep_minutes: The interval in minutes for the calculation.
+        progress_callback: Optional function called as
+            progress_callback(days_done, days_total) after each simulated day.
+            When given, it replaces the printed progress dots.
+        cancel_event: Optional threading.Event. If it is set, the simulation
+            stops before the next day and SimulationCancelled is raised.
+        include_plot: If False, the year has no 'plot' series, only the
+            conditions.
+        lazy_plot: If True, only the day summaries are read up front and the
+            'plot' series are loaded on first use.
+        engine: How a missing year is simulated, see astronomy.ENGINES.
+        horizon: Optional horizon lookup table for the location, see
+            horizon.location_horizon(). Years are simulated and cached for
+            the true horizon, and relabelled for it once loaded (see
+            horizon.apply_horizon()).
+    """
 
-    # --- 1. Turn arguments into a JSON filename ---
-    base_filename = (
-        f"lat_{location.latitude}_lon_{location.longitude}_year_{year}_v{DATA_VERSION}"
+    # --- 1. Check for a file with the same name or a compatible timestep ---
+    data = load_cached_year(
+        location, year, timestep_minutes, include_plot, lazy_plot, horizon
     )
-    target_filename = os.path.join(
-        DATA_FOLDER, f"{base_filename}_timestep_{timestep_minutes}.data.json"
+    if data is not None:
+        cache_manager.record_hit()
+        return data
+
+    # --- 2. Only one process builds a given year at a time ---
+    # Anyone else asking for it waits here and then reads the saved file
+    lock_path = cache.acquire_lock(
+        cache.get_base_filename(location, year), cancel_event=cancel_event
     )
+    if lock_path is None:
+        raise SimulationCancelled(f"Cancelled while waiting for {year} to be built.")
 
-    # Ensure the data directory exists
-    if not os.path.exists(DATA_FOLDER):
-        os.makedirs(DATA_FOLDER)
-
-    # --- 2. Check for a file with the same name or a compatible timestep ---
-    for filename in os.listdir(DATA_FOLDER):
-        if filename.startswith(base_filename) and filename.endswith(".data.json"):
-            try:
-                # Extract the timestep from the filename
-                saved_timestep_str = filename.replace(
-                    f"{base_filename}_timestep_", ""
-                ).replace(".data.json", "")
-            except (ValueError, IndexError):
-                # Handles cases where the filename is not in the expected format
-                continue
-            saved_timestep = int(saved_timestep_str)
-
-            # Check if the current timestep is a multiple of the saved one
-            if timestep_minutes % saved_timestep == 0:
-                filepath = os.path.join(DATA_FOLDER, filename)
-                print(f"Found compatible data file: {filename}")
-                # --- 3. If it exists, load and return it as a dictionary ---
-                with open(filepath, "r") as f:
-                    print("Lodaing data...")
-                    data = json.load(f, object_hook=datetime_decoder)
-                    print("Data loaded.")
-                return data
-
-    # --- 4. If not, show a code snippet to save the dictionary ---
-    print("No compatible data file found. Simulating...")
-
-    start_day = datetime.date(year, 1, 1)
-    end_day = datetime.date(year, 12, 31)
-
-    day = start_day - datetime.timedelta(days=1)
-    daily_info = {}
-    current_month = ""
-    while day < end_day:
-        day = day + datetime.timedelta(days=1)
-        month = day.strftime("%b")
-        if month == current_month:
-            print(".", end="")
-        else:
-            print(f"\n{month} .", end="")
-            current_month = month
-        day_info = astronomy.get_day_info(
-            location=location,
-            day=day,
-            timestep_minutes=timestep_minutes,
+    try:
+        data = load_cached_year(
+            location, year, timestep_minutes, include_plot, lazy_plot, horizon
         )
-        del day_info[
-            "location"
-        ]  # TODO: Maybe don't need day_info to have this in the first place?
-        daily_info.update({day.isoformat(): day_info})
+        if data is not None:
+            # Built by another process while this one waited for the lock
+            cache_manager.record_hit()
+            return data
+
+        # --- 3. Simulate it a month at a time and save it ---
+        # Nearby coordinates share one cache entry, see cache.get_base_filename
+        save_path = cache.get_target_filename(location, year, timestep_minutes)
+        build_year(
+            location,
+            year,
+            timestep_minutes,
+            save_path,
+            progress_callback=progress_callback,
+            cancel_event=cancel_event,
+            lock_path=lock_path,
+            engine=engine,
+        )
+        # Counted once the year is built, not per cancelled or resumed attempt
+        cache_manager.record_miss()
+        print(f"Data successfully saved to {save_path}")
+    finally:
+        cache.release_lock(lock_path)
+
+    cache_manager.enforce_quota(keep=[save_path])
+
+    data = cache.load_year(save_path, include_plot=include_plot, lazy_plot=lazy_plot)
+    return _with_horizon(data, location, horizon, timestep_minutes)
+
+
+def get_calendar_info(
+    year_info: dict,
+    stargazing_times,
+    stargazing_duration: datetime.timedelta,
+):
+    """
+    Highlights the days of a year with a good stargazing window.
+
+    Args:
+        year_info: Year from get_year_info(); only the conditions are used.
+        stargazing_times: (start, end) of the allowed stargazing times in
+            hours after midnight at the start of the day, e.g. (16, 26) for
+            4pm to 2am.
+        stargazing_duration: The shortest dark window worth highlighting.
+
+    Returns:
+        dict: ISO date -> True if the day has a good stargazing window.
+    """
+    return {
+        day: bool(
+            stargazing_windows(day, day_info, stargazing_times, stargazing_duration)
+        )
+        for day, day_info in year_info["days"].items()
+    }
+
+
+def stargazing_windows(
+    day: str,
+    day_info: dict,
+    stargazing_times,
+    stargazing_duration: datetime.timedelta,
+):
+    """
+    Finds a day's dark windows inside the allowed stargazing times.
+
+    Arguments are as for get_calendar_info(), for one day.
+
+    Returns:
+        list: (start, end) local datetimes of each dark window, cut to the
+              allowed times, that lasts at least stargazing_duration.
+    """
+    base_date = datetime.datetime.combine(
+        datetime.date.fromisoformat(day),
+        datetime.time(hour=0, minute=0),
+    )
+    range_start = base_date + datetime.timedelta(minutes=stargazing_times[0] * 60)
+    range_end = base_date + datetime.timedelta(minutes=stargazing_times[1] * 60)
+
+    windows = []
+    for condition in day_info["conditions"]["sky"]:
+        true_start = max(condition["start"], range_start)
+        true_end = min(condition["end"], range_end)
+        if (true_end - true_start) >= stargazing_duration:
+            windows.append((true_start, true_end))
+
+    return windows
+
+
+def load_cached_year(
+    location: LocationInfo,
+    year: int,
+    timestep_minutes: int,
+    include_plot: bool = True,
+    lazy_plot: bool = False,
+    horizon=None,
+):
+    """Loads a saved year for the location, or returns None if there isn't one."""
+    filepath = cache.find_cached_file(location, year, timestep_minutes)
+    if filepath is None:
+        print("No compatible data file found.")
+        return None
+
+    print(f"Found compatible data file: {os.path.basename(filepath)}")
+    print("Lodaing data...")
+    data = cache.load_year(
+        filepath, include_plot=include_plot, lazy_plot=lazy_plot
+    )
+    print("Data loaded.")
+
+    if data["location"]["timezone"] != location.timezone:
+        # Local times in the file are for another timezone
+        print(
+            f"Cached data is for timezone {data['location']['timezone']}, "
+            f"not {location.timezone}."
+        )
+        return None
+
+    # The file may have been simulated for another site nearby; its events
+    # are close enough, but the name and coordinates are the caller's
+    data["location"] = _location_dict(location)
+
+    cache_manager.touch(filepath)
+    # Relabelled at the file's own timestep, the samples its conditions are from
+    saved_timestep = cache.parse_cache_filename(os.path.basename(filepath))["timestep"]
+    return _with_horizon(data, location, horizon, saved_timestep)
+
+
+def build_year(
+    location: LocationInfo,
+    year: int,
+    timestep_minutes: int,
+    save_path: str,
+    progress_callback=None,
+    cancel_event=None,
+    lock_path=None,
+    engine: str = c.DEFAULT_ENGINE,
+):
+    """
+    Simulates a year and saves it to save_path, checkpointing as it goes.
+
+    Each finished month is written to its own checkpoint file next to
+    save_path (see cache.get_checkpoint_filename) and dropped from memory.
+    If the build is cancelled or the kernel dies, the next build of the same
+    file picks up from the months already on disk. Once every month is done
+    they are combined into save_path and the checkpoints are removed.
+
+    Should be called while holding the lock for the year, see get_year_info().
+    Other arguments are as for simulate_year().
+    """
+    location_info = _location_dict(location)
+    checkpoints = [
+        cache.get_checkpoint_filename(save_path, month) for month in range(1, 13)
+    ]
+    month_starts = [datetime.date(year, month, 1) for month in range(1, 13)]
+    months = zip(month_starts, month_starts[1:] + [datetime.date(year + 1, 1, 1)])
+    days_total = (datetime.date(year + 1, 1, 1) - datetime.date(year, 1, 1)).days
+    days_done = 0
+
+    print("Simulating...")
+    for checkpoint, (month_start, month_end) in zip(checkpoints, months):
+        month_days = (month_end - month_start).days
+        if _is_usable_checkpoint(checkpoint, location):
+            days_done += month_days
+            # A callback stands in for the printed progress, as in simulate_days
+            if progress_callback is None:
+                month_name = month_start.strftime("%b")
+                print(f"\n{month_name} (resumed from checkpoint)", end="")
+            else:
+                progress_callback(days_done, days_total)
+            continue
+
+        def report_progress(month_days_done, _):
+            if progress_callback is not None:
+                progress_callback(days_done + month_days_done, days_total)
+
+        days = simulate_days(
+            location,
+            month_start,
+            month_end,
+            timestep_minutes,
+            progress_callback=report_progress,
+            cancel_event=cancel_event,
+            lock_path=lock_path,
+            print_progress=progress_callback is None,
+            engine=engine,
+        )
+        with cache.atomic_open(checkpoint, "wb") as f:
+            cache.write_year_days(f, year, location_info, days)
+        days_done += month_days
+
+    print("\nYear Simulation Complete.")
+
+    def checkpointed_days():
+        # One month in memory at a time
+        for checkpoint in checkpoints:
+            yield from cache.load_year(checkpoint)["days"].items()
+
+    with cache.atomic_open(save_path, "wb") as f:
+        cache.write_year_days(f, year, location_info, checkpointed_days())
+
+    for checkpoint in checkpoints:
+        os.remove(checkpoint)
+
+
+def simulate_year(
+    location: LocationInfo,
+    year: int,
+    timestep_minutes: int,
+    progress_callback=None,
+    cancel_event=None,
+    lock_path=None,
+    engine: str = c.DEFAULT_ENGINE,
+    horizon=None,
+):
+    """
+    Simulates every day of a year, in memory.
+
+    Arguments are as for get_year_info(). If lock_path is given the lock is
+    refreshed after each day so waiting processes know the build is alive.
+    """
+    print("Simulating...")
+
+    daily_info = dict(
+        simulate_days(
+            location,
+            datetime.date(year, 1, 1),
+            datetime.date(year + 1, 1, 1),
+            timestep_minutes,
+            progress_callback=progress_callback,
+            cancel_event=cancel_event,
+            lock_path=lock_path,
+            print_progress=progress_callback is None,
+            engine=engine,
+        )
+    )
 
     print("\nYear Simulation Complete.")
 
     year_info = {
         "year": year,
-        "location": {
-            "name": location.name,
-            "region": location.region,
-            "timezone": location.timezone,
-            "latitude": location.latitude,
-            "longitude": location.longitude,
-        },
+        "location": _location_dict(location),
         "days": daily_info,
     }
 
-    # The path to the output file
-    save_path = target_filename
-
-    # Ensure the directory exists
-    os.makedirs(os.path.dirname(save_path), exist_ok=True)
+    return _with_horizon(year_info, location, horizon, timestep_minutes)
 
-    # Write the dictionary to a JSON file
-    with open(save_path, "w") as f:
-        json.dump(year_info, f, indent=2, cls=DateTimeEncoder)
 
-    print(f"Data successfully saved to {save_path}")
+def simulate_days(
+    location: LocationInfo,
+    start_day: datetime.date,
+    end_day: datetime.date,
+    timestep_minutes: int,
+    progress_callback=None,
+    cancel_event=None,
+    lock_path=None,
+    print_progress: bool = True,
+    engine: str = c.DEFAULT_ENGINE,
+):
+    """
+    Yields (ISO date, day info) for each day from start_day up to, but not
+    including, end_day.
 
-    return year_info
+    progress_callback is called as progress_callback(days_done, days_total)
+    for this range. Raises SimulationCancelled if cancel_event is set.
+    engine names the astronomy.ENGINES function that calculates each day.
+    """
+    import astronomy
 
+    get_day_info = astronomy.ENGINES[engine]
+    days_total = (end_day - start_day).days
 
-# --- Custom JSON Encoder and Decoder for Datetime Objects ---
+    day = start_day
+    days_done = 0
+    current_month = ""
+    while day < end_day:
+        if cancel_event is not None and cancel_event.is_set():
+            raise SimulationCancelled(
+                f"Simulation cancelled before {day.isoformat()}."
+            )
+        month = day.strftime("%b")
+        if print_progress:
+            if month == current_month:
+                print(".", end="")
+            else:
+                print(f"\n{month} .", end="")
+                current_month = month
+        day_info = get_day_info(
+            location=location,
+            day=day,
+            timestep_minutes=timestep_minutes,
+        )
+        del day_info[
+            "location"
+        ]  # TODO: Maybe don't need day_info to have this in the first place?
+        day_info["summary"] = cache.day_summary(day_info)
+        yield day.isoformat(), day_info
+
+        days_done += 1
+        if lock_path is not None:
+            cache.refresh_lock(lock_path)
+        if progress_callback is not None:
+            progress_callback(days_done, days_total)
+        day = day + datetime.timedelta(days=1)
 
 
-class DateTimeEncoder(json.JSONEncoder):
+def ignore_progress(days_done, days_total):
     """
-    Custom JSON encoder to handle date, datetime, and timedelta objects
-    by converting them into a structured, typed dictionary.
+    A progress_callback for get_year_info() that reports nothing. Passing one
+    also stops the day-by-day progress printout, for servers and workers.
     """
 
-    def default(self, o: Any) -> Any:
-        if isinstance(o, datetime.datetime):
-            return {"__type__": "datetime", "iso": o.isoformat()}
-        if isinstance(o, datetime.date):
-            return {"__type__": "date", "iso": o.isoformat()}
-        if isinstance(o, datetime.timedelta):
-            return {"__type__": "timedelta", "seconds": o.total_seconds()}
 
-        return super().default(o)
+def _is_usable_checkpoint(path: str, location: LocationInfo) -> bool:
+    """True if a month checkpoint exists and was built for this timezone."""
+    if not os.path.exists(path):
+        return False
+    try:
+        saved_location = cache.load_year(path, include_plot=False)["location"]
+    except (OSError, ValueError):
+        return False  # Unreadable; it gets rebuilt
+    return saved_location["timezone"] == location.timezone
 
 
-def datetime_decoder(json_dict: dict) -> Any:
-    """
-    Object hook for json.load() to convert our structured dictionaries
-    back into their original Python objects.
-    """
-    if "__type__" in json_dict:
-        type_name = json_dict["__type__"]
-        if type_name == "datetime":
-            return datetime.datetime.fromisoformat(json_dict["iso"])
-        if type_name == "date":
-            return datetime.date.fromisoformat(json_dict["iso"])
-        if type_name == "timedelta":
-            return datetime.timedelta(seconds=json_dict["seconds"])
-
-    # Return the dictionary as-is if it's not one of our custom types
-    return json_dict
+def _with_horizon(year_info: dict, location: LocationInfo, horizon, timestep_minutes):
+    """Relabels a year for a horizon table, if there is one."""
+    if horizon is None:
+        return year_info
+    import horizon as hz  # Only with a horizon table, so numpy is loaded already
+
+    return hz.apply_horizon(year_info, location, horizon, timestep_minutes)
+
+
+def _location_dict(location: LocationInfo) -> dict:
+    return {
+        "name": location.name,
+        "region": location.region,
+        "timezone": location.timezone,
+        "latitude": location.latitude,
+        "longitude": location.longitude,
+    }
@@ -0,0 +1,121 @@
+"""
+Converts version 1.0 JSON year files to the current data version.
+
+Each file is streamed a day at a time (see legacy.py), so converting a
+fine-timestep year never needs the whole JSON document in memory. The new
+file is written next to the old one under the name cache lookups use, so
+get_year_info picks it up straight away.
+
+Usage (from the repository root):
+    python migrate.py [folder] [--processes N] [--remove-source]
+"""
+
+import argparse
+import multiprocessing
+import os
+
+import cache
+import constants as c
+import legacy
+import locations as loc
+
+
+def migrate_file(path: str, remove_source: bool = False):
+    """
+    Converts one version 1.0 year file.
+
+    Args:
+        path: Path to a '*_v1.0_timestep_*.data.json' file.
+        remove_source: Delete the JSON file once the new file is in place.
+
+    Returns:
+        tuple: (source path, new path or None, status message)
+    """
+    info = cache.parse_cache_filename(os.path.basename(path))
+    if info is None or info["version"] != "1.0" or info["extension"] != "json":
+        return path, None, "skipped: not a version 1.0 year file"
+
+    header, days = legacy.open_legacy_year(path)
+    location = loc.to_location_info(header["location"]["name"], header["location"])
+    target_path = os.path.join(
+        os.path.dirname(path),
+        os.path.basename(
+            cache.get_target_filename(location, header["year"], info["timestep"])
+        ),
+    )
+
+    # Take the same lock as a year build so nobody else writes this key
+    lock_path = cache.acquire_lock(cache.get_base_filename(location, header["year"]))
+    try:
+        if os.path.exists(target_path):
+            days.close()
+            status = "already migrated"
+        else:
+            with cache.atomic_open(target_path, "wb") as f:
+                cache.write_year_days(f, header["year"], header["location"], days)
+            status = "migrated"
+    finally:
+        cache.release_lock(lock_path)
+
+    if remove_source:
+        os.remove(path)
+
+    return path, target_path, status
+
+
+def migrate_folder(
+    folder: str = c.DATA_FOLDER,
+    processes: int | None = None,
+    remove_source: bool = False,
+):
+    """
+    Converts every version 1.0 year file in a folder, in parallel.
+
+    Args:
+        folder: Folder to scan. Defaults to the data folder.
+        processes: Worker processes. Defaults to the number of CPUs.
+        remove_source: Delete each JSON file once its new file is in place.
+
+    Returns:
+        list: (source path, new path or None, status message) per file.
+    """
+    paths = []
+    for filename in sorted(os.listdir(folder)):
+        info = cache.parse_cache_filename(filename)
+        if info is not None and info["version"] == "1.0":
+            paths.append(os.path.join(folder, filename))
+
+    if not paths:
+        print("No version 1.0 files to migrate.")
+        return []
+
+    jobs = [(path, remove_source) for path in paths]
+    results = []
+    with multiprocessing.Pool(processes=processes) as pool:
+        for result in pool.imap_unordered(_migrate_job, jobs):
+            source, target, status = result
+            print(f"{os.path.basename(source)}: {status}")
+            results.append(result)
+
+    return results
+
+
+def _migrate_job(job):
+    path, remove_source = job
+    try:
+        return migrate_file(path, remove_source=remove_source)
+    except Exception as e:
+        # One broken file shouldn't stop the rest of the folder
+        return path, None, f"failed: {e}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("folder", nargs="?", default=c.DATA_FOLDER)
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--remove-source", action="store_true")
+    args = parser.parse_args()
+
+    migrate_folder(
+        args.folder, processes=args.processes, remove_source=args.remove_source
+    )
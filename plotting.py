@@ -4,6 +4,7 @@ import datetime
 import matplotlib.pyplot as plt
 import matplotlib.patches as patches
 import matplotlib.dates as mdates
+from matplotlib.figure import Figure
 
 # from IPython.display import display
 
@@ -17,6 +18,25 @@ import matplotlib.dates as mdates
 
 
 def plot_month(year_info, month_num):
+    draw_month_figure(year_info, month_num, fig=plt.figure())
+    plt.show()
+
+    return True
+
+
+def draw_month_figure(year_info, month_num, fig=None):
+    """
+    Draws the sun and moon elevation for every sample of a month as one strip.
+
+    Args:
+        year_info (dict): A year from main.get_year_info() with plot series.
+        month_num (int): 1 for January to 12 for December.
+        fig: Figure to draw on. Defaults to a new bare Figure (not pyplot),
+             which is safe to draw from any thread or process.
+
+    Returns:
+        matplotlib.figure.Figure: The strip, ready to save.
+    """
 
     # Get month info from year
     year = year_info["year"]
@@ -46,8 +66,6 @@ def plot_month(year_info, month_num):
     while current_day.month == month_num:
         day_info = year_info["days"][current_day.isoformat()]
 
-        print(day_info["day"])
-
         for key in ["sun", "moon", "sky"]:
             month_info["conditions"][key].extend(day_info["conditions"][key])
 
@@ -62,7 +80,6 @@ def plot_month(year_info, month_num):
     sun_size = 200
 
     # Desired pixel dimensions
-    print(num_days)
     width_px = 120 * num_days
     height_px = 120
 
@@ -76,6 +93,7 @@ def plot_month(year_info, month_num):
 
     condition_colors = {
         "day": "#9085C0",
+        "sun behind horizon": "#9085C0",  # Behind the skyline, the sky is lit
         "civil twilight": "#656F89",
         "nautical twilight": "#363655",
         "astronomical twilight": "#181B35",
@@ -84,12 +102,15 @@ def plot_month(year_info, month_num):
 
     condition_alpha_multipliers = {
         "moon up": 1.00,
+        "moon behind horizon": 1.00,  # Behind the skyline, still lighting the sky
         "moon twilight": 0.50,
         "moon down": 0.00,
     }
 
     # 4. Plot the results using Matplotlib
-    fig, ax = plt.subplots(nrows=1, ncols=1)
+    if fig is None:
+        fig = Figure()
+    ax = fig.subplots(nrows=1, ncols=1)
     # fig.set_facecolor("grey")
     fig.set_size_inches(12, 6)
     ax.set_facecolor("#0D1C2E")
@@ -125,19 +146,19 @@ def plot_month(year_info, month_num):
         )
         ax.add_patch(rect)
 
-    plt.scatter(
+    ax.scatter(
         month_info["plot"]["times"],
         month_info["plot"]["sun"],
         s=sun_size,
         color="#FFDD40",
     )
-    plt.scatter(
+    ax.scatter(
         month_info["plot"]["times"],
         month_info["plot"]["moon"],
         s=moon_size,
         color="#444444",
     )
-    plt.scatter(
+    ax.scatter(
         month_info["plot"]["times"],
         month_info["plot"]["moon"],
         s=month_info["plot"]["moon phases"],
@@ -145,13 +166,13 @@ def plot_month(year_info, month_num):
     )
 
     # Add a horizontal line at 0 degrees to represent the horizon
-    plt.axhline(0, color="white", linestyle="-", linewidth=1)
+    ax.axhline(0, color="white", linestyle="-", linewidth=1)
     # plt.axhline(-6, color="white", linestyle="--", linewidth=1)
     # plt.axhline(-12, color="white", linestyle="--", linewidth=1)
     # plt.axhline(-18, color="white", linestyle="--", linewidth=1)
 
     # Formatting the plot
-    plt.title(f"Sun and Moon Elevation for {month_name} {year}")
+    ax.set_title(f"Sun and Moon Elevation for {month_name} {year}")
     # plt.xlabel("Time of Day")
     # plt.ylabel("Elevation (Degrees)")
     # plt.grid(True, linestyle=":")
@@ -162,6 +183,4 @@ def plot_month(year_info, month_num):
     # plt.gca().xaxis.set_major_locator(mdates.HourLocator(interval=1))
     # plt.gcf().autofmt_xdate() # Auto-rotates dates for readability
 
-    plt.show()
-
-    return True
+    return fig
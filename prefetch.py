@@ -0,0 +1,147 @@
+"""
+Background prefetching of cached years.
+
+Most lookups are for this year or next year at one of the saved locations,
+so start_prefetch() builds those years on a daemon thread ahead of time.
+The thread is held to a CPU budget (a fraction of one core) by sleeping
+between simulated days, and stops when stop_prefetch() is called or the
+interpreter exits. A stopped build keeps its finished months as
+checkpoints, so no work is lost.
+"""
+
+import atexit
+import datetime
+import threading
+import time
+
+from astral import LocationInfo
+
+import cache
+import constants as c
+import locations as loc
+import main
+
+_state = {"thread": None, "stop": None, "job": None, "stops at exit": False}
+_state_lock = threading.Lock()
+
+
+def start_prefetch(
+    years=None,
+    timestep_minutes: int = c.DEFAULT_TIMESTEP,
+    cpu_budget: float = c.PREFETCH_CPU_BUDGET,
+):
+    """
+    Starts prefetching years for every saved location.
+
+    Does nothing if a prefetch is already running.
+
+    Args:
+        years: Years to build. Defaults to the current and next year.
+        timestep_minutes: Timestep of the years to build.
+        cpu_budget: Share of one CPU core the prefetcher may use, 0 to 1.
+
+    Returns:
+        threading.Thread: The prefetch thread.
+    """
+    if years is None:
+        this_year = datetime.date.today().year
+        years = [this_year, this_year + 1]
+
+    jobs = []
+    for year in years:
+        # Years don't depend on horizon profiles, see horizon.apply_horizon()
+        for name, L in loc.get_locations().items():
+            jobs.append((loc.to_location_info(name, L), year))
+
+    with _state_lock:
+        if _state["thread"] is not None and _state["thread"].is_alive():
+            return _state["thread"]
+        stop = threading.Event()
+        thread = threading.Thread(
+            target=_run,
+            args=(jobs, timestep_minutes, cpu_budget, stop),
+            name="stargazing-prefetch",
+            daemon=True,
+        )
+        _state.update({"thread": thread, "stop": stop, "job": None})
+        # One handler stops whichever prefetcher is running at exit
+        if not _state["stops at exit"]:
+            atexit.register(stop_prefetch)
+            _state["stops at exit"] = True
+
+    thread.start()
+    return thread
+
+
+def stop_prefetch(timeout: float | None = 10):
+    """Stops the prefetcher and waits up to `timeout` seconds for it to finish."""
+    with _state_lock:
+        thread, stop, job = _state["thread"], _state["stop"], _state["job"]
+    if thread is None:
+        return
+
+    stop.set()
+    if job is not None:
+        job["cancel"].set()
+    thread.join(timeout)
+
+
+def yield_to(location: LocationInfo, year: int):
+    """
+    Call before building a year in the foreground. If the prefetcher is
+    building the same cache entry it gives it up, so the foreground build
+    (which resumes from its checkpoints) isn't held to the CPU budget.
+    """
+    with _state_lock:
+        job = _state["job"]
+    if job is not None and job["key"] == _job_key(location, year):
+        job["cancel"].set()
+
+
+def _run(jobs, timestep_minutes, cpu_budget, stop):
+    for location, year in jobs:
+        if stop.is_set():
+            break
+        if cache.find_cached_file(location, year, timestep_minutes) is not None:
+            continue
+
+        job = {
+            "key": _job_key(location, year),
+            "cancel": threading.Event(),
+        }
+        with _state_lock:
+            _state["job"] = job
+        if stop.is_set():  # Stopped before the job was visible
+            break
+
+        started_cpu = time.thread_time()
+        started_wall = time.monotonic()
+
+        def throttle(days_done, days_total):
+            # Sleep until the CPU used is within budget of the time passed
+            busy = time.thread_time() - started_cpu
+            wait = busy / cpu_budget - (time.monotonic() - started_wall)
+            if wait > 0:
+                job["cancel"].wait(wait)
+
+        try:
+            main.get_year_info(
+                location,
+                year,
+                timestep_minutes=timestep_minutes,
+                progress_callback=throttle,
+                cancel_event=job["cancel"],
+                include_plot=False,
+            )
+        except main.SimulationCancelled:
+            pass
+        except Exception as e:
+            # Prefetching is best effort; the foreground will report errors
+            print(f"Prefetch of {year} for {location.name} failed: {e}")
+
+    with _state_lock:
+        _state["job"] = None
+
+
+def _job_key(location: LocationInfo, year: int):
+    return cache.get_base_filename(location, year)
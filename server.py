@@ -0,0 +1,461 @@
+"""
+Local HTTP service for stargazing data.
+
+Endpoints (GET, parameters in the query string):
+    /locations       The saved locations.
+    /year            Each day's summary and conditions.
+                     location, year, [timestep]
+    /day             One day's conditions and plot series.
+                     location, date, [timestep]
+    /nights          The days with a good stargazing window, and the windows.
+                     location, year, [timestep, duration, start, end]
+    /calendar.png    The calendar image for the same parameters as /nights.
+                     [week_start]
+
+`location` is the name of a saved location; or give latitude, longitude and
+timezone instead. `duration` is in minutes and `start`/`end` are hours after
+midnight, as in the GUI.
+
+Years and finished responses (JSON and PNG) are kept in memory between
+requests, and identical requests that arrive while one is being worked on
+wait for it instead of repeating the work.
+
+Usage (from the repository root):
+    python server.py [--host 127.0.0.1] [--port 8765]
+"""
+
+import argparse
+import collections
+import datetime
+import io
+import json
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pytz
+from astral import LocationInfo
+
+import cache
+import constants as c
+import horizon as hz
+import locations as loc
+import main
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+YEAR_CACHE_SIZE = 32  # Years kept in memory
+RESPONSE_CACHE_SIZE = 256  # Encoded responses (JSON and PNG) kept in memory
+IMAGE_DPI = 150
+REQUEST_QUEUE_SIZE = 128  # Pending connections before new ones are refused
+
+_year_cache = collections.OrderedDict()
+_response_cache = collections.OrderedDict()
+_cache_lock = threading.Lock()
+
+_in_flight = {}  # key -> call being worked on, see _coalesce()
+_in_flight_lock = threading.Lock()
+
+
+class RequestError(Exception):
+    """A bad request; the message is sent back with a 400 status."""
+
+
+# --- Endpoints ---
+
+
+def locations_endpoint(query):
+    return loc.get_locations()
+
+
+def year_endpoint(query):
+    location, year, timestep = _year_parameters(query)
+    year_info = get_year(location, year, timestep, _horizon(query))
+    return {
+        "year": year_info["year"],
+        "location": year_info["location"],
+        "timestep": timestep,
+        "days": {
+            day: {
+                "start": day_info["start"],
+                "end": day_info["end"],
+                "summary": day_info["summary"],
+                "conditions": day_info["conditions"],
+            }
+            for day, day_info in year_info["days"].items()
+        },
+    }
+
+
+def day_endpoint(query):
+    location = _location(query)
+    timestep = _int(query, "timestep", c.DEFAULT_TIMESTEP)
+    try:
+        day = datetime.date.fromisoformat(_required(query, "date"))
+    except ValueError:
+        raise RequestError("date must be YYYY-MM-DD")
+
+    year_info = get_year(location, day.year, timestep, _horizon(query))
+    day_info = year_info["days"].get(day.isoformat())
+    if day_info is None:
+        raise RequestError(f"No data for {day.isoformat()}")
+    return {
+        "date": day.isoformat(),
+        "start": day_info["start"],
+        "end": day_info["end"],
+        "summary": day_info["summary"],
+        "conditions": day_info["conditions"],
+        "plot": day_info["plot"],
+    }
+
+
+def nights_endpoint(query):
+    location, year, timestep = _year_parameters(query)
+    times, duration = _window_parameters(query)
+    year_info = get_year(location, year, timestep, _horizon(query))
+
+    nights = []
+    for day, day_info in year_info["days"].items():
+        windows = main.stargazing_windows(day, day_info, times, duration)
+        if windows:
+            nights.append(
+                {
+                    "date": day,
+                    "moon illumination": day_info["summary"]["moon illumination"],
+                    "windows": [
+                        {
+                            "start": start,
+                            "end": end,
+                            "minutes": (end - start).total_seconds() / 60,
+                        }
+                        for start, end in windows
+                    ],
+                }
+            )
+    return {"year": year, "location": year_info["location"], "nights": nights}
+
+
+def calendar_endpoint(query):
+    location, year, timestep = _year_parameters(query)
+    times, duration = _window_parameters(query)
+    week_start = query.get("week_start", "Sunday")
+    if week_start not in ("Sunday", "Monday"):
+        raise RequestError("week_start must be Sunday or Monday")
+
+    import images
+
+    year_info = get_year(location, year, timestep, _horizon(query))
+    calendar_info = main.get_calendar_info(year_info, times, duration)
+    text_info = {
+        "year": year,
+        "location": location,
+        "stargazing times": times,
+        "stargazing duration": duration,
+    }
+    fig = images.draw_calendar_figure(calendar_info, text_info, week_start)
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png", dpi=IMAGE_DPI)
+    return buffer.getvalue()
+
+
+ROUTES = {
+    "/locations": locations_endpoint,
+    "/year": year_endpoint,
+    "/day": day_endpoint,
+    "/nights": nights_endpoint,
+    "/calendar.png": calendar_endpoint,
+}
+UNCACHED_ROUTES = {"/locations"}  # Read fresh so edits show up straight away
+
+
+# --- Warm caches ---
+
+
+def respond(path: str, query: dict):
+    """
+    Answers a request.
+
+    Returns:
+        tuple: (HTTP status, content type, body bytes)
+    """
+    endpoint = ROUTES.get(path)
+    if endpoint is None:
+        return 404, "application/json", _encode_json({"error": f"Not found: {path}"})
+
+    def compute():
+        try:
+            result = endpoint(query)
+        except RequestError as e:
+            return _bad_request(e)
+        if isinstance(result, bytes):
+            return 200, "image/png", result
+        return 200, "application/json", _encode_json(result)
+
+    if path in UNCACHED_ROUTES:
+        return compute()
+
+    try:
+        key = (path, _query_key(query))
+    except RequestError as e:
+        return _bad_request(e)
+    response = _cached(_response_cache, key)
+    if response is None:
+        response = _coalesce(("response",) + key, compute)
+        if response[0] == 200:
+            _store(_response_cache, key, response, RESPONSE_CACHE_SIZE)
+    return response
+
+
+def _query_key(query):
+    """
+    The query as a cache key, with a saved location's name replaced by what
+    it resolves to now: responses for it aren't reused once it's edited.
+    """
+    key = dict(query)
+    if "location" in query:
+        location = _location(query)
+        horizon = _horizon(query)
+        key["location"] = (
+            location.name,
+            location.region,
+            location.timezone,
+            location.latitude,
+            location.longitude,
+            None if horizon is None else hz.horizon_key(horizon),
+        )
+    return tuple(sorted(key.items()))
+
+
+def _bad_request(error: RequestError):
+    return 400, "application/json", _encode_json({"error": str(error)})
+
+
+def get_year(location: LocationInfo, year: int, timestep_minutes: int, horizon=None):
+    """
+    Returns a year from memory, or loads (or simulates) it with
+    main.get_year_info. Plot series are loaded on first use.
+    """
+    # The name and exact coordinates too, since the year carries them, and
+    # the horizon its sun and moon states are labelled for
+    key = (
+        cache.get_base_filename(location, year),
+        location.name,
+        location.latitude,
+        location.longitude,
+        location.timezone,
+        timestep_minutes,
+        None if horizon is None else hz.horizon_key(horizon),
+    )
+    year_info = _cached(_year_cache, key)
+    if year_info is not None:
+        return year_info
+
+    year_info = _coalesce(
+        ("year",) + key,
+        lambda: main.get_year_info(
+            location,
+            year,
+            timestep_minutes=timestep_minutes,
+            progress_callback=main.ignore_progress,
+            lazy_plot=True,
+            horizon=horizon,
+        ),
+    )
+    _store(_year_cache, key, year_info, YEAR_CACHE_SIZE)
+    return year_info
+
+
+def _cached(store, key):
+    with _cache_lock:
+        if key in store:
+            store.move_to_end(key)
+            return store[key]
+    return None
+
+
+def _store(store, key, value, size):
+    with _cache_lock:
+        store[key] = value
+        store.move_to_end(key)
+        while len(store) > size:
+            store.popitem(last=False)
+
+
+def _coalesce(key, function):
+    """
+    Runs function() for the first caller with this key. Callers that arrive
+    while it runs wait for it and get the same result (or exception).
+    """
+    with _in_flight_lock:
+        call = _in_flight.get(key)
+        leader = call is None
+        if leader:
+            call = {"done": threading.Event(), "result": None, "error": None}
+            _in_flight[key] = call
+
+    if not leader:
+        call["done"].wait()
+        if call["error"] is not None:
+            raise call["error"]
+        return call["result"]
+
+    try:
+        call["result"] = function()
+    except Exception as e:
+        call["error"] = e
+        raise
+    finally:
+        with _in_flight_lock:
+            del _in_flight[key]
+        call["done"].set()
+    return call["result"]
+
+
+# --- Parameters ---
+
+
+def _required(query, name):
+    if name not in query:
+        raise RequestError(f"Missing parameter: {name}")
+    return query[name]
+
+
+def _int(query, name, default=None):
+    if name not in query and default is not None:
+        return default
+    try:
+        return int(_required(query, name))
+    except ValueError:
+        raise RequestError(f"{name} must be a whole number")
+
+
+def _float(query, name, default=None):
+    if name not in query and default is not None:
+        return default
+    try:
+        return float(_required(query, name))
+    except ValueError:
+        raise RequestError(f"{name} must be a number")
+
+
+def _location(query) -> LocationInfo:
+    if "location" in query:
+        name = query["location"]
+        L = loc.get_locations().get(name)
+        if L is None:
+            raise RequestError(f"Unknown location: {name}")
+        return loc.to_location_info(name, L)
+
+    latitude = _float(query, "latitude")
+    longitude = _float(query, "longitude")
+    timezone = _required(query, "timezone")
+    if timezone not in pytz.all_timezones_set:
+        raise RequestError(f"Unknown timezone: {timezone}")
+    return LocationInfo(
+        name=query.get("name", f"{latitude}, {longitude}"),
+        region=query.get("region", ""),
+        timezone=timezone,
+        latitude=latitude,
+        longitude=longitude,
+    )
+
+
+def _horizon(query):
+    """The horizon lookup table of a saved location, or None."""
+    if "location" not in query:
+        return None
+    return hz.location_horizon(loc.get_locations()[query["location"]])
+
+
+def _year_parameters(query):
+    location = _location(query)
+    year = _int(query, "year")
+    timestep = _int(query, "timestep", c.DEFAULT_TIMESTEP)
+    if timestep < 1:
+        raise RequestError("timestep must be at least 1")
+    return location, year, timestep
+
+
+def _window_parameters(query):
+    start, end = c.DEFAULT_STARGAZING_TIMES
+    times = (_float(query, "start", start), _float(query, "end", end))
+    duration = datetime.timedelta(
+        minutes=_float(query, "duration", c.DEFAULT_STARGAZING_DURATION)
+    )
+    return times, duration
+
+
+# --- HTTP ---
+
+
+def _json_default(o):
+    if isinstance(o, (datetime.datetime, datetime.date)):
+        return o.isoformat()
+    if isinstance(o, datetime.timedelta):
+        return o.total_seconds()
+    if isinstance(o, np.ndarray):
+        if np.issubdtype(o.dtype, np.datetime64):
+            return np.datetime_as_string(o).tolist()
+        return o.tolist()
+    if isinstance(o, np.generic):
+        return o.item()
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+def _encode_json(result) -> bytes:
+    return json.dumps(result, default=_json_default).encode("utf-8")
+
+
+class StargazingRequestHandler(BaseHTTPRequestHandler):
+    quiet = True  # Don't log every request
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        query = dict(urllib.parse.parse_qsl(url.query))
+        try:
+            status, content_type, body = respond(url.path, query)
+        except Exception as e:
+            body = _encode_json({"error": f"{type(e).__name__}: {e}"})
+            self._send(500, "application/json", body)
+            raise
+        self._send(status, content_type, body)
+
+    def _send(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if not self.quiet:
+            super().log_message(format, *args)
+
+
+class StargazingServer(ThreadingHTTPServer):
+    request_queue_size = REQUEST_QUEUE_SIZE
+    daemon_threads = True
+
+
+def create_server(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT):
+    """Creates the server; call serve_forever() on it to start serving."""
+    return StargazingServer((host, port), StargazingRequestHandler)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--verbose", action="store_true", help="Log every request")
+    args = parser.parse_args()
+
+    StargazingRequestHandler.quiet = not args.verbose
+    server = create_server(args.host, args.port)
+    print(f"Serving on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
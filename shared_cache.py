@@ -0,0 +1,228 @@
+"""
+Decoded years shared between processes through shared memory.
+
+When several kernels or worker processes on one machine use the same cached
+year, the first one decodes its plot series into a
+multiprocessing.shared_memory segment and the rest attach to it: their plot
+arrays are read-only views into the segment, so the series are neither read
+nor decoded again and exist in memory once.
+
+Segments are listed in a small registry file in the data folder together
+with the processes using them. A segment is unlinked when the last of those
+processes releases it (release(), which also runs at exit) or is found to
+have died, or when the cached file it was decoded from changes.
+
+Enable it for every load with constants.SHARED_MEMORY_CACHE, or per call
+with cache.load_year(path, shared=True).
+"""
+
+import atexit
+import contextlib
+import hashlib
+import inspect
+import json
+import os
+import threading
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+import cache
+import constants as c
+
+REGISTRY_FILENAME = "shared_memory.registry.json"
+REGISTRY_LOCK_KEY = "shared_memory.registry"
+REGISTRY_POLL_INTERVAL = 0.05  # seconds between checks while waiting for the registry
+
+# Python 3.13 added SharedMemory(track=False)
+_CAN_SKIP_TRACKING = "track" in inspect.signature(shared_memory.SharedMemory).parameters
+
+_attached = {}  # segment name -> SharedMemory attached by this process
+_attached_lock = threading.Lock()
+
+
+def load_year(path: str):
+    """
+    Loads a cached year with its plot series in shared memory.
+
+    The result is laid out like cache.load_year(path), but the series are
+    read-only numpy views into the segment.
+    """
+    year_info = cache.load_year(path, include_plot=False, shared=False)
+    segment, entry = _attach(path)
+
+    samples = entry["samples"]
+    total = sum(samples)
+    times = np.ndarray((total,), dtype="datetime64[s]", buffer=segment.buf)
+    series = {"times": times}
+    for i, key in enumerate(cache.PLOT_SERIES[1:], start=1):
+        series[key] = np.ndarray(
+            (total,), dtype=np.float64, buffer=segment.buf, offset=i * total * 8
+        )
+    for values in series.values():
+        values.flags.writeable = False
+
+    boundaries = np.cumsum(samples)[:-1]
+    split = {key: np.split(values, boundaries) for key, values in series.items()}
+    for i, day_info in enumerate(year_info["days"].values()):
+        day_info["plot"] = {key: split[key][i] for key in cache.PLOT_SERIES}
+
+    return year_info
+
+
+def release(path: str | None = None):
+    """
+    Stops using the shared copy of a cached year, or of every year this
+    process attached to if path is None. Arrays already handed out stay
+    valid; the memory is freed once nothing maps it.
+    """
+    if not _attached:
+        return
+
+    with _registry() as registry:
+        names = []
+        for key, entry in registry.items():
+            if path is not None and key != _source_key(path):
+                continue
+            if entry["segment"] in _attached:
+                entry["owners"] = [pid for pid in entry["owners"] if pid != os.getpid()]
+                names.append(entry["segment"])
+        _prune(registry)
+
+    with _attached_lock:
+        for name in names:
+            segment = _attached.pop(name)
+            try:
+                segment.close()
+            except BufferError:
+                pass  # Views are still in use; unmapped when they are freed
+
+
+def list_segments():
+    """Returns the registry: source key -> segment name, size and owner pids."""
+    with _registry() as registry:
+        _prune(registry)
+        return {
+            key: {k: v for k, v in entry.items() if k != "samples"}
+            for key, entry in registry.items()
+        }
+
+
+def _attach(path: str):
+    """Attaches to (publishing it first if needed) the segment for a file."""
+    key = _source_key(path)
+    with _registry() as registry:
+        _prune(registry)
+        entry = registry.get(key)
+
+        if entry is None:
+            year_info = cache.load_year(path, shared=False)
+            samples = [len(day["plot"]["times"]) for day in year_info["days"].values()]
+            total = sum(samples)
+            name = "sgyear_" + hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+            size = max(1, len(cache.PLOT_SERIES) * total * 8)
+            try:
+                segment = _open_segment(name, create=True, size=size)
+            except FileExistsError:
+                # Left behind by a process that died while publishing
+                _unlink(_open_segment(name))
+                segment = _open_segment(name, create=True, size=size)
+
+            days = year_info["days"].values()
+            values = np.ndarray((total,), dtype=np.int64, buffer=segment.buf)
+            values[:] = np.concatenate(
+                [np.asarray(day["plot"]["times"], dtype="datetime64[s]") for day in days]
+            ).astype(np.int64)
+            for i, series_key in enumerate(cache.PLOT_SERIES[1:], start=1):
+                values = np.ndarray(
+                    (total,), dtype=np.float64, buffer=segment.buf, offset=i * total * 8
+                )
+                values[:] = np.concatenate([day["plot"][series_key] for day in days])
+            del values
+
+            entry = {"segment": name, "bytes": size, "samples": samples, "owners": []}
+            registry[key] = entry
+            with _attached_lock:
+                _attached[name] = segment
+
+        with _attached_lock:
+            if entry["segment"] not in _attached:
+                _attached[entry["segment"]] = _open_segment(entry["segment"])
+            segment = _attached[entry["segment"]]
+        if os.getpid() not in entry["owners"]:
+            entry["owners"].append(os.getpid())
+
+    return segment, entry
+
+
+def _prune(registry: dict):
+    """Unlinks segments nobody is using or whose source file has changed."""
+    for key, entry in list(registry.items()):
+        entry["owners"] = [pid for pid in entry["owners"] if cache.process_is_running(pid)]
+        source_path = key.rsplit(":", 2)[0]
+        try:
+            current = _source_key(source_path)
+        except FileNotFoundError:
+            current = None  # Evicted or replaced, possibly just now
+        if entry["owners"] and key == current:
+            continue
+        try:
+            _unlink(_open_segment(entry["segment"]))
+        except FileNotFoundError:
+            pass
+        del registry[key]
+
+
+@contextlib.contextmanager
+def _registry():
+    """Holds the registry lock and yields the registry, saving it afterwards."""
+    lock_path = cache.acquire_lock(
+        REGISTRY_LOCK_KEY, poll_interval=REGISTRY_POLL_INTERVAL, quiet=True
+    )
+    try:
+        registry_path = os.path.join(c.DATA_FOLDER, REGISTRY_FILENAME)
+        try:
+            with open(registry_path, "r") as f:
+                registry = json.load(f)
+        except FileNotFoundError:
+            registry = {}
+        yield registry
+        with cache.atomic_open(registry_path, "w") as f:
+            json.dump(registry, f, indent=2)
+    finally:
+        cache.release_lock(lock_path)
+
+
+def _source_key(path: str) -> str:
+    """
+    Identifies one version of a cached file: path, inode and size. Cache
+    files are replaced rather than rewritten, so a new version has a new
+    inode. (The mtime isn't used; loads touch it, see cache_manager.py.)
+    """
+    stat = os.stat(path)
+    return f"{os.path.abspath(path)}:{stat.st_ino}:{stat.st_size}"
+
+
+# --- Segments outside the resource tracker ---
+# By default a process that creates or attaches to a segment unlinks it when
+# it exits, which would pull it out from under the other processes. The
+# registry decides when a segment is unlinked instead.
+
+
+def _open_segment(name: str, create: bool = False, size: int = 0):
+    if _CAN_SKIP_TRACKING:
+        return shared_memory.SharedMemory(name=name, create=create, size=size, track=False)
+    segment = shared_memory.SharedMemory(name=name, create=create, size=size)
+    resource_tracker.unregister(segment._name, "shared_memory")
+    return segment
+
+
+def _unlink(segment):
+    if not _CAN_SKIP_TRACKING:
+        # unlink() unregisters the segment, so register it again first
+        resource_tracker.register(segment._name, "shared_memory")
+    segment.unlink()
+    segment.close()
+
+
+atexit.register(release)
@@ -0,0 +1,214 @@
+import datetime
+import json
+import math
+
+import numpy as np
+
+import constants as c
+import grid
+import locations as loc
+
+EARTH_RADIUS_KM = 6371.0
+LEAF_SIZE = 32  # Sites per KD-tree leaf
+
+
+def build_site_index(locations=None, path=None):
+    """
+    Builds a spatial index over a catalog of observing sites.
+
+    Sites are placed on the unit sphere so that straight-line (chord) distance
+    orders them the same way as great-circle distance, and the points are
+    split into a KD-tree whose leaves hold at most LEAF_SIZE sites.
+
+    Args:
+        locations (dict): Locations dictionary in the same layout as
+                          'my_locations.loc.json'. Defaults to
+                          locations.get_locations().
+        path (str): Optional path to a catalog file with that layout, used
+                    instead of `locations`.
+
+    Returns:
+        dict: The index. Pass it to sites_within() and top_sites_by_dark_hours().
+    """
+    if path is not None:
+        with open(path, "r") as f:
+            locations = json.load(f)
+    elif locations is None:
+        locations = loc.get_locations()
+
+    names = list(locations.keys())
+    latitudes = np.array([locations[name]["latitude"] for name in names], dtype=float)
+    longitudes = np.array(
+        [locations[name]["longitude"] for name in names], dtype=float
+    )
+    points = _to_unit_vectors(latitudes, longitudes)
+
+    # --- Build the KD-tree ---
+    # Each node covers order[start:end]; leaves have left == right == -1.
+    order = np.arange(len(names))
+    nodes = []
+    stack = [(0, len(names), None, None)]
+    while stack:
+        start, end, parent, side = stack.pop()
+        node_points = points[order[start:end]]
+        if len(node_points):
+            lower, upper = node_points.min(axis=0), node_points.max(axis=0)
+        else:
+            lower = upper = np.zeros(3)
+        node = {"start": start, "end": end, "lower": lower, "upper": upper}
+        node["left"] = node["right"] = -1
+        node_id = len(nodes)
+        nodes.append(node)
+        if parent is not None:
+            nodes[parent][side] = node_id
+
+        if end - start > LEAF_SIZE:
+            # Split on the widest dimension at the median
+            dim = int(np.argmax(upper - lower))
+            middle = (start + end) // 2
+            part = np.argpartition(node_points[:, dim], middle - start)
+            order[start:end] = order[start:end][part]
+            stack.append((middle, end, node_id, "right"))
+            stack.append((start, middle, node_id, "left"))
+
+    return {
+        "names": names,
+        "locations": locations,
+        "latitudes": latitudes,
+        "longitudes": longitudes,
+        "points": points,
+        "order": order,
+        "nodes": nodes,
+        "ids": {name: i for i, name in enumerate(names)},
+        "dark hours": {},  # (year, month, timestep) -> {name: dark hours}
+    }
+
+
+def sites_within(site_index, latitude, longitude, radius_km):
+    """
+    Finds the sites within a great-circle distance of a point.
+
+    Returns:
+        list: (name, distance in km) tuples sorted by distance.
+    """
+    center = _to_unit_vectors(np.array([latitude]), np.array([longitude]))[0]
+    # Chord length on the unit sphere for the requested arc
+    max_chord = 2 * math.sin(min(radius_km / EARTH_RADIUS_KM, math.pi) / 2)
+
+    found = []
+    nodes = site_index["nodes"]
+    stack = [0] if nodes else []
+    while stack:
+        node = nodes[stack.pop()]
+        # Distance from the point to the node's bounding box
+        gap = np.maximum(node["lower"] - center, 0) + np.maximum(
+            center - node["upper"], 0
+        )
+        if np.sqrt(np.sum(gap**2)) > max_chord:
+            continue
+        if node["left"] == -1:
+            ids = site_index["order"][node["start"] : node["end"]]
+            chords = np.linalg.norm(site_index["points"][ids] - center, axis=1)
+            found.extend(ids[chords <= max_chord])
+        else:
+            stack.extend([node["left"], node["right"]])
+
+    found = np.array(found, dtype=int)
+    distances = _haversine_km(
+        latitude,
+        longitude,
+        site_index["latitudes"][found],
+        site_index["longitudes"][found],
+    )
+    ranking = np.argsort(distances)
+    return [
+        (site_index["names"][found[i]], float(distances[i])) for i in ranking
+    ]
+
+
+def top_sites_by_dark_hours(
+    site_index,
+    month: int,
+    year: int,
+    n: int = 10,
+    latitude=None,
+    longitude=None,
+    radius_km=None,
+    timestep_minutes: int = c.DEFAULT_TIMESTEP,
+    processes=1,
+):
+    """
+    Ranks sites by total hours of moonless astronomical darkness in a month.
+
+    If a point and radius are given, only sites within that radius are ranked.
+    Dark hours for all the candidates are calculated together in one
+    vectorized pass (see grid.dark_hours_at()), without simulating or caching
+    their years, and are remembered in the index for later rankings.
+
+    Args:
+        site_index (dict): Index from build_site_index().
+        month (int): Month number, 1-12.
+        year (int): Year to rank.
+        n (int): Number of sites to return.
+        latitude, longitude, radius_km: Optional search area.
+        timestep_minutes (int): The interval in minutes for the calculation.
+        processes (int): Worker processes to split the sites across.
+
+    Returns:
+        list: (name, dark hours) tuples, darkest first.
+    """
+    if radius_km is not None:
+        found = sites_within(site_index, latitude, longitude, radius_km)
+        names = [name for name, _ in found]
+    else:
+        names = site_index["names"]
+
+    known = site_index["dark hours"].setdefault((year, month, timestep_minutes), {})
+    missing = [name for name in names if name not in known]
+    if missing:
+        ids = [site_index["ids"][name] for name in missing]
+        start_day = datetime.date(year, month, 1)
+        end_day = datetime.date(
+            year + month // 12, month % 12 + 1, 1
+        ) - datetime.timedelta(days=1)
+        hours = grid.dark_hours_at(
+            site_index["latitudes"][ids],
+            site_index["longitudes"][ids],
+            start_day,
+            end_day,
+            timestep_minutes=timestep_minutes,
+            processes=processes,
+        )
+        known.update(zip(missing, hours.tolist()))
+
+    ranking = [(name, known[name]) for name in names]
+    ranking.sort(key=lambda item: item[1], reverse=True)
+
+    return ranking[:n]
+
+
+def dark_hours_by_month(year_info):
+    """Sums the dark sky conditions of a year into hours per month."""
+    hours = [0.0] * 12
+    for day, day_info in year_info["days"].items():
+        month = int(day[5:7])
+        for condition in day_info["conditions"]["sky"]:
+            hours[month - 1] += condition["duration"].total_seconds() / 3600
+    return hours
+
+
+def _to_unit_vectors(latitudes, longitudes):
+    lat = np.radians(latitudes)
+    lon = np.radians(longitudes)
+    return np.column_stack(
+        [np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)]
+    )
+
+
+def _haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1)))
@@ -0,0 +1,245 @@
+"""
+Zenith sky brightness from the sun and moon.
+
+A continuous measure of how dark the sky is, as an alternative to the
+binary 'dark' sky state (sun below -18° and moon below -6°). Brightness is
+in V magnitudes per square arcsecond, like a sky quality meter reading:
+higher is darker, and a moonless night at a dark site is about 21.6.
+
+Moonlight is the Krisciunas & Schaefer model ("A model of the brightness of
+moonlight", PASP 103, 1991) evaluated at the zenith, with the moon's
+brightness scaled for its distance. The model doesn't cover twilight, so the
+sun adds a simple fit of zenith twilight brightness against how far it is
+below the horizon: about 11 mag/arcsec² at the end of civil twilight and 17
+at the end of nautical twilight, fading into the dark sky by the end of
+astronomical twilight.
+
+Everything is vectorized: sky_brightness() takes any array of times, such as
+a whole year of samples at once (see year_sky_brightness()).
+"""
+
+import datetime
+
+import numpy as np
+from astral import LocationInfo
+
+import constants as c
+import ephemeris
+import fast_engine
+
+DARK_SKY_BRIGHTNESS = 21.6  # V mag/arcsec², moonless zenith at a dark site
+EXTINCTION = 0.172  # V-band extinction in magnitudes per airmass (K&S)
+MEAN_MOON_DISTANCE = 60.27  # Earth radii
+SUN_DISTANCE = 23455.0  # Earth radii, 1 AU
+TWILIGHT_BRIGHTNESS = 4.8  # V mag/arcsec² at the zenith when the sun sets
+TWILIGHT_SLOPE = 1.0  # Magnitudes darker per degree the sun is below the horizon
+# Closer to the moon than this, K&S scattering is glare around its disk
+MIN_MOON_SEPARATION = 5.0  # degrees
+
+
+# --- Model ---
+
+
+def zenith_brightness(
+    sun_elevation,
+    moon_elevation,
+    phase_angle,
+    moon_distance,
+    dark_sky: float = DARK_SKY_BRIGHTNESS,
+    extinction: float = EXTINCTION,
+):
+    """
+    Calculates the brightness of the sky straight up.
+
+    All arguments broadcast against each other.
+
+    Args:
+        sun_elevation, moon_elevation: Degrees above the horizon.
+        phase_angle: The moon's phase angle in degrees, 0 at full moon and
+                     180 at new moon (see phase_angle()).
+        moon_distance: Earth-moon distance in Earth radii.
+        dark_sky: Brightness of the sky with no sun or moon, mag/arcsec².
+        extinction: Magnitudes of extinction per airmass.
+
+    Returns:
+        Zenith brightness in V mag/arcsec².
+    """
+    total = (
+        to_nanolamberts(dark_sky)
+        + moon_brightness(moon_elevation, phase_angle, moon_distance, extinction)
+        + twilight_brightness(sun_elevation)
+    )
+    return to_magnitudes(total)
+
+
+def moon_brightness(moon_elevation, phase_angle, moon_distance, extinction=EXTINCTION):
+    """Moonlight scattered into the zenith sky, in nanolamberts (K&S)."""
+    moon_elevation = np.asarray(moon_elevation, dtype=float)
+    phase_angle = np.abs(phase_angle)
+
+    # Illuminance from the moon, in foot-candles, at its distance
+    magnitude = -12.73 + 0.026 * phase_angle + 4e-9 * phase_angle**4
+    illuminance = 10 ** (-0.4 * (magnitude + 16.57))
+    illuminance = illuminance * (MEAN_MOON_DISTANCE / np.asarray(moon_distance)) ** 2
+
+    # Scattering at the angle between the moon and the zenith
+    separation = np.clip(90.0 - moon_elevation, MIN_MOON_SEPARATION, 180.0)
+    scattering = np.where(
+        separation >= 10,
+        10**5.36 * (1.06 + np.cos(np.radians(separation)) ** 2)
+        + 10 ** (6.15 - separation / 40),
+        6.2e7 / separation**2,
+    )
+
+    moon_airmass = airmass(np.minimum(separation, 90.0))
+    brightness = (
+        scattering
+        * illuminance
+        * 10 ** (-0.4 * extinction * moon_airmass)
+        * (1 - 10 ** (-0.4 * extinction))  # Airmass 1 at the zenith
+    )
+    return np.where(moon_elevation > 0, brightness, 0.0)
+
+
+def twilight_brightness(sun_elevation):
+    """Sunlight in the zenith sky during twilight, in nanolamberts."""
+    depression = np.maximum(-np.asarray(sun_elevation, dtype=float), 0.0)
+    return to_nanolamberts(TWILIGHT_BRIGHTNESS + TWILIGHT_SLOPE * depression)
+
+
+def airmass(zenith_distance):
+    """Relative airmass at a zenith distance in degrees, as K&S use it."""
+    return (1 - 0.96 * np.sin(np.radians(zenith_distance)) ** 2) ** -0.5
+
+
+def phase_angle(
+    sun_right_ascension,
+    sun_declination,
+    moon_right_ascension,
+    moon_declination,
+    moon_distance,
+):
+    """
+    Calculates the moon's phase angle in degrees: 0 at full moon, 180 at new.
+
+    Args:
+        sun_right_ascension, sun_declination: Degrees, from
+            ephemeris.sun_position().
+        moon_right_ascension, moon_declination: Radians, and moon_distance in
+            Earth radii, from ephemeris.moon_position().
+    """
+    sun_dec = np.radians(sun_declination)
+    cos_elongation = np.sin(sun_dec) * np.sin(moon_declination) + np.cos(
+        sun_dec
+    ) * np.cos(moon_declination) * np.cos(
+        np.radians(sun_right_ascension) - moon_right_ascension
+    )
+    elongation = np.arccos(np.clip(cos_elongation, -1.0, 1.0))
+    return np.degrees(
+        np.arctan2(
+            SUN_DISTANCE * np.sin(elongation),
+            moon_distance - SUN_DISTANCE * np.cos(elongation),
+        )
+    )
+
+
+def darkness(brightness, dark_sky: float = DARK_SKY_BRIGHTNESS):
+    """
+    Turns a brightness into a darkness score from 0 to 1: the share of the
+    sky's light that is the dark sky's own. 1 is a moonless night, 0.5 is a
+    sky twice as bright, and it falls towards 0 in moonlight and twilight.
+    """
+    return 10 ** (-0.4 * (dark_sky - np.asarray(brightness)))
+
+
+def to_nanolamberts(magnitudes):
+    """V mag/arcsec² to nanolamberts."""
+    return 34.08 * np.exp(20.7233 - 0.92104 * np.asarray(magnitudes))
+
+
+def to_magnitudes(nanolamberts):
+    """Nanolamberts to V mag/arcsec²."""
+    return (20.7233 - np.log(np.asarray(nanolamberts) / 34.08)) / 0.92104
+
+
+# --- Sky brightness over time ---
+
+
+def sky_brightness(
+    latitude,
+    longitude,
+    utc_times,
+    dark_sky: float = DARK_SKY_BRIGHTNESS,
+    extinction: float = EXTINCTION,
+):
+    """
+    Calculates the zenith sky brightness at a place for an array of times.
+
+    Args:
+        latitude, longitude: Observer position in degrees.
+        utc_times: datetime64 array of naive UTC times, of any length.
+        dark_sky, extinction: As for zenith_brightness().
+
+    Returns:
+        Brightness in V mag/arcsec², shaped like utc_times.
+    """
+    utc_times = np.asarray(utc_times).astype("datetime64[s]")
+    jd2000 = ephemeris.julian_day_2000(utc_times)
+
+    sun_ra, sun_declination, eq_of_time = ephemeris.sun_position(jd2000)
+    moon_ra, moon_declination, moon_distance = ephemeris.moon_position(jd2000)
+
+    sun_elevations = ephemeris.sun_elevation(
+        latitude,
+        longitude,
+        ephemeris.minutes_of_day(utc_times),
+        sun_declination,
+        eq_of_time,
+    )
+    moon_elevations = ephemeris.moon_elevation(
+        latitude,
+        longitude,
+        ephemeris.greenwich_sidereal_time(jd2000),
+        moon_ra,
+        moon_declination,
+    )
+    angles = phase_angle(sun_ra, sun_declination, moon_ra, moon_declination, moon_distance)
+
+    return zenith_brightness(
+        sun_elevations, moon_elevations, angles, moon_distance, dark_sky, extinction
+    )
+
+
+def year_sky_brightness(
+    location: LocationInfo,
+    year: int,
+    timestep_minutes: int = c.DEFAULT_TIMESTEP,
+    dark_sky: float = DARK_SKY_BRIGHTNESS,
+):
+    """
+    Calculates the sky brightness for every sample of a year in one pass.
+
+    The samples are the ones main.get_year_info() uses for the same
+    location and timestep, so each day's array lines up with that day's
+    'plot' series.
+
+    Returns:
+        dict: ISO date -> brightness array in V mag/arcsec².
+    """
+    days = []
+    day = datetime.date(year, 1, 1)
+    while day.year == year:
+        days.append(day)
+        day += datetime.timedelta(days=1)
+
+    day_times = [
+        fast_engine.day_samples(location, day, timestep_minutes)[2] for day in days
+    ]
+    brightness = sky_brightness(
+        location.latitude, location.longitude, np.concatenate(day_times), dark_sky
+    )
+    boundaries = np.cumsum([len(times) for times in day_times])[:-1]
+    return {
+        day.isoformat(): values
+        for day, values in zip(days, np.split(brightness, boundaries))
+    }
@@ -0,0 +1,264 @@
+"""
+Visibility of fixed deep-sky targets during dark sky.
+
+Dark hours only matter if the target is up. The catalog (data/targets.csv by
+default) lists targets by J2000 right ascension and declination, such as the
+Galactic Center and the Messier objects:
+
+    name,common name,type,ra,dec
+    M31,Andromeda Galaxy,galaxy,00:42.7,+41:16
+
+Right ascension is in hours and declination in degrees, either as decimals
+or sexagesimal ("hh:mm:ss", "dd:mm:ss"); lines starting with '#' are
+ignored. Positions are used as they are, without precession, which moves
+them by well under a degree for decades around 2000.
+
+A target is usable at a sample when the sky is dark (the 'sky' conditions of
+astronomy.get_day_info) and the target is above MIN_TARGET_ALTITUDE and the
+location's horizon. Altitudes are calculated for every target at every dark
+sample of a year in one vectorized pass, so a catalog of hundreds of targets
+takes about as long as a handful.
+
+Usage (from the repository root):
+    python targets.py LOCATION --year YEAR [--timestep MIN]
+                      [--min-altitude DEG] [--catalog PATH] [--output CSV]
+"""
+
+import argparse
+import csv
+import datetime
+
+import numpy as np
+from astral import LocationInfo
+
+import cache
+import constants as c
+import ephemeris
+import fast_engine
+import horizon as hz
+import locations as loc
+import main
+
+MAX_BATCH_SAMPLES = 2_000_000  # Targets x samples evaluated at once
+
+
+def load_targets(path: str = c.TARGETS_CATALOG):
+    """
+    Loads a catalog of fixed targets.
+
+    Returns:
+        dict: 'names', 'common names' and 'types' (lists), and 'right
+              ascension' and 'declination' (arrays in degrees).
+    """
+    with open(path, "r", newline="") as f:
+        lines = [line for line in f if line.strip() and not line.startswith("#")]
+
+    targets = {
+        "names": [],
+        "common names": [],
+        "types": [],
+        "right ascension": [],
+        "declination": [],
+    }
+    for row_number, row in enumerate(csv.DictReader(lines), start=1):
+        try:
+            right_ascension = _parse_angle(row["ra"]) * 15  # hours to degrees
+            declination = _parse_angle(row["dec"])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(
+                f"{path}, target {row_number}: expected 'ra' in hours and 'dec' "
+                "in degrees"
+            )
+        targets["names"].append(row["name"])
+        targets["common names"].append(row.get("common name") or "")
+        targets["types"].append(row.get("type") or "")
+        targets["right ascension"].append(right_ascension)
+        targets["declination"].append(declination)
+    if not targets["names"]:
+        raise ValueError(f"{path} has no targets")
+
+    for key in ("right ascension", "declination"):
+        targets[key] = np.array(targets[key], dtype=float)
+    return targets
+
+
+def _parse_angle(text: str) -> float:
+    """Parses '12.5', '12:30' or '-05:27:30' to a decimal number."""
+    text = text.strip()
+    if ":" not in text:
+        return float(text)
+    parts = [float(part) for part in text.lstrip("+-").split(":")]
+    value = sum(part / 60**i for i, part in enumerate(parts))
+    return -value if text.startswith("-") else value
+
+
+def target_altitudes(targets, latitude, longitude, utc_times, with_azimuth=False):
+    """
+    Calculates the altitude of every target at every time.
+
+    Args:
+        targets: A catalog from load_targets().
+        latitude, longitude: Observer position in degrees.
+        utc_times: datetime64 array of naive UTC times.
+        with_azimuth: If True, returns (altitude, azimuth).
+
+    Returns:
+        Altitudes in degrees shaped (targets, times), like
+        ephemeris.moon_elevation (and azimuths, degrees east of north).
+    """
+    sidereal_time = ephemeris.greenwich_sidereal_time(
+        ephemeris.julian_day_2000(np.asarray(utc_times).astype("datetime64[s]"))
+    )
+    return ephemeris.moon_elevation(
+        latitude,
+        longitude,
+        sidereal_time[np.newaxis, :],
+        np.radians(targets["right ascension"])[:, np.newaxis],
+        np.radians(targets["declination"])[:, np.newaxis],
+        with_azimuth=with_azimuth,
+    )
+
+
+# --- Usable minutes per night ---
+
+
+def year_target_minutes(
+    location: LocationInfo,
+    year: int,
+    targets=None,
+    timestep_minutes: int = c.DEFAULT_TIMESTEP,
+    min_altitude: float = c.MIN_TARGET_ALTITUDE,
+    horizon=None,
+    year_info=None,
+):
+    """
+    Calculates how many dark minutes each target is up on every night of a
+    year.
+
+    Args:
+        location: The observer.
+        year: The year.
+        targets: A catalog from load_targets(). Defaults to the default one.
+        timestep_minutes: The interval in minutes between samples.
+        min_altitude: Lowest altitude in degrees a target is usable at.
+        horizon: Optional horizon lookup table (see horizon.py); targets
+            must also clear the skyline.
+        year_info: The year's conditions from main.get_year_info(). Loaded
+            (without plot series) if not given.
+
+    Returns:
+        dict: 'names' (the targets), 'days' (ISO dates), 'dark minutes' (per
+              night) and 'minutes' (usable minutes, shaped (targets, days)).
+    """
+    if targets is None:
+        targets = load_targets()
+    if year_info is None:
+        # Only the dark ('sky') conditions are used, which don't depend on the
+        # horizon
+        year_info = main.get_year_info(
+            location, year, timestep_minutes=timestep_minutes, include_plot=False
+        )
+
+    # --- Dark samples of every night ---
+    days = sorted(year_info["days"])
+    dark_times = []
+    for day in days:
+        start_time, end_time, utc_times = fast_engine.day_samples(
+            location, datetime.date.fromisoformat(day), timestep_minutes
+        )
+        local_times = fast_engine.local_sample_times(
+            location, start_time, end_time, utc_times
+        )
+        dark = np.zeros(len(utc_times), dtype=bool)
+        for condition in year_info["days"][day]["conditions"]["sky"]:
+            dark |= (local_times >= np.datetime64(condition["start"], "s")) & (
+                local_times < np.datetime64(condition["end"], "s")
+            )
+        dark_times.append(utc_times[dark])
+
+    night_counts = np.array([len(times) for times in dark_times])
+    night_starts = np.concatenate([[0], np.cumsum(night_counts)])
+    dark_times = np.concatenate(dark_times)
+
+    # --- Targets up at each dark sample, in batches of samples ---
+    # Column i + 1 is whether each target is usable at dark sample i, summed
+    # into running counts below
+    usable = np.zeros((len(targets["names"]), len(dark_times) + 1), dtype=np.int32)
+    batch = max(1, MAX_BATCH_SAMPLES // len(targets["names"]))
+    for start in range(0, len(dark_times), batch):
+        times = dark_times[start : start + batch]
+        if horizon is None:
+            altitudes = target_altitudes(
+                targets, location.latitude, location.longitude, times
+            )
+            up = altitudes > min_altitude
+        else:
+            altitudes, azimuths = target_altitudes(
+                targets, location.latitude, location.longitude, times, True
+            )
+            up = altitudes > np.maximum(min_altitude, hz.altitude_at(horizon, azimuths))
+        usable[:, start + 1 : start + 1 + len(times)] = up
+    usable = np.cumsum(usable, axis=1)
+
+    # Samples per night from the running counts, then minutes
+    minutes = (usable[:, night_starts[1:]] - usable[:, night_starts[:-1]]) * float(
+        timestep_minutes
+    )
+    return {
+        "names": list(targets["names"]),
+        "days": days,
+        "dark minutes": night_counts * float(timestep_minutes),
+        "minutes": minutes,
+    }
+
+
+def write_target_minutes(f, result):
+    """
+    Writes year_target_minutes() as CSV: a row per night, with the dark
+    minutes and then a column of usable minutes per target.
+    """
+    writer = csv.writer(f, lineterminator="\n")
+    writer.writerow(["date", "dark minutes"] + result["names"])
+    for i, day in enumerate(result["days"]):
+        writer.writerow(
+            [day, f"{result['dark minutes'][i]:.0f}"]
+            + [f"{value:.0f}" for value in result["minutes"][:, i]]
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("location", help="A saved location name")
+    parser.add_argument("--year", type=int, default=datetime.date.today().year)
+    parser.add_argument("--timestep", type=int, default=c.DEFAULT_TIMESTEP)
+    parser.add_argument("--min-altitude", type=float, default=c.MIN_TARGET_ALTITUDE)
+    parser.add_argument("--catalog", default=c.TARGETS_CATALOG)
+    parser.add_argument("--output", help="CSV of usable minutes per night")
+    args = parser.parse_args()
+
+    entry = loc.get_locations()[args.location]
+    location = loc.to_location_info(args.location, entry)
+    catalog = load_targets(args.catalog)
+    result = year_target_minutes(
+        location,
+        args.year,
+        catalog,
+        timestep_minutes=args.timestep,
+        min_altitude=args.min_altitude,
+        horizon=hz.location_horizon(entry),
+    )
+
+    if args.output:
+        with cache.atomic_open(args.output, "w") as f:
+            write_target_minutes(f, result)
+        print(f"Usable minutes per night saved to '{args.output}'")
+
+    # Targets by their usable hours over the year
+    totals = result["minutes"].sum(axis=1) / 60
+    nights = (result["minutes"] > 0).sum(axis=1)
+    print(f"{'target':<18}{'common name':<26}{'hours':>8}{'nights':>8}")
+    for i in np.argsort(-totals):
+        print(
+            f"{result['names'][i]:<18}{catalog['common names'][i]:<26}"
+            f"{totals[i]:>8.1f}{nights[i]:>8}"
+        )
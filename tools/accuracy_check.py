@@ -0,0 +1,446 @@
+"""
+Checks that a fast engine gives the same days as the astral reference.
+
+Runs astronomy.get_day_info and another engine from astronomy.ENGINES over
+the same days for many locations: a sweep of latitudes (including polar
+day and night) and named sites with unusual timezones, checking every Nth
+day plus every daylight saving change. Reports the largest sun and moon
+elevation error, the largest error in any condition's start or end time,
+and the days whose calendar highlight flips.
+
+The same days also check what is built on the engine:
+
+- codec: the engine's days written with cache.write_year and read back keep
+  their elevations to within codec.MAX_ERROR and their conditions exactly.
+- horizon: horizon.apply_horizon labels every sample the way the reference
+  elevations and azimuths say it should for a few test skylines, and a flat
+  skyline changes nothing.
+- grid: for the DARK_SITES, each night's dark minutes from
+  grid.dark_hours_at agree with main.get_year_info (which reads, or builds,
+  the cached year in the data folder).
+
+Exits with status 1 if any threshold is exceeded, so it can gate a change.
+Runs offline.
+
+Usage (from the repository root):
+    python tools/accuracy_check.py [--engine fast] [--year YEAR]
+                                   [--timestep MIN] [--every DAYS]
+                                   [--max-elevation-error DEG]
+                                   [--max-transition-error SEC]
+                                   [--max-flips N] [--max-label-errors N]
+                                   [--max-dark-error STEPS] [--processes N]
+"""
+
+import argparse
+import copy
+import datetime
+import io
+import multiprocessing
+import os
+import sys
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+import pytz  # noqa: E402
+from astral import LocationInfo, moon, sun  # noqa: E402
+
+import astronomy  # noqa: E402
+import cache  # noqa: E402
+import codec  # noqa: E402
+import constants as c  # noqa: E402
+import fast_engine  # noqa: E402
+import grid  # noqa: E402
+import horizon as hz  # noqa: E402
+import main  # noqa: E402
+
+# Sites that stress timezones: southern and half-hour DST, +05:45 and
+# +12:45 offsets, the equator and both polar regions
+NAMED_SITES = [
+    ("Lincoln, NH", 44.0446, -71.6684, "US/Eastern"),
+    ("Honolulu", 21.3258, -157.9659, "US/Hawaii"),
+    ("Quito", -0.18, -78.47, "America/Guayaquil"),
+    ("Sydney", -33.87, 151.21, "Australia/Sydney"),
+    ("Lord Howe Island", -31.55, 159.08, "Australia/Lord_Howe"),
+    ("Kathmandu", 27.70, 85.32, "Asia/Kathmandu"),
+    ("Chatham Islands", -43.95, -176.55, "Pacific/Chatham"),
+    ("Tromso", 69.65, 18.96, "Europe/Oslo"),
+    ("Longyearbyen", 78.22, 15.65, "Arctic/Longyearbyen"),
+    ("McMurdo", -77.85, 166.67, "Antarctica/McMurdo"),
+]
+SWEEP_LATITUDES = range(-85, 86, 10)  # At longitude 0, UTC
+# Named sites whose dark minutes are compared with grid.py
+DARK_SITES = ["Lincoln, NH", "Quito", "Sydney", "Kathmandu", "Tromso"]
+TIMESTEP = 10  # minutes
+EVERY = 14  # days
+
+# Default thresholds
+MAX_ELEVATION_ERROR = 1e-4  # degrees
+MAX_TRANSITION_ERROR = 0  # seconds
+MAX_FLIPS = 0
+MAX_LABEL_ERRORS = 0  # samples
+# Timesteps per night: grid.py samples from local solar noon, not the
+# timezone's noon, so each end of a dark window can move by one sample
+MAX_DARK_ERROR = 4
+
+# Calendar settings used to look for highlight flips (the GUI's defaults)
+STARGAZING_DURATION = datetime.timedelta(minutes=c.DEFAULT_STARGAZING_DURATION)
+
+# Skylines for the horizon check, as functions of azimuth in degrees
+TEST_SKYLINES = {
+    "wall": lambda azimuth: np.full_like(azimuth, 10.0),
+    "slope": lambda azimuth: 8 + 6 * np.cos(np.radians(azimuth)),
+    "summit": lambda azimuth: np.full_like(azimuth, -3.0),
+}
+
+
+def check_days(reference_days: dict, engine_days: dict):
+    """
+    Compares the reference and an engine over some days at one location.
+
+    Args:
+        reference_days, engine_days: date -> day info from each engine.
+
+    Returns:
+        dict: 'days' checked, 'sun error' and 'moon error' (max degrees),
+              'transition error' (max seconds, inf if the conditions don't
+              line up), 'mismatched days' and 'flips' (ISO dates).
+    """
+    result = {
+        "days": 0,
+        "sun error": 0.0,
+        "moon error": 0.0,
+        "transition error": 0.0,
+        "mismatched days": [],
+        "flips": [],
+    }
+
+    for day, reference_info in reference_days.items():
+        fast_info = engine_days[day]
+        result["days"] += 1
+
+        reference_times = np.array(reference_info["plot"]["times"], dtype="datetime64[s]")
+        fast_times = np.asarray(fast_info["plot"]["times"], dtype="datetime64[s]")
+        if len(reference_times) != len(fast_times) or np.any(reference_times != fast_times):
+            result["mismatched days"].append(day.isoformat())
+            result["transition error"] = float("inf")
+            continue
+
+        for key in ("sun", "moon"):
+            error = np.max(
+                np.abs(np.asarray(reference_info["plot"][key]) - fast_info["plot"][key])
+            )
+            result[f"{key} error"] = max(result[f"{key} error"], float(error))
+
+        error = _transition_error(reference_info["conditions"], fast_info["conditions"])
+        if error == float("inf"):
+            result["mismatched days"].append(day.isoformat())
+        result["transition error"] = max(result["transition error"], error)
+
+        iso_day = day.isoformat()
+        highlighted = [
+            bool(
+                main.stargazing_windows(
+                    iso_day, info, c.DEFAULT_STARGAZING_TIMES, STARGAZING_DURATION
+                )
+            )
+            for info in (reference_info, fast_info)
+        ]
+        if highlighted[0] != highlighted[1]:
+            result["flips"].append(iso_day)
+
+    return result
+
+
+def check_codec(year: int, engine_days: dict):
+    """
+    Writes an engine's days with cache.write_year and reads them back.
+
+    Returns:
+        dict: 'codec error' (max elevation change in degrees) and
+              'codec changed days' (ISO dates whose conditions changed).
+    """
+    days = {day.isoformat(): info for day, info in engine_days.items()}
+    location = next(iter(days.values()))["location"]
+    f = io.BytesIO()
+    cache.write_year({"year": year, "location": location, "days": days}, f)
+    f.seek(0)
+    loaded = cache.read_year(f)
+
+    result = {"codec error": 0.0, "codec changed days": []}
+    for day, day_info in days.items():
+        loaded_info = loaded["days"][day]
+        for key in ("sun", "moon"):
+            error = np.max(
+                np.abs(
+                    np.asarray(day_info["plot"][key]) - loaded_info["plot"][key]
+                )
+            )
+            result["codec error"] = max(result["codec error"], float(error))
+        if loaded_info["conditions"] != day_info["conditions"]:
+            result["codec changed days"].append(day)
+    return result
+
+
+def check_horizon(
+    location: LocationInfo, year: int, reference_days: dict, timestep_minutes: int
+):
+    """
+    Applies test skylines to the reference days and checks each sample's
+    sun and moon label against the reference elevations and azimuths.
+
+    Returns:
+        dict: 'label errors' (samples labelled wrongly over all skylines)
+              and 'flat changed days' (ISO dates a flat skyline changed).
+    """
+    days = {day.isoformat(): info for day, info in reference_days.items()}
+    year_info = {"year": year, "days": days}
+    result = {"label errors": 0, "flat changed days": []}
+
+    flat = hz.apply_horizon(
+        copy.deepcopy(year_info), location, np.zeros(hz.LOOKUP_SIZE), timestep_minutes
+    )
+    for day, day_info in days.items():
+        if flat["days"][day]["conditions"] != day_info["conditions"]:
+            result["flat changed days"].append(day)
+
+    # Reference azimuths at the same samples
+    azimuths = {}
+    for day in reference_days:
+        utc_times = fast_engine.day_samples(location, day, timestep_minutes)[2]
+        times = [pytz.utc.localize(t) for t in utc_times.astype(datetime.datetime)]
+        azimuths[day.isoformat()] = {
+            "sun": np.array([sun.azimuth(location.observer, t) for t in times]),
+            "moon": np.array([moon.azimuth(location.observer, t) for t in times]),
+        }
+
+    table_azimuths = np.arange(hz.LOOKUP_SIZE) * hz.LOOKUP_RESOLUTION
+    for skyline in TEST_SKYLINES.values():
+        table = skyline(table_azimuths)
+        relabelled = hz.apply_horizon(
+            copy.deepcopy(year_info), location, table, timestep_minutes
+        )
+        for day, day_info in days.items():
+            times = np.array(day_info["plot"]["times"], dtype="datetime64[s]")
+            # Conditions can't tell the two passes of an hour that repeats
+            # when daylight saving ends apart, so those samples are skipped
+            _, inverse, counts = np.unique(
+                times, return_inverse=True, return_counts=True
+            )
+            unique = counts[inverse] == 1
+            for key, up, twilight, hidden in (
+                ("sun", "day", "civil twilight", hz.SUN_HIDDEN_STATE),
+                ("moon", "moon up", "moon twilight", hz.MOON_HIDDEN_STATE),
+            ):
+                expected = _expected_labels(
+                    _sample_states(day_info["conditions"][key], times),
+                    np.asarray(day_info["plot"][key]),
+                    hz.altitude_at(table, azimuths[day][key]),
+                    up,
+                    twilight,
+                    hidden,
+                )
+                labels = _sample_states(
+                    relabelled["days"][day]["conditions"][key], times
+                )
+                result["label errors"] += int(np.sum((labels != expected) & unique))
+    return result
+
+
+def check_dark_minutes(location: LocationInfo, year: int, days, timestep_minutes: int):
+    """
+    Compares each night's dark minutes from grid.dark_hours_at with the
+    'sky' conditions of main.get_year_info.
+
+    Returns:
+        dict: 'dark error', the largest difference in minutes.
+    """
+    year_info = main.get_year_info(
+        location,
+        year,
+        timestep_minutes=timestep_minutes,
+        progress_callback=main.ignore_progress,
+        include_plot=False,
+    )
+    error = 0.0
+    for day in days:
+        # Durations are naive local time differences, an hour off when
+        # daylight saving changes during a dark window
+        if _has_dst_change(location.timezone, day):
+            continue
+        conditions = year_info["days"][day.isoformat()]["conditions"]["sky"]
+        minutes = sum(
+            condition["duration"].total_seconds() / 60 for condition in conditions
+        )
+        grid_minutes = 60 * grid.dark_hours_at(
+            [location.latitude], [location.longitude], day, day, timestep_minutes
+        )
+        error = max(error, abs(float(grid_minutes[0]) - minutes))
+    return {"dark error": error}
+
+
+def days_to_check(timezone: str, year: int, every: int = EVERY):
+    """Every Nth day of the year plus the days with a daylight saving change."""
+    start = datetime.date(year, 1, 1)
+    days = set()
+    day = start
+    while day.year == year:
+        if (day - start).days % every == 0 or _has_dst_change(timezone, day):
+            days.add(day)
+        day += datetime.timedelta(days=1)
+    return sorted(days)
+
+
+def _has_dst_change(timezone: str, day: datetime.date) -> bool:
+    """Whether the UTC offset changes between a day's noon and the next."""
+    tz = pytz.timezone(timezone)
+    noon = tz.localize(datetime.datetime.combine(day, datetime.time(12)))
+    next_noon = tz.localize(
+        datetime.datetime.combine(day + datetime.timedelta(days=1), datetime.time(12))
+    )
+    return noon.utcoffset() != next_noon.utcoffset()
+
+
+def _transition_error(reference, fast):
+    """Largest start/end difference in seconds; inf if the states differ."""
+    error = 0.0
+    for key in ("sun", "moon", "sky"):
+        if [c["state"] for c in reference[key]] != [c["state"] for c in fast[key]]:
+            return float("inf")
+        for a, b in zip(reference[key], fast[key]):
+            for edge in ("start", "end"):
+                error = max(error, abs((a[edge] - b[edge]).total_seconds()))
+    return error
+
+
+def _sample_states(conditions, times):
+    """
+    The state of each sample time, from the condition it falls in. Matched
+    in order, as horizon.apply_horizon does.
+    """
+    states = np.empty(len(times), dtype=object)
+    index = 0
+    for condition in conditions:
+        start = np.datetime64(condition["start"], "s")
+        index += int(np.argmax(times[index:] == start))
+        states[index:] = condition["state"]
+    return states
+
+
+def _expected_labels(states, elevations, skyline, up, twilight, hidden):
+    """
+    The labels a skyline should give: up where the body clears it, hidden
+    where it is above the true horizon but not the skyline. On a summit
+    (skyline below 0) twilight can be up too.
+    """
+    candidates = (states == up) | ((states == twilight) & (skyline < 0))
+    in_view = elevations >= skyline
+    expected = states.copy()
+    expected[candidates & in_view] = up
+    expected[candidates & ~in_view & (elevations >= 0)] = hidden
+    return expected
+
+
+def _check_site(job):
+    name, latitude, longitude, timezone, year, every, engine, timestep_minutes = job
+    location = LocationInfo(name, "", timezone, latitude, longitude)
+    days = days_to_check(timezone, year, every)
+    reference_days = {
+        day: astronomy.get_day_info(location, day, timestep_minutes) for day in days
+    }
+    engine_days = {
+        day: astronomy.ENGINES[engine](location, day, timestep_minutes) for day in days
+    }
+
+    result = check_days(reference_days, engine_days)
+    result.update(check_codec(year, engine_days))
+    result.update(check_horizon(location, year, reference_days, timestep_minutes))
+    if name in DARK_SITES:
+        result.update(check_dark_minutes(location, year, days, timestep_minutes))
+    return name, result
+
+
+def main_cli(args):
+    sites = list(NAMED_SITES)
+    sites += [(f"lat {lat:+d}", float(lat), 0.0, "UTC") for lat in SWEEP_LATITUDES]
+    jobs = [site + (args.year, args.every, args.engine, args.timestep) for site in sites]
+
+    print(
+        f"Checking engine '{args.engine}' against the reference: {len(sites)} sites, "
+        f"{args.year}, every {args.every} days plus DST changes, "
+        f"{args.timestep} minute timestep"
+    )
+    with multiprocessing.Pool(processes=args.processes) as pool:
+        results = pool.map(_check_site, jobs)
+
+    print(
+        f"{'site':<20}{'days':>6}{'sun err':>11}{'moon err':>11}"
+        f"{'trans err':>11}{'flips':>7}{'codec err':>11}{'labels':>8}"
+        f"{'dark err':>10}"
+    )
+    failures = []
+    max_dark_error = args.max_dark_error * args.timestep
+    for name, result in results:
+        dark_error = result.get("dark error")
+        print(
+            f"{name:<20}{result['days']:>6}{result['sun error']:>11.2e}"
+            f"{result['moon error']:>11.2e}{result['transition error']:>10.0f}s"
+            f"{len(result['flips']):>7}{result['codec error']:>11.2e}"
+            f"{result['label errors']:>8}"
+            + ("         -" if dark_error is None else f"{dark_error:>8.0f}min")
+        )
+        if result["mismatched days"]:
+            print(f"  conditions differ on: {', '.join(result['mismatched days'])}")
+        if result["flips"]:
+            print(f"  highlight flips on: {', '.join(result['flips'])}")
+        if result["codec changed days"]:
+            days = ", ".join(result["codec changed days"])
+            print(f"  conditions changed by the codec on: {days}")
+        if result["flat changed days"]:
+            days = ", ".join(result["flat changed days"])
+            print(f"  conditions changed by a flat skyline on: {days}")
+
+        if max(result["sun error"], result["moon error"]) > args.max_elevation_error:
+            failures.append(f"{name}: elevation error above {args.max_elevation_error}")
+        if result["transition error"] > args.max_transition_error:
+            failures.append(f"{name}: transition error above {args.max_transition_error}s")
+        if len(result["flips"]) > args.max_flips:
+            failures.append(f"{name}: {len(result['flips'])} highlight flips")
+        if result["codec error"] > codec.MAX_ERROR:
+            failures.append(f"{name}: codec error above {codec.MAX_ERROR}")
+        if result["codec changed days"]:
+            failures.append(f"{name}: conditions changed by the codec")
+        if result["label errors"] > args.max_label_errors:
+            failures.append(f"{name}: {result['label errors']} horizon label errors")
+        if result["flat changed days"]:
+            failures.append(f"{name}: conditions changed by a flat skyline")
+        if dark_error is not None and dark_error > max_dark_error:
+            failures.append(f"{name}: dark minutes error above {max_dark_error:.0f}")
+
+    if failures:
+        print("FAILED")
+        for failure in failures:
+            print(f"  {failure}")
+        return 1
+
+    print("OK")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--engine", default="fast", choices=sorted(astronomy.ENGINES))
+    parser.add_argument("--year", type=int, default=datetime.date.today().year)
+    parser.add_argument("--timestep", type=int, default=TIMESTEP)
+    parser.add_argument("--every", type=int, default=EVERY)
+    parser.add_argument("--max-elevation-error", type=float, default=MAX_ELEVATION_ERROR)
+    parser.add_argument("--max-transition-error", type=float, default=MAX_TRANSITION_ERROR)
+    parser.add_argument("--max-flips", type=int, default=MAX_FLIPS)
+    parser.add_argument("--max-label-errors", type=int, default=MAX_LABEL_ERRORS)
+    parser.add_argument(
+        "--max-dark-error", type=float, default=MAX_DARK_ERROR, help="In timesteps"
+    )
+    parser.add_argument("--processes", type=int, default=None)
+    sys.exit(main_cli(parser.parse_args()))
@@ -0,0 +1,61 @@
+"""
+Measures how long it takes to import the compute core and checks that it
+doesn't pull in the GUI stack.
+
+Usage (from the repository root):
+    python tools/import_time.py [module ...]
+"""
+
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_MODULES = ["astronomy", "main", "locations", "gui"]
+HEAVY_MODULES = ["matplotlib", "ipywidgets", "IPython"]
+RUNS = 5
+
+
+def measure_import(module: str, runs: int = RUNS):
+    """
+    Imports a module in fresh interpreters with -X importtime.
+
+    Returns:
+        tuple: (median cumulative import time in milliseconds, list of heavy
+               top-level packages that were imported along the way)
+    """
+    times = []
+    heavy = []
+    for _ in range(runs):
+        completed = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=REPO_ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        # Lines look like: "import time:   self [us] | cumulative | imported package"
+        module_us = 0
+        heavy = []
+        for line in completed.stderr.splitlines():
+            match = re.match(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)", line)
+            if match is None:
+                continue
+            cumulative_us, indent, name = int(match[2]), match[3], match[4]
+            if indent == "" and name == module:
+                module_us = cumulative_us
+            if name in HEAVY_MODULES:
+                heavy.append(name)
+        times.append(module_us / 1000)
+
+    return statistics.median(times), heavy
+
+
+if __name__ == "__main__":
+    modules = sys.argv[1:] or DEFAULT_MODULES
+    for module in modules:
+        median_ms, heavy = measure_import(module)
+        heavy_text = ", ".join(heavy) if heavy else "none"
+        print(f"{module:<12} {median_ms:8.1f} ms   heavy packages: {heavy_text}")
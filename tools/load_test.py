@@ -0,0 +1,107 @@
+"""
+Load test for server.py: sends concurrent requests and reports latency
+percentiles per endpoint.
+
+Start the server first, then (from the repository root):
+    python tools/load_test.py [--url http://127.0.0.1:8765] [--location NAME]
+                              [--year YEAR] [--requests N] [--concurrency N]
+"""
+
+import argparse
+import datetime
+import json
+import sys
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_URL = "http://127.0.0.1:8765"
+REQUESTS = 200  # per endpoint
+CONCURRENCY = 16
+PERCENTILES = [50, 90, 99]
+
+
+def timed_get(url: str):
+    """Returns (seconds taken, HTTP status) for one GET request."""
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(url) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    return time.perf_counter() - start, status
+
+
+def run_endpoint(url: str, requests: int, concurrency: int):
+    """
+    Sends `requests` GETs to a URL from `concurrency` threads.
+
+    Returns:
+        dict: 'latencies' (seconds, sorted), 'errors' and 'wall' time.
+    """
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(timed_get, [url] * requests))
+    wall = time.perf_counter() - start
+
+    return {
+        "latencies": sorted(seconds for seconds, _ in results),
+        "errors": sum(1 for _, status in results if status != 200),
+        "wall": wall,
+    }
+
+
+def percentile(sorted_values, p):
+    index = min(len(sorted_values) - 1, round(p / 100 * (len(sorted_values) - 1)))
+    return sorted_values[index]
+
+
+def main(args):
+    base = args.url.rstrip("/")
+    if args.location is None:
+        with urllib.request.urlopen(f"{base}/locations") as response:
+            args.location = next(iter(json.load(response)))
+
+    params = {"location": args.location, "year": args.year, "timestep": args.timestep}
+    day = datetime.date(args.year, 6, 15).isoformat()
+    endpoints = {
+        "/year": params,
+        "/day": {"location": args.location, "date": day, "timestep": args.timestep},
+        "/nights": params,
+        "/calendar.png": params,
+    }
+
+    print(
+        f"{args.requests} requests per endpoint, {args.concurrency} at a time, "
+        f"for {args.location} {args.year}"
+    )
+    header = f"{'endpoint':<15}{'first':>9}" + "".join(f"{f'p{p}':>9}" for p in PERCENTILES)
+    print(header + f"{'req/s':>9}{'errors':>8}")
+
+    for path, query in endpoints.items():
+        url = f"{base}{path}?{urllib.parse.urlencode(query)}"
+        # The first request may have to load or simulate the year
+        first, _ = timed_get(url)
+        result = run_endpoint(url, args.requests, args.concurrency)
+        latencies = result["latencies"]
+        row = f"{path:<15}{first * 1000:>7.1f}ms"
+        row += "".join(f"{percentile(latencies, p) * 1000:>7.1f}ms" for p in PERCENTILES)
+        row += f"{len(latencies) / result['wall']:>9.0f}{result['errors']:>8}"
+        print(row)
+        if result["errors"]:
+            print(f"  {result['errors']} requests failed", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--url", default=DEFAULT_URL)
+    parser.add_argument("--location", default=None, help="Defaults to the first saved location")
+    parser.add_argument("--year", type=int, default=datetime.date.today().year)
+    # Coarse default so a cold cache doesn't spend minutes simulating
+    parser.add_argument("--timestep", type=int, default=60)
+    parser.add_argument("--requests", type=int, default=REQUESTS)
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    main(parser.parse_args())